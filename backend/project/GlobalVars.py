@@ -2,5 +2,6 @@ DB_DIR = "chromaDB/"
 DEBUG = True
 MODEL = "gemma:2b"
 FILE_DIR = 'data/'
+CACHE_DIR = 'cache/'
 
  
\ No newline at end of file
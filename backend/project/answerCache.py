@@ -0,0 +1,186 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from GlobalVars import DEBUG
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") != "0"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class _CollectionIndex:
+    # Past queries for one collection: entries in LRU order plus a lazily stacked matrix of their vectors.
+    def __init__(self):
+        self.entries: "OrderedDict[int, Dict[str, object]]" = OrderedDict()
+        self._keys = None
+        self._matrix = None
+
+    def matrix(self):
+        if self._matrix is None:
+            self._keys = list(self.entries)
+            self._matrix = (
+                np.stack([self.entries[k]["vector"] for k in self._keys])
+                if self._keys else np.zeros((0, 0), dtype=np.float32)
+            )
+        return self._keys, self._matrix
+
+    def changed(self):
+        self._keys = None
+        self._matrix = None
+
+
+class SemanticAnswerCache:
+    # Answers keyed by query embedding; a lookup hits when a past query in the same collection is close enough.
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_s: float = ANSWER_CACHE_TTL_S,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        max_bytes: int = ANSWER_CACHE_MAX_BYTES,
+    ):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self._indexes: Dict[Hashable, _CollectionIndex] = {}
+        # Global recency across collections, so the byte cap evicts the coldest entry anywhere.
+        self._lru: "OrderedDict[Tuple[Hashable, int], None]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Bumped by invalidate(): per collection name, and globally for a full wipe.
+        self._generations: Dict[str, int] = {}
+        self._global_generation = 0
+        self._next_id = 0
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _remove(self, key: Hashable, entry_id: int):
+        index = self._indexes.get(key)
+        if index is None or entry_id not in index.entries:
+            return
+        entry = index.entries.pop(entry_id)
+        index.changed()
+        self._lru.pop((key, entry_id), None)
+        self.bytes_used -= int(entry["nbytes"])
+        if not index.entries:
+            del self._indexes[key]
+
+    def _expire(self, key: Hashable, now: float):
+        index = self._indexes.get(key)
+        if index is None:
+            return
+        expired = [i for i, e in index.entries.items() if now - float(e["created"]) > self.ttl_s]
+        for entry_id in expired:
+            self._remove(key, entry_id)
+
+    def generation(self, collection: Hashable) -> Tuple[int, int]:
+        # Captured before answering; store() refuses the answer if the collection was re-ingested since.
+        with self._lock:
+            return self._global_generation, self._generations.get(collection[0], 0)
+
+    def lookup(self, collection: Hashable, vector) -> Optional[Tuple[Dict[str, object], float, float]]:
+        # Returns (payload copy, similarity, original latency ms) or None.
+        query = self._normalize(vector)
+        with self._lock:
+            self._expire(collection, time.time())
+            index = self._indexes.get(collection)
+            if index is not None:
+                keys, matrix = index.matrix()
+                if matrix.shape[1] == query.shape[0]:
+                    scores = matrix @ query
+                    best = int(np.argmax(scores))
+                    similarity = float(scores[best])
+                    if similarity >= self.threshold:
+                        entry_id = keys[best]
+                        entry = index.entries[entry_id]
+                        index.entries.move_to_end(entry_id)
+                        self._lru.move_to_end((collection, entry_id))
+                        self.hits += 1
+                        return copy.deepcopy(entry["payload"]), similarity, float(entry["latency_ms"])
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        collection: Hashable,
+        vector,
+        payload: Dict[str, object],
+        latency_ms: float,
+        generation: Optional[Tuple[int, int]] = None,
+    ):
+        nbytes = len(json.dumps(payload, default=str).encode("utf-8"))
+        query = self._normalize(vector)
+        nbytes += query.nbytes
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self.generation(collection):
+                # Built from data that an ingest finished replacing while the query ran.
+                return
+            index = self._indexes.setdefault(collection, _CollectionIndex())
+            entry_id = self._next_id
+            self._next_id += 1
+            index.entries[entry_id] = {
+                "vector": query,
+                "payload": copy.deepcopy(payload),
+                "latency_ms": latency_ms,
+                "created": time.time(),
+                "nbytes": nbytes,
+            }
+            index.changed()
+            self._lru[(collection, entry_id)] = None
+            self.bytes_used += nbytes
+
+            while len(index.entries) > self.max_entries:
+                self._remove(collection, next(iter(index.entries)))
+            while self.bytes_used > self.max_bytes and self._lru:
+                evicted_key, evicted_id = next(iter(self._lru))
+                self._remove(evicted_key, evicted_id)
+
+    def record_saving(self, saved_ms: float):
+        with self._lock:
+            self.latency_saved_ms += max(0.0, saved_ms)
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        # Keys are (collection, model); a collection name drops every model's answers for it.
+        with self._lock:
+            if collection_name is None:
+                self._global_generation += 1
+            else:
+                self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            stale = [k for k in self._indexes if collection_name is None or k[0] == collection_name]
+            for key in stale:
+                for entry_id in list(self._indexes[key].entries):
+                    self._remove(key, entry_id)
+        if DEBUG and stale:
+            print(f"[ANSWER CACHE] Invalidated {collection_name or 'all collections'}")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "entries": sum(len(i.entries) for i in self._indexes.values()),
+                "bytes": self.bytes_used,
+                "hits": self.hits,
+                "misses": self.misses,
+                "latency_saved_ms": round(self.latency_saved_ms, 2),
+            }
+
+
+answer_cache = SemanticAnswerCache()
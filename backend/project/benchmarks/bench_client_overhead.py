@@ -0,0 +1,61 @@
+# Per-request client construction overhead: fresh ChatOllama/OllamaEmbeddings/Chroma
+# (the old chatapplicationApi pattern) versus warm clients from the registry.
+# No Ollama server is needed; nothing here issues a model call.
+# Run from backend/project:  python -m benchmarks.bench_client_overhead --requests 200
+import argparse
+import statistics
+import tempfile
+import time
+
+from langchain_chroma.vectorstores import Chroma
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+
+from clientRegistry import ClientRegistry
+
+
+def _fresh(collection: str, model: str, directory: str):
+    chat_model = ChatOllama(model=model, temperature=0)
+    db = Chroma(
+        collection_name=collection,
+        embedding_function=OllamaEmbeddings(model=model),
+        persist_directory=directory,
+    )
+    db._collection.count()
+    del db, chat_model
+
+
+def _pooled(registry: ClientRegistry, collection: str, model: str, directory: str):
+    registry.get_chat_model(model)
+    registry.get_vectorstore(collection, model, directory)._collection.count()
+
+
+def _report(name: str, samples):
+    samples = sorted(samples)
+    p95 = samples[int(0.95 * (len(samples) - 1))]
+    print(f"{name:<10} mean={statistics.mean(samples):8.3f}ms  p50={statistics.median(samples):8.3f}ms  p95={p95:8.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--model", default="gemma:2b")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_chroma_")
+    collection = "bench.pdf"
+    registry = ClientRegistry()
+
+    for name, fn in (
+        ("fresh", lambda: _fresh(collection, args.model, directory)),
+        ("registry", lambda: _pooled(registry, collection, args.model, directory)),
+    ):
+        samples = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000.0)
+        _report(name, samples)
+
+
+if __name__ == "__main__":
+    main()
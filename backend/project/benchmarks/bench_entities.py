@@ -0,0 +1,61 @@
+# Compare the per-chunk nlp(text) loop with the trimmed nlp.pipe entity stage.
+# Run from backend/project:  python -m benchmarks.bench_entities data/large.pdf --batch-size 32 128 --n-process 1 4
+import argparse
+import time
+
+import spacy
+
+from docProcess import load_document, split_document
+from graphProcess import extract_entities, get_nlp
+
+
+def _chunks(paths, synthetic: int):
+    texts = []
+    for path in paths:
+        texts.extend(c.page_content for c in split_document(load_document(path)))
+    if synthetic:
+        sample = (
+            "Apple opened a new office in Berlin in March 2021, led by Tim Cook. "
+            "The European Commission reviewed the deal with Microsoft for $2 billion. "
+        )
+        texts.extend(f"{sample} Report {i} was filed in London by Jane Doe." for i in range(synthetic))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdfs", nargs="*")
+    parser.add_argument("--synthetic", type=int, default=0, help="add N generated chunks")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[64])
+    parser.add_argument("--n-process", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    texts = _chunks(args.pdfs, args.synthetic)
+    if not texts:
+        parser.error("pass PDFs and/or --synthetic N")
+    print(f"{len(texts)} chunks")
+
+    full = spacy.load("en_core_web_sm")
+    get_nlp()  # keep model loading out of both timings
+    start = time.perf_counter()
+    baseline = [[(e.text, e.label_) for e in full(t).ents] for t in texts]
+    loop_s = time.perf_counter() - start
+    print(f"  {'nlp(text) loop, full pipeline':<34} {len(texts) / loop_s:>9.1f} chunks/s")
+    baseline_sets = [set(ents) for ents in baseline]
+
+    for n_process in args.n_process:
+        for batch_size in args.batch_size:
+            start = time.perf_counter()
+            entities = extract_entities(texts, batch_size=batch_size, n_process=n_process)
+            elapsed = time.perf_counter() - start
+            same = [set(ents) for ents in entities] == baseline_sets
+            rows = sum(len(e) for e in entities)
+            print(
+                f"  {f'pipe batch={batch_size} n_process={n_process}':<34} {len(texts) / elapsed:>9.1f} chunks/s  "
+                f"speedup={loop_s / max(elapsed, 1e-9):.2f}x  entity_rows={rows} "
+                f"(loop {sum(len(b) for b in baseline)})  same_entities={same}"
+            )
+
+
+if __name__ == "__main__":
+    main()
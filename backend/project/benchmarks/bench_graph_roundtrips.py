@@ -0,0 +1,151 @@
+# Graph retrieval latency: one Cypher round-trip per stage (Neo4jGraph.query) versus the single
+# CALL {} statement on a pooled driver session. Needs a throwaway local Neo4j, e.g.
+#   docker run -p 7687:7687 -e NEO4J_AUTH=neo4j/password neo4j:5
+# Run from backend/project:
+#   NEO4J_URI=bolt://localhost:7687 python -m benchmarks.bench_graph_roundtrips --seed 5000 --depth 1 2 3
+# --rtt-ms adds a simulated network delay per round-trip, approximating a remote (Aura) instance.
+import argparse
+import random
+import statistics
+import time
+
+import graphProcess
+from graphProcess import (
+    GraphBatchWriter,
+    _fetch_candidates_single_query,
+    _fetch_candidates_stepwise,
+    ensure_graph_schema,
+    get_driver,
+    get_graph,
+    refresh_khop_cache,
+)
+
+BENCH_FILE = "bench_roundtrips.pdf"
+_WORDS = (
+    "neo4j graph retrieval latency vector chunk entity topic index query cache pool session driver "
+    "cypher document network memory throughput embedding ranking expansion neighbour seed budget"
+).split()
+_QUERIES = [
+    "graph retrieval latency",
+    "pool session driver throughput",
+    "entity topic expansion ranking",
+    "cypher index cache memory",
+    "embedding neighbour seed budget",
+]
+
+
+class _RoundTrips:
+    # Counts (and optionally delays) every statement sent, for both access paths.
+    def __init__(self, rtt_ms: float):
+        self.rtt_s = rtt_ms / 1000.0
+        self.count = 0
+
+    def hit(self):
+        self.count += 1
+        if self.rtt_s:
+            time.sleep(self.rtt_s)
+
+
+class _CountingGraph:
+    def __init__(self, graph, trips: _RoundTrips):
+        self._graph = graph
+        self._trips = trips
+
+    def query(self, *args, **kwargs):
+        self._trips.hit()
+        return self._graph.query(*args, **kwargs)
+
+
+class _CountingDriver:
+    def __init__(self, driver, trips: _RoundTrips):
+        self._driver = driver
+        self._trips = trips
+
+    def session(self, **kwargs):
+        trips = self._trips
+        session = self._driver.session(**kwargs)
+        execute_read = session.execute_read
+
+        def counted(work, *args, **kw):
+            trips.hit()
+            return execute_read(work, *args, **kw)
+
+        session.execute_read = counted
+        return session
+
+
+def _seed(graph, chunks: int, rng: random.Random, khop: bool):
+    # Synthetic chunks with NEXT chains, SIMILAR_TO edges and shared entities/topics.
+    ensure_graph_schema(graph)
+    graph.query("MATCH (d:Document {file: $file}) DETACH DELETE d", params={"file": BENCH_FILE})
+    writer = GraphBatchWriter(graph)
+    ids = [f"bench_{i}" for i in range(chunks)]
+    for i, doc_id in enumerate(ids):
+        text = " ".join(rng.choice(_WORDS) for _ in range(60)) + "."
+        writer.add("documents", {"id": doc_id, "file": BENCH_FILE, "text": text, "embedding": []})
+        writer.add("entities", {"name": f"Entity{rng.randrange(chunks // 10 + 1)}", "type": "ORG", "doc_id": doc_id})
+        writer.add("topics", {"topic": f"Topic{rng.randrange(20)}", "doc_id": doc_id})
+        if i:
+            writer.add("next", {"prev": ids[i - 1], "curr": doc_id})
+        for _ in range(2):
+            writer.add("similar", {"a": doc_id, "b": ids[rng.randrange(chunks)], "score": 0.8})
+    writer.flush()
+    print(f"seeded {chunks} chunks | rows={writer.rows_written} | {writer.elapsed_s:.1f}s")
+    if khop:
+        start = time.perf_counter()
+        refresh_khop_cache(graph, BENCH_FILE)
+        print(f"k-hop cache built in {time.perf_counter() - start:.1f}s")
+
+
+def _percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[int(q * (len(samples) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0, help="(re)create N synthetic chunks first")
+    parser.add_argument("--depth", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    parser.add_argument("--no-khop", action="store_true", help="seed without the k-hop cache (path expansion)")
+    parser.add_argument("--all-files", action="store_true", help="do not filter seeds by the bench file")
+    args = parser.parse_args()
+
+    if args.seed:
+        _seed(get_graph(), args.seed, random.Random(0), khop=not args.no_khop)
+
+    trips = _RoundTrips(args.rtt_ms)
+    graph = _CountingGraph(get_graph(), trips)
+    driver = _CountingDriver(get_driver(), trips)
+    collection = None if args.all_files else BENCH_FILE
+    paths = (
+        ("stepwise", lambda q, d: _fetch_candidates_stepwise(graph, q, args.top_k, d, collection)),
+        ("single", lambda q, d: _fetch_candidates_single_query(driver, q, args.top_k, d, collection)),
+    )
+
+    for depth in args.depth:
+        results = {}
+        for name, fetch in paths:
+            fetch(_QUERIES[0], depth)  # warm plan cache and pooled connections
+            samples, trips.count = [], 0
+            for run in range(args.runs):
+                start = time.perf_counter()
+                results[name] = fetch(_QUERIES[run % len(_QUERIES)], depth)
+                samples.append((time.perf_counter() - start) * 1000.0)
+            print(
+                f"depth={depth} {name:<9} p50={statistics.median(samples):8.2f}ms  "
+                f"p95={_percentile(samples, 0.95):8.2f}ms  round_trips/query={trips.count / args.runs:.1f}"
+            )
+        same = {k: [r["id"] for r in v] for k, v in results["stepwise"].items()} == {
+            k: [r["id"] for r in v] for k, v in results["single"].items()
+        }
+        print(f"depth={depth} same_candidates={same} (last query)")
+
+    get_driver().close()
+    graphProcess.driver_instance = None
+
+
+if __name__ == "__main__":
+    main()
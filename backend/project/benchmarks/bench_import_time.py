@@ -0,0 +1,74 @@
+# Measure cold-start import cost of the API and the heaviest modules it pulls in.
+# Run from backend/project:  python -m benchmarks.bench_import_time --module main --repeat 3 --load spacy
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Modules that register lazy resources (spacy in graphProcess, the evaluation models in evaluate,
+# rouge/bleu in lexicalMetrics). --load resolves names after importing all of them by default.
+RESOURCE_OWNERS = ["graphProcess", "evaluate", "lexicalMetrics"]
+
+
+def _import_seconds(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _top_imports(module: str, top: int):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.replace("import time:", "").split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            # Nesting depth is encoded as two spaces per level after the leading separator space.
+            rows.append((int(parts[1]), parts[2][1:].rstrip()))
+    # The module itself and its direct imports; deeper entries are already in their parents' totals.
+    shallow = [(us, name) for us, name in rows if not name.startswith("    ")]
+    return sorted(shallow, reverse=True)[:top]
+
+
+def _load_seconds(owners, resources):
+    code = (
+        f"import time, {', '.join(owners)}, lazyLoader\n"
+        f"for name in {list(resources)!r}:\n"
+        "    t = time.perf_counter(); lazyLoader._resources[name].get()\n"
+        "    print(name, time.perf_counter() - t)\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    # Skip anything else the imports print (e.g. "[LAZY] Loaded ..." when DEBUG is on).
+    return [line.rsplit(" ", 1) for line in out.stdout.splitlines() if line.split(" ", 1)[0] in resources]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", nargs="+", default=["main"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--load", nargs="*", default=[], help="lazy resources to time after import")
+    parser.add_argument(
+        "--owner", nargs="+", default=RESOURCE_OWNERS, help="modules that register the --load resources"
+    )
+    args = parser.parse_args()
+
+    for module in args.module:
+        samples = [_import_seconds(module) for _ in range(max(1, args.repeat))]
+        print(
+            f"\nimport {module}: median={statistics.median(samples):.3f}s "
+            f"min={min(samples):.3f}s max={max(samples):.3f}s (fresh interpreter x{len(samples)})"
+        )
+        for us, name in _top_imports(module, args.top):
+            print(f"  {us / 1e6:>8.3f}s  {name.strip()}")
+
+    if args.load:
+        print(f"\nfirst-use load after importing {', '.join(args.owner)}:")
+        for name, seconds in _load_seconds(args.owner, args.load):
+            print(f"  {name:<24} {float(seconds):>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
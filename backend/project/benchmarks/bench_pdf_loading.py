@@ -0,0 +1,50 @@
+# Compare PyPDFLoader against the parallel page-range loader.
+# Run from backend/project:  python -m benchmarks.bench_pdf_loading data/large.pdf --workers 2 4 8
+import argparse
+import time
+
+from langchain_community.document_loaders import PyPDFLoader
+
+from docProcess import iter_document_pages, split_document_stream
+from pdfPages import count_pages
+
+
+def _time(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    args = parser.parse_args()
+
+    for path in args.pdfs:
+        pages = count_pages(path)
+        print(f"\n{path} ({pages} pages)")
+
+        serial, serial_s = _time(lambda: PyPDFLoader(path).load())
+        print(f"  {'PyPDFLoader':<24} {serial_s:>8.2f}s")
+
+        for workers in args.workers:
+            parallel, parallel_s = _time(
+                lambda: [p for batch in iter_document_pages(path, workers=workers) for p in batch]
+            )
+            same = [d.page_content for d in parallel] == [d.page_content for d in serial]
+            print(
+                f"  {f'parallel x{workers}':<24} {parallel_s:>8.2f}s  "
+                f"speedup={serial_s / max(parallel_s, 1e-9):.2f}x  identical_text={same}"
+            )
+
+            start = time.perf_counter()
+            first_chunk_s = None
+            for _, chunks in split_document_stream(iter_document_pages(path, workers=workers), pages):
+                if first_chunk_s is None and chunks:
+                    first_chunk_s = time.perf_counter() - start
+            print(f"  {f'stream x{workers} first chunks':<24} {first_chunk_s or 0.0:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,631 @@
+# Offline pipeline benchmark: every ingest and query stage over synthetic corpora of increasing
+# size, with deterministic stand-ins for Ollama (hashed bag-of-words embeddings, canned chat
+# replies, fixed per-call latency) and for the graph: by default a recording in-memory Neo4j that
+# answers the Cypher graphProcess sends (UNWIND batches, k-hop refresh, single-statement fetch) at a
+# fixed round-trip cost, or --graph local for the in-process LocalGraph. No server, model download
+# or network access is needed; spaCy, Chroma and the metric libraries run for real.
+# Run from backend/project:
+#   python -m benchmarks.bench_pipeline --sizes 10 40 160 --save benchmarks/pipeline_baseline.json
+#   python -m benchmarks.bench_pipeline --compare benchmarks/pipeline_baseline.json   # exit 1 on regression
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_chroma.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import embeddingCache
+import evaluate
+import graphProcess
+import localGraph
+from bm25Index import bm25_indexes
+from clientRegistry import client_registry
+from docProcess import add_docs, split_document
+from embeddingCache import CachedEmbeddings, EmbeddingCache
+from GlobalVars import MODEL
+from graphProcess import get_related_context, insert_docs_to_graph
+from localGraph import LocalGraph
+from query import _adaptive_context_granularity
+
+BASELINE_VERSION = 2
+_VOCAB = (
+    "graph retrieval vector index chunk embedding latency throughput memory query context answer "
+    "model cache batch pipeline storage network evidence ranking token budget document section "
+    "report analysis revenue growth policy contract supplier warranty audit schedule"
+).split()
+_ENTITIES = ["Apple", "Microsoft", "Berlin", "London", "Jane Doe", "Tim Cook", "the European Commission"]
+
+
+class FakeEmbeddings(Embeddings):
+    # Feature-hashed bag of words: deterministic, and overlapping chunks land close together so
+    # SIMILAR_TO edges and topic clusters look like real ones.
+    def __init__(self, dim: int = 384, latency_ms: float = 2.0):
+        self.dim = dim
+        self.latency_s = latency_ms / 1000.0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 1 << 31 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_s)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_s)
+        return self._vector(text)
+
+
+class _Message:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    # Enough of ChatOllama for topic labelling and answering: numbered prompts get numbered labels.
+    def __init__(self, latency_ms: float = 5.0):
+        self.latency_s = latency_ms / 1000.0
+
+    def _reply(self, prompt) -> str:
+        numbers = re.findall(r"^\s*\[(\d+)\]", str(prompt), re.M)
+        if numbers:
+            return "\n".join(f"{n}. Synthetic topic {n}" for n in numbers)
+        return "Synthetic answer grounded in the retrieved context."
+
+    def invoke(self, prompt, *args, **kwargs) -> _Message:
+        time.sleep(self.latency_s)
+        return _Message(self._reply(prompt))
+
+    def stream(self, prompt, *args, **kwargs):
+        time.sleep(self.latency_s)
+        for word in self._reply(prompt).split(" "):
+            yield _Message(word + " ")
+
+
+class FakeSentenceModel:
+    def __init__(self, embedder: FakeEmbeddings):
+        self.embedder = embedder
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        return np.asarray([self.embedder._vector(t) for t in texts], dtype=np.float32)
+
+
+class _Scores:
+    def __init__(self, values: np.ndarray):
+        self.values = values
+
+    def cpu(self) -> "_Scores":
+        return self
+
+    def numpy(self) -> np.ndarray:
+        return self.values
+
+
+class FakeBertScorer:
+    # Token-set F1 stands in for BERTScore; same call shape as BERTScorer.score.
+    def score(self, candidates, references, **kwargs):
+        f1 = []
+        for c, r in zip(candidates, references):
+            a, b = set(c.lower().split()), set(r.lower().split())
+            f1.append(2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0)
+        values = np.asarray(f1, dtype=np.float32)
+        return _Scores(values), _Scores(values), _Scores(values)
+
+
+class _OfflineTracking:
+    def init(self, *args, **kwargs):
+        raise RuntimeError("offline benchmark")
+
+
+class _RoundTrips:
+    # Shared by every RecordingNeo4j so a stage's statements are counted across fresh graphs.
+    def __init__(self, rtt_ms: float):
+        self.rtt_s = rtt_ms / 1000.0
+        self.count = 0
+        self.by_statement: Counter = Counter()
+
+    def hit(self, cypher: str):
+        self.count += 1
+        self.by_statement[" ".join(cypher.split())[:60]] += 1
+        if self.rtt_s:
+            time.sleep(self.rtt_s)
+
+
+class _FakeResult:
+    def __init__(self, rows: List[dict]):
+        self._rows = rows
+
+    def single(self) -> Optional[dict]:
+        return self._rows[0] if self._rows else None
+
+    def data(self) -> List[dict]:
+        return list(self._rows)
+
+
+class _FakeTx:
+    def __init__(self, graph: "RecordingNeo4j"):
+        self._graph = graph
+
+    def run(self, cypher: str, params: Optional[dict] = None) -> _FakeResult:
+        return _FakeResult(self._graph.query(cypher, params))
+
+
+class _FakeSession:
+    def __init__(self, graph: "RecordingNeo4j"):
+        self._graph = graph
+
+    def __enter__(self) -> "_FakeSession":
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_read(self, work, *args, **kwargs):
+        return work(_FakeTx(self._graph), *args, **kwargs)
+
+
+class RecordingNeo4j:
+    # Stands in for both Neo4jGraph (graph.query) and the pooled driver (sessions). Each statement
+    # is counted and charged one round trip; a small in-memory store answers the statements
+    # graphProcess sends, so ids, k-hop lists and candidates flow through the real code paths.
+    def __init__(self, trips: _RoundTrips):
+        self.trips = trips
+        self.docs: Dict[str, dict] = {}
+        self.next: Set[Tuple[str, str]] = set()
+        self.similar: Dict[Tuple[str, str], float] = {}
+        self.features: Dict[str, Set[str]] = {}
+        self._writes = {cypher: kind for kind, cypher in graphProcess._UNWIND_QUERIES.items()}
+
+    # ---- driver ------------------------------------------------------------------------
+
+    def session(self, **kwargs) -> _FakeSession:
+        return _FakeSession(self)
+
+    def close(self):
+        pass
+
+    # ---- Neo4jGraph --------------------------------------------------------------------
+
+    def query(self, cypher: str, params: Optional[dict] = None) -> List[dict]:
+        self.trips.hit(cypher)
+        params = params or {}
+        kind = self._writes.get(cypher)
+        if kind is not None:
+            self._apply(kind, params["rows"])
+            return []
+        text = " ".join(cypher.split())
+        if text.startswith("CREATE"):
+            return []
+        if "coalesce(d.ingested" in text:
+            return [{"id": i, "ingested": d.get("ingested", False)} for i, d in self._file_docs(params["file"])]
+        if "DETACH DELETE d" in text:
+            for doc_id in params["ids"]:
+                self._delete(doc_id)
+            return []
+        if "$next[a.id]" in text:
+            wanted = params["next"]
+            return [
+                {"a": a, "b": b} for a, b in sorted(self.next)
+                if self.docs[a]["file"] == params["file"] and wanted.get(a) != b
+            ]
+        if "DELETE r" in text:
+            self.next.difference_update(tuple(pair) for pair in params["pairs"])
+            return []
+        if "khop_ids IS NULL RETURN" in text:
+            return [{"id": i} for i, d in self._file_docs(params["file"]) if "khop_ids" not in d]
+        if "SET d.khop_ids" in text:
+            for doc_id in params["ids"]:
+                if doc_id in self.docs:
+                    ranked = self._bfs(doc_id, graphProcess.KHOP_MAX_DEPTH)[:params["limit"]]
+                    self.docs[doc_id]["khop_ids"] = [n for n, _ in ranked]
+                    self.docs[doc_id]["khop_hops"] = [h for _, h in ranked]
+            return []
+        if "collect(DISTINCT d.id) + collect(DISTINCT nbr.id)" in text:
+            found = {i for i in params["ids"] if i in self.docs}
+            for doc_id in list(found):
+                found.update(n for n, _ in self._bfs(doc_id, graphProcess.KHOP_MAX_DEPTH))
+            return [{"id": i} for i in sorted(found)]
+        if "AS expanded" in text:
+            return [self._fetch(params)]
+        raise ValueError(f"RecordingNeo4j: unrecognised statement: {text[:80]}")
+
+    # ---- store -------------------------------------------------------------------------
+
+    def _file_docs(self, file_key: str):
+        return [(i, d) for i, d in self.docs.items() if d["file"] == file_key]
+
+    def _apply(self, kind: str, rows: List[dict]):
+        for row in rows:
+            if kind == "documents":
+                self.docs.setdefault(row["id"], {}).update(
+                    {"file": row["file"], "text": row["text"], "spans": row.get("sentence_spans")}
+                )
+            elif kind == "ingested" and row["id"] in self.docs:
+                self.docs[row["id"]]["ingested"] = True
+            elif kind == "next" and row["prev"] in self.docs and row["curr"] in self.docs:
+                self.next.add((row["prev"], row["curr"]))
+            elif kind == "similar" and row["a"] in self.docs and row["b"] in self.docs:
+                self.similar[(row["a"], row["b"])] = float(row["score"])
+            elif kind == "entities":
+                self.features.setdefault(row["doc_id"], set()).add(f"entity:{row['type']}:{row['name']}")
+            elif kind == "topics":
+                features = self.features.setdefault(row["doc_id"], set())
+                features.difference_update([f for f in features if f.startswith("topic:")])
+                features.add(f"topic:{row['topic']}")
+
+    def _delete(self, doc_id: str):
+        self.docs.pop(doc_id, None)
+        self.features.pop(doc_id, None)
+        self.next = {pair for pair in self.next if doc_id not in pair}
+        self.similar = {pair: score for pair, score in self.similar.items() if doc_id not in pair}
+
+    def _bfs(self, start: str, depth: int) -> List[Tuple[str, int]]:
+        # Same order as refresh_khop_cache: by hops, then the strongest shortest path (weakest
+        # link; NEXT counts as 1.0), then id.
+        adjacency: Dict[str, Dict[str, float]] = {}
+        for (a, b), weight in [(pair, 1.0) for pair in self.next] + list(self.similar.items()):
+            for x, y in ((a, b), (b, a)):
+                adjacency.setdefault(x, {})[y] = max(weight, adjacency.get(x, {}).get(y, 0.0))
+        hops = {start: 0}
+        strength = {start: 1.0}
+        frontier = [start]
+        for hop in range(1, depth + 1):
+            reached: Dict[str, float] = {}
+            for node in frontier:
+                for nbr, weight in adjacency.get(node, {}).items():
+                    if nbr not in hops:
+                        reached[nbr] = max(reached.get(nbr, 0.0), min(strength[node], weight))
+            for nbr, weight in reached.items():
+                hops[nbr], strength[nbr] = hop, weight
+            frontier = list(reached)
+        ranked = sorted((n for n in hops if n != start), key=lambda n: (hops[n], -strength[n], n))
+        return [(n, hops[n]) for n in ranked]
+
+    def _row(self, doc_id: str, **extra) -> dict:
+        doc = self.docs[doc_id]
+        return {"id": doc_id, "text": doc["text"], "spans": doc["spans"], **extra}
+
+    def _fetch(self, params: dict) -> dict:
+        # The single-statement retrieval: term-overlap seeds, k-hop expansion, shared features.
+        terms = set(re.findall(r"[a-z0-9_]+", params["lucene"].lower())) - {"or"}
+        scores = {}
+        for doc_id, doc in self.docs.items():
+            if params["file"] is None or doc["file"] == params["file"]:
+                score = sum(1 for t in re.findall(r"[a-z0-9_]+", doc["text"].lower()) if t in terms)
+                if score:
+                    scores[doc_id] = score
+        seeds = sorted(scores, key=lambda i: (-scores[i], i))[:params["top_k"]]
+        depth = max(1, params["limit"] // max(1, params["top_k"]))
+        expanded: Dict[str, Tuple[int, int]] = {}
+        shared: Counter = Counter()
+        shared_rank: Dict[str, int] = {}
+        if depth > 1:
+            for rank, seed in enumerate(seeds):
+                doc = self.docs[seed]
+                for nbr, hops in zip(doc.get("khop_ids", []), doc.get("khop_hops", [])):
+                    if hops <= depth and nbr not in seeds and nbr in self.docs:
+                        expanded[nbr] = min(expanded.get(nbr, (hops, rank)), (hops, rank))
+                for nbr, feats in self.features.items():
+                    if nbr in seeds or nbr not in self.docs:
+                        continue
+                    if params["file"] is not None and self.docs[nbr]["file"] != params["file"]:
+                        continue
+                    common = len(feats & self.features.get(seed, set()))
+                    if common:
+                        shared[nbr] += common
+                        shared_rank.setdefault(nbr, rank)
+        ordered = sorted(expanded, key=lambda i: expanded[i])[:params["limit"]]
+        ranked_shared = sorted(shared, key=lambda i: (-shared[i], shared_rank[i]))[:params["limit"]]
+        return {
+            "seeds": [self._row(i) for i in seeds],
+            "expanded": [self._row(i, hops=expanded[i][0], seed_rank=expanded[i][1]) for i in ordered],
+            "shared": [self._row(i, seed_rank=shared_rank[i]) for i in ranked_shared],
+        }
+
+
+def _install(resource, value):
+    # Pre-load a lazy resource so first use never reaches the real factory.
+    resource._value = value
+    resource._loaded = True
+
+
+def use_graph(graph):
+    # Everything that calls get_graph()/get_driver() (add_docs, retrieval) now talks to graph.
+    if isinstance(graph, LocalGraph):
+        graphProcess.GRAPH_BACKEND = "local"
+        localGraph._local_graph = graph
+    else:
+        graphProcess.GRAPH_BACKEND = "neo4j"
+        graphProcess.graph_instance = graph
+        graphProcess.driver_instance = graph
+    return graph
+
+
+def install_stand_ins(workdir: str, embed_latency_ms: float, chat_latency_ms: float) -> FakeEmbeddings:
+    embedder = FakeEmbeddings(latency_ms=embed_latency_ms)
+    cache = EmbeddingCache(os.path.join(workdir, "embeddings.sqlite3"))
+    embeddingCache._cache_instance = cache
+    embeddingCache._embedders[MODEL] = CachedEmbeddings(embedder, MODEL, cache)
+    chat = FakeChatModel(latency_ms=chat_latency_ms)
+    client_registry._get(("chat", MODEL, 0), lambda: chat)
+
+    bm25_indexes.directory = os.path.join(workdir, "bm25")
+
+    _install(evaluate._semantic_model, FakeSentenceModel(embedder))
+    _install(evaluate._bert_scorer, FakeBertScorer())
+    _install(evaluate._dagshub, _OfflineTracking())
+    _install(evaluate._mlflow, _OfflineTracking())
+    return embedder
+
+
+def synthetic_pages(n_pages: int, seed: int = 0) -> List[Document]:
+    rng = random.Random(seed)
+    pages = []
+    for page in range(n_pages):
+        paragraphs = []
+        for _ in range(6):
+            sentences = []
+            for _ in range(rng.randint(3, 6)):
+                words = [rng.choice(_VOCAB) for _ in range(rng.randint(8, 18))]
+                if rng.random() < 0.4:
+                    words.insert(rng.randrange(len(words)), rng.choice(_ENTITIES))
+                sentences.append(" ".join(words).capitalize() + f" in {2000 + rng.randrange(25)}.")
+            paragraphs.append(" ".join(sentences))
+        pages.append(Document(page_content="\n\n".join(paragraphs), metadata={"source": "synthetic.pdf", "page": page}))
+    return pages
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def measure(call: Callable[[int], None], items: int, repeat: int, quiet: bool) -> Dict[str, float]:
+    # Latency runs first without tracing; one extra traced run gives peak Python/numpy allocation.
+    sink = open(os.devnull, "w") if quiet else None
+    redirect = (lambda: contextlib.redirect_stdout(sink)) if quiet else contextlib.nullcontext
+    samples = []
+    try:
+        for rep in range(repeat):
+            with redirect():
+                start = time.perf_counter()
+                call(rep)
+                samples.append((time.perf_counter() - start) * 1000.0)
+        tracemalloc.start()
+        try:
+            with redirect():
+                call(repeat)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        if sink:
+            sink.close()
+    return {
+        "items": items,
+        "runs": len(samples),
+        "throughput_per_s": round(items * len(samples) / (sum(samples) / 1000.0), 2),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(_percentile(samples, 0.95), 3),
+        "peak_mem_mb": round(peak / 2**20, 3),
+    }
+
+
+def run_suite(args, workdir: str) -> Dict[str, Dict[str, float]]:
+    embedder = install_stand_ins(workdir, args.embed_latency_ms, args.chat_latency_ms)
+    trips = _RoundTrips(args.graph_rtt_ms)
+    results: Dict[str, Dict[str, float]] = {}
+
+    def fresh_graph(name: str):
+        # A new, empty graph per run: reps must not pile files into one store.
+        if args.graph == "local":
+            return LocalGraph(os.path.join(workdir, name))
+        return RecordingNeo4j(trips)
+
+    def record(stage: str, size: int, stats: Dict[str, float]):
+        results[f"{stage}@{size}"] = stats
+        line = (
+            f"{stage:<32} pages={size:<5} items={stats['items']:<6} {stats['throughput_per_s']:>10.1f}/s  "
+            f"p50={stats['p50_ms']:>9.2f}ms  p95={stats['p95_ms']:>9.2f}ms  peak={stats['peak_mem_mb']:>8.2f}MB"
+        )
+        if "graph_round_trips" in stats:
+            line += f"  round_trips={stats['graph_round_trips']:.1f}"
+        print(line)
+
+    def measure_graph(call: Callable[[int], None], items: int, repeat: int) -> Dict[str, float]:
+        trips.count = 0
+        stats = measure(call, items, repeat, args.quiet)
+        if args.graph == "neo4j":
+            # Per run, including the extra traced one.
+            stats["graph_round_trips"] = round(trips.count / (stats["runs"] + 1), 1)
+        return stats
+
+    for size in args.sizes:
+        pages = synthetic_pages(size)
+        chunks = split_document(pages)
+        texts = [c.page_content for c in chunks]
+        record("split_document", size, measure(lambda rep: split_document(pages), size, args.repeat, args.quiet))
+
+        # Each run ingests fresh chunk objects into a fresh collection and a fresh graph, so nothing
+        # is skipped as unchanged, no embedding comes from an earlier run's cache entries and the
+        # graph does not grow from run to run.
+        batches = [split_document(pages) for _ in range(args.repeat + 1)]
+        ingest_graphs = {}
+
+        def ingest(rep: int):
+            name = f"bench_{size}_{rep}.pdf"
+            ingest_graphs[rep] = use_graph(fresh_graph(f"graph_ingest_{size}_{rep}"))
+            db = Chroma(
+                collection_name=name,
+                embedding_function=CachedEmbeddings(embedder, name, embeddingCache._cache_instance),
+                persist_directory=os.path.join(workdir, "chroma"),
+            )
+            add_docs(db, batches[rep], collection_name=name)
+
+        record("add_docs", size, measure_graph(ingest, len(chunks), args.repeat))
+
+        vectors = embedder.embed_documents(texts)
+
+        def insert(rep: int):
+            graph = fresh_graph(f"graph_{size}_{rep}")
+            insert_docs_to_graph(graph, chunks, embeddings=vectors, file_key=f"insert_{size}_{rep}.pdf")
+
+        record("insert_docs_to_graph", size, measure_graph(insert, len(chunks), args.repeat))
+
+        # Queries run against the graph and collection of the first add_docs run.
+        use_graph(ingest_graphs[0])
+        rng = random.Random(size)
+        queries = [" ".join(rng.sample(_VOCAB, 4)) for _ in range(args.queries)]
+        collection = f"bench_{size}_0.pdf"
+        for depth in (1, 2, 3):
+            record(
+                f"get_related_context[depth={depth}]",
+                size,
+                measure_graph(
+                    lambda rep: get_related_context(queries[rep % len(queries)], 5, depth, collection),
+                    1,
+                    args.queries,
+                ),
+            )
+
+        contexts = ["\n".join(texts[i:i + 8]) for i in range(0, len(texts), 8)]
+        for label in ("simple", "complex"):
+            record(
+                f"adaptive_context[{label}]",
+                size,
+                measure(
+                    lambda rep: _adaptive_context_granularity(contexts[rep % len(contexts)], 600, label),
+                    1,
+                    args.queries,
+                    args.quiet,
+                ),
+            )
+
+        rows = len(texts)
+        predictions = [t[:200] for t in texts]
+        ground_truths = [t[100:300] for t in texts]
+        eval_queries = [" ".join(t.split()[:8]) for t in texts]
+        record(
+            "evaluate_llm_predictions",
+            size,
+            measure(
+                lambda rep: evaluate.evaluate_llm_predictions(
+                    predictions,
+                    ground_truths,
+                    eval_queries,
+                    contexts=texts,
+                    output_path=os.path.join(workdir, "results.csv"),
+                    return_rows=False,
+                ),
+                rows,
+                args.repeat,
+                args.quiet,
+            ),
+        )
+    return results
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float, mem_tolerance: float):
+    # Latency and throughput share one tolerance; memory has its own since allocator noise differs.
+    regressions = []
+    for key, base in baseline.items():
+        now = current.get(key)
+        if now is None:
+            continue
+        checks = (
+            ("p50_ms", now["p50_ms"] > base["p50_ms"] * (1 + tolerance)),
+            ("p95_ms", now["p95_ms"] > base["p95_ms"] * (1 + tolerance)),
+            ("throughput_per_s", now["throughput_per_s"] < base["throughput_per_s"] / (1 + tolerance)),
+            ("peak_mem_mb", now["peak_mem_mb"] > base["peak_mem_mb"] * (1 + mem_tolerance)),
+        )
+        for metric, regressed in checks:
+            if regressed:
+                regressions.append((key, metric, base[metric], now[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 40, 160], help="corpus sizes in pages")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per ingest stage")
+    parser.add_argument("--queries", type=int, default=50, help="calls per query-time stage")
+    parser.add_argument("--embed-latency-ms", type=float, default=2.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=5.0)
+    parser.add_argument("--graph", choices=("neo4j", "local"), default="neo4j",
+                        help="recording Neo4j stand-in (Cypher path) or the in-process LocalGraph")
+    parser.add_argument("--graph-rtt-ms", type=float, default=1.0, help="delay charged per Neo4j statement")
+    parser.add_argument("--save", help="write results to this JSON baseline")
+    parser.add_argument("--compare", help="compare against this JSON baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--mem-tolerance", type=float, default=0.25)
+    parser.add_argument("--verbose", dest="quiet", action="store_false", help="keep the pipeline's debug output")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("version") != BASELINE_VERSION:
+            parser.error(f"{args.compare}: unsupported baseline version {baseline.get('version')}")
+        # Same corpora and stand-in latencies as the baseline, unless overridden on the command line.
+        config = baseline["config"]
+        for name in ("sizes", "repeat", "queries", "embed_latency_ms", "chat_latency_ms", "graph", "graph_rtt_ms"):
+            if f"--{name.replace('_', '-')}" not in sys.argv:
+                setattr(args, name, config[name])
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as workdir:
+        results = run_suite(args, workdir)
+
+    if args.save:
+        config = {
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+            "queries": args.queries,
+            "embed_latency_ms": args.embed_latency_ms,
+            "chat_latency_ms": args.chat_latency_ms,
+            "graph": args.graph,
+            "graph_rtt_ms": args.graph_rtt_ms,
+        }
+        payload = {
+            "version": BASELINE_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "config": config,
+            "results": results,
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, sort_keys=True)
+        print(f"\nbaseline written to {args.save}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline["results"], args.tolerance, args.mem_tolerance)
+        if not regressions:
+            print(f"\nno regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+            return
+        print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+        for key, metric, before, after in regressions:
+            print(f"  {key:<44} {metric:<17} {before:>12} -> {after}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Scaling benchmark for SIMILAR_TO edge construction.
+# Run from backend/project:  python -m benchmarks.bench_similarity --sizes 1000 10000 100000
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from similarityIndex import hnswlib, top_k_similar_pairs
+
+
+def _synthetic_embeddings(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Clustered vectors so a realistic share of pairs clears the similarity threshold.
+    centers = rng.normal(size=(max(1, n // 50), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=n)
+    return centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def _dense_baseline(embeddings: np.ndarray, threshold: float) -> int:
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    sim = cosine_similarity(embeddings)
+    return int(np.count_nonzero(np.triu(sim, k=1) > threshold))
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 100000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=0.75)
+    parser.add_argument("--block-size", type=int, default=2048)
+    parser.add_argument("--dense-max", type=int, default=10000, help="largest n to run the dense n x n baseline on")
+    args = parser.parse_args()
+
+    methods = ["exact"] + (["ann"] if hnswlib is not None else [])
+    print(f"{'n':>8} {'method':>8} {'seconds':>10} {'peak_mb':>10} {'edges':>10}")
+    for n in args.sizes:
+        embeddings = _synthetic_embeddings(n, args.dim)
+
+        if n <= args.dense_max:
+            edges, secs, peak = _measure(lambda: _dense_baseline(embeddings, args.threshold))
+            print(f"{n:>8} {'dense':>8} {secs:>10.3f} {peak:>10.1f} {edges:>10}")
+
+        for method in methods:
+            (pairs, _), secs, peak = _measure(
+                lambda: top_k_similar_pairs(
+                    embeddings,
+                    k=args.k,
+                    threshold=args.threshold,
+                    block_size=args.block_size,
+                    method=method,
+                )
+            )
+            print(f"{n:>8} {method:>8} {secs:>10.3f} {peak:>10.1f} {len(pairs):>10}")
+
+
+if __name__ == "__main__":
+    main()
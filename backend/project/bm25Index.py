@@ -0,0 +1,196 @@
+# Per-collection BM25 inverted index kept on disk next to Chroma. Postings are delta-encoded doc
+# ids and term frequencies stored at the narrowest integer width each list needs, in one blob
+# that is memory-mapped at load; a lookup only touches the postings of the query's terms.
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embeddingCache import content_hash
+from GlobalVars import CACHE_DIR, DEBUG
+from localGraph import StringTable
+
+BM25_DIR = os.getenv("BM25_DIR", os.path.join(CACHE_DIR, "bm25"))
+BM25_ENABLED = os.getenv("BM25_ENABLED", "1") != "0"
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_VERSION = 1
+
+_WIDTHS = {1: np.uint8, 2: np.uint16, 4: np.uint32}
+_TABLES = ("doc_ids", "doc_texts", "doc_spans", "terms")
+_ARRAYS = ("doc_len", "post_offset", "post_df", "post_widths")
+
+
+def _terms(text: str) -> List[str]:
+    # Same tokens as the query side; short tokens are kept so part numbers and codes still match.
+    return re.findall(r"[A-Za-z0-9_]+", (text or "").lower())
+
+
+def _width(max_value: int) -> int:
+    return 1 if max_value < 1 << 8 else 2 if max_value < 1 << 16 else 4
+
+
+def _collection_dir(collection: str, directory: str = BM25_DIR) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", collection)[:48]
+    return os.path.join(directory, f"{safe}_{content_hash(collection)[:8]}")
+
+
+class BM25Index:
+    def __init__(self, meta: Dict[str, object], tables: Dict[str, StringTable], arrays: Dict[str, np.ndarray], blob):
+        self.n_docs = int(meta["n_docs"])
+        self.avgdl = float(meta["avgdl"]) or 1.0
+        self.postings = blob
+        for name, table in tables.items():
+            setattr(self, name, table)
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str], spans: Optional[Sequence[str]] = None) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_len = np.zeros(len(ids), dtype=np.uint32)
+        for i, text in enumerate(texts):
+            counts = Counter(_terms(text))
+            doc_len[i] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((i, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms), dtype=np.int64)
+        dfs = np.zeros(len(terms), dtype=np.uint32)
+        widths = np.zeros((len(terms), 2), dtype=np.uint8)
+        chunks: List[bytes] = []
+        position = 0
+        for t, term in enumerate(terms):
+            docs = np.fromiter((d for d, _ in postings[term]), dtype=np.int64)
+            tfs = np.fromiter((f for _, f in postings[term]), dtype=np.int64)
+            deltas = np.diff(docs, prepend=0)
+            id_width, tf_width = _width(int(deltas.max())), _width(int(tfs.max()))
+            data = deltas.astype(_WIDTHS[id_width]).tobytes() + tfs.astype(_WIDTHS[tf_width]).tobytes()
+            offsets[t], dfs[t], widths[t] = position, len(docs), (id_width, tf_width)
+            chunks.append(data)
+            position += len(data)
+
+        meta = {"n_docs": len(ids), "avgdl": float(doc_len.mean()) if len(ids) else 0.0}
+        tables = {
+            "doc_ids": StringTable.from_list(list(ids)),
+            "doc_texts": StringTable.from_list(list(texts)),
+            "doc_spans": StringTable.from_list([s or "" for s in (spans or [""] * len(ids))]),
+            "terms": StringTable.from_list(terms),
+        }
+        arrays = {"doc_len": doc_len, "post_offset": offsets, "post_df": dfs, "post_widths": widths}
+        return cls(meta, tables, arrays, np.frombuffer(b"".join(chunks), dtype=np.uint8))
+
+    def save(self, directory: str):
+        tmp_dir = directory.rstrip("/\\") + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in _TABLES:
+            getattr(self, name).save(tmp_dir, name)
+        for name in _ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(getattr(self, name)))
+        np.save(os.path.join(tmp_dir, "postings.npy"), np.asarray(self.postings))
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": BM25_VERSION, "n_docs": self.n_docs, "avgdl": self.avgdl}, f)
+
+        # Swap directories so concurrent readers never open a half-written index.
+        old_dir = directory.rstrip("/\\") + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(directory):
+            os.replace(directory, old_dir)
+        os.replace(tmp_dir, directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> Optional["BM25Index"]:
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != BM25_VERSION:
+            return None
+        tables = {name: StringTable.load(directory, name, mmap_mode) for name in _TABLES}
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in _ARRAYS}
+        blob = np.load(os.path.join(directory, "postings.npy"), mmap_mode=mmap_mode)
+        return cls(meta, tables, arrays, blob)
+
+    def _postings(self, t: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, df = int(self.post_offset[t]), int(self.post_df[t])
+        id_width, tf_width = (int(w) for w in self.post_widths[t])
+        ids_end = start + df * id_width
+        deltas = np.frombuffer(self.postings[start:ids_end].tobytes(), dtype=_WIDTHS[id_width])
+        tfs = np.frombuffer(self.postings[ids_end:ids_end + df * tf_width].tobytes(), dtype=_WIDTHS[tf_width])
+        return np.cumsum(deltas, dtype=np.int64), tfs.astype(np.float32)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        matched_docs, matched_scores = [], []
+        for term in dict.fromkeys(_terms(query)):
+            t = self.terms.bisect(term)
+            if t < 0:
+                continue
+            docs, tfs = self._postings(t)
+            df = len(docs)
+            idf = math.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * np.asarray(self.doc_len[docs], dtype=np.float32) / self.avgdl)
+            matched_docs.append(docs)
+            matched_scores.append(idf * tfs * (BM25_K1 + 1.0) / (tfs + norm))
+        if not matched_docs:
+            return []
+
+        docs, inverse = np.unique(np.concatenate(matched_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(matched_scores))
+        k = min(max(1, top_k), len(docs))
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Ties break on document order so results are stable across runs.
+        top = top[np.lexsort((docs[top], -scores[top]))]
+        return [(int(docs[i]), float(scores[i])) for i in top]
+
+    def hits(self, query: str, top_k: int) -> List[Dict[str, object]]:
+        return [
+            {"id": self.doc_ids[d], "text": self.doc_texts[d], "spans": self.doc_spans[d] or None, "score": score}
+            for d, score in self.search(query, top_k)
+        ]
+
+
+class BM25Registry:
+    # Loaded indexes per collection; rebuilding a collection swaps its entry atomically.
+    def __init__(self, directory: str = BM25_DIR):
+        self.directory = directory
+        self._indexes: Dict[str, Optional[BM25Index]] = {}
+        self._lock = threading.Lock()
+
+    def rebuild(self, collection: str, ids: Sequence[str], texts: Sequence[str], spans: Optional[Sequence[str]] = None):
+        index = BM25Index.build(ids, texts, spans)
+        path = _collection_dir(collection, self.directory)
+        os.makedirs(self.directory, exist_ok=True)
+        index.save(path)
+        loaded = BM25Index.load(path)
+        with self._lock:
+            self._indexes[collection] = loaded
+        if DEBUG:
+            print(f"[BM25] {collection}: docs={index.n_docs} | terms={len(index.terms)} | postings={len(index.postings)}B")
+
+    def get(self, collection: str) -> Optional[BM25Index]:
+        with self._lock:
+            if collection not in self._indexes:
+                self._indexes[collection] = BM25Index.load(_collection_dir(collection, self.directory))
+            return self._indexes[collection]
+
+    def search(self, collection: str, query: str, top_k: int) -> List[Dict[str, object]]:
+        index = self.get(collection)
+        return index.hits(query, top_k) if index is not None and index.n_docs else []
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+bm25_indexes = BM25Registry()
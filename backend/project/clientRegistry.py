@@ -0,0 +1,81 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+from langchain_chroma.vectorstores import Chroma
+from langchain_ollama import ChatOllama
+
+from embeddingCache import get_cached_embeddings
+from GlobalVars import DEBUG
+
+CLIENT_REGISTRY_SIZE = int(os.getenv("CLIENT_REGISTRY_SIZE", "16"))
+
+
+class ClientRegistry:
+    # Warm model and vector-store clients shared across requests, evicted least-recently-used.
+    def __init__(self, max_size: int = CLIENT_REGISTRY_SIZE):
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: Hashable, factory: Callable[[], object]):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            self.misses += 1
+            client = factory()
+            self._entries[key] = client
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                if DEBUG:
+                    print(f"[CLIENTS] Evicted {evicted}")
+            return client
+
+    def get_vectorstore(self, collection_name: str, model_name: str, directory: str) -> Chroma:
+        return self._get(
+            ("chroma", collection_name, model_name, directory),
+            lambda: Chroma(
+                collection_name=collection_name,
+                embedding_function=get_cached_embeddings(model_name),
+                persist_directory=directory,
+            ),
+        )
+
+    def get_chat_model(self, model_name: str, temperature: float = 0) -> ChatOllama:
+        return self._get(
+            ("chat", model_name, temperature),
+            lambda: ChatOllama(model=model_name, temperature=temperature),
+        )
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if key[0] == "chroma" and (collection_name is None or key[1] == collection_name)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+        if collection_name is None:
+            # Chroma caches one System per persist directory; drop it so a wiped
+            # directory is reopened from scratch instead of through stale handles.
+            try:
+                from chromadb.api.client import SharedSystemClient
+
+                SharedSystemClient.clear_system_cache()
+            except Exception as e:
+                if DEBUG:
+                    print("[CLIENTS] Could not clear Chroma system cache:", e)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+client_registry = ClientRegistry()
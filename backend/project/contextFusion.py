@@ -0,0 +1,176 @@
+# Merges vector and graph evidence into one de-duplicated, budgeted context.
+# Graph expansion (NEXT/SIMILAR_TO) often lands on chunks Chroma already returned; without this
+# stage the prompt pays for them twice.
+import os
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from embeddingCache import content_hash
+from GlobalVars import DEBUG
+from textSegments import segment_text
+
+# "mmr": de-duplicate and select by marginal relevance; "none": pack each source independently.
+CONTEXT_FUSION = os.getenv("CONTEXT_FUSION", "mmr")
+FUSION_NEAR_DUP_THRESHOLD = float(os.getenv("FUSION_NEAR_DUP_THRESHOLD", "0.95"))
+FUSION_MMR_LAMBDA = float(os.getenv("FUSION_MMR_LAMBDA", "0.7"))
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def fetch_chunk_embeddings(db, ids: Sequence[str]) -> Dict[str, np.ndarray]:
+    # Chunk ids are shared by Chroma and the graph, so one lookup covers evidence from both.
+    ids = list(dict.fromkeys(i for i in ids if i))
+    if not ids:
+        return {}
+    try:
+        found = db._collection.get(ids=ids, include=["embeddings"])
+    except Exception as e:
+        if DEBUG:
+            print("[FUSION] Could not fetch chunk embeddings:", e)
+        return {}
+    vectors = found.get("embeddings")
+    if vectors is None:
+        return {}
+    return {chunk_id: _unit(vector) for chunk_id, vector in zip(found.get("ids", []), vectors)}
+
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(sentence.lower().split())
+
+
+def _units(item: Dict[str, object], sentence_level: bool) -> List[Tuple[str, int]]:
+    # Sentences for complex queries, whole lines otherwise; mirrors pack_segments' granularity.
+    text, spans = item["text"], item["spans"]
+    if sentence_level:
+        return [(text[s:e], t) for s, e, t, _ in spans]
+    units: List[Tuple[str, int]] = []
+    current_line, parts, tokens = None, [], 0
+    for s, e, t, line in spans:
+        if line != current_line and parts:
+            units.append((" ".join(parts), tokens))
+            parts, tokens = [], 0
+        current_line = line
+        parts.append(text[s:e])
+        tokens += t
+    if parts:
+        units.append((" ".join(parts), tokens))
+    return units
+
+
+def fuse_evidence(
+    vector_items: Sequence[Dict[str, object]],
+    graph_items: Sequence[Dict[str, object]],
+    query_embedding,
+    chunk_embeddings: Dict[str, np.ndarray],
+    weights: Dict[str, float],
+    token_budget: int,
+    complexity_label: str,
+) -> Tuple[str, str, Dict[str, object]]:
+    # Items are {"id", "text", "spans"}; returns (vector_context, graph_context, stats).
+    query = _unit(query_embedding) if query_embedding is not None else None
+    candidates: List[Dict[str, object]] = []
+    for source, items in (("vector", vector_items), ("graph", graph_items)):
+        for rank, item in enumerate(items):
+            spans = item.get("spans")
+            candidates.append(
+                {
+                    "id": item.get("id"),
+                    "source": source,
+                    "rank": rank,
+                    "text": item["text"],
+                    "spans": list(spans) if spans is not None else segment_text(item["text"]),
+                    "vector": chunk_embeddings.get(item.get("id")),
+                }
+            )
+    tokens_in = sum(t for c in candidates for _, _, t, _ in c["spans"])
+    stats = {
+        "candidate_chunks": len(candidates),
+        "candidate_tokens": tokens_in,
+        "exact_duplicates": 0,
+        "near_duplicates": 0,
+        "duplicate_sentences": 0,
+    }
+
+    # 1. Chunk level: same id, same normalized content, or embeddings that are practically identical.
+    kept: List[Dict[str, object]] = []
+    seen_ids, seen_hashes = set(), set()
+    for c in candidates:
+        digest = content_hash(_sentence_key(c["text"]))
+        if (c["id"] and c["id"] in seen_ids) or digest in seen_hashes:
+            stats["exact_duplicates"] += 1
+            continue
+        if c["vector"] is not None and any(
+            k["vector"] is not None and float(k["vector"] @ c["vector"]) >= FUSION_NEAR_DUP_THRESHOLD for k in kept
+        ):
+            stats["near_duplicates"] += 1
+            continue
+        seen_ids.add(c["id"])
+        seen_hashes.add(digest)
+        kept.append(c)
+
+    # 2. Sentence level: overlapping chunk windows repeat sentences verbatim; keep the first occurrence.
+    seen_sentences = set()
+    for c in kept:
+        unique_spans = []
+        for span in c["spans"]:
+            key = _sentence_key(c["text"][span[0]:span[1]])
+            if key in seen_sentences:
+                stats["duplicate_sentences"] += 1
+                continue
+            seen_sentences.add(key)
+            unique_spans.append(span)
+        c["spans"] = unique_spans
+    kept = [c for c in kept if c["spans"]]
+    tokens_unique = sum(t for c in kept for _, _, t, _ in c["spans"])
+
+    # 3. Maximal marginal relevance under the fused budget; source weights scale relevance.
+    for c in kept:
+        if query is not None and c["vector"] is not None:
+            relevance = float(c["vector"] @ query)
+        else:
+            relevance = 1.0 / (1.0 + c["rank"])
+        c["relevance"] = relevance * float(weights.get(c["source"], 0.5))
+
+    sentence_level = complexity_label == "complex"
+    budget = max(80, token_budget)
+    used = 0
+    selected: List[Tuple[Dict[str, object], str]] = []
+    remaining = list(kept)
+    while remaining and used < budget:
+        best_index, best_score = 0, None
+        for i, c in enumerate(remaining):
+            redundancy = 0.0
+            if c["vector"] is not None:
+                similar = [float(c["vector"] @ s["vector"]) for s, _ in selected if s["vector"] is not None]
+                redundancy = max(similar, default=0.0)
+            score = FUSION_MMR_LAMBDA * c["relevance"] - (1.0 - FUSION_MMR_LAMBDA) * redundancy
+            if best_score is None or score > best_score:
+                best_index, best_score = i, score
+        c = remaining.pop(best_index)
+
+        parts = []
+        for unit, tokens in _units(c, sentence_level):
+            if used + tokens > budget:
+                break
+            parts.append(unit)
+            used += tokens
+        if parts:
+            selected.append((c, "\n".join(parts)))
+
+    vector_context = "\n".join(text for c, text in selected if c["source"] == "vector")
+    graph_context = "\n---\n".join(text for c, text in selected if c["source"] == "graph")
+    stats.update(
+        {
+            "selected_chunks": len(selected),
+            "selected_tokens": used,
+            "unique_tokens": tokens_unique,
+            # Tokens of evidence that was only a repeat of something already kept.
+            "tokens_saved": tokens_in - tokens_unique,
+        }
+    )
+    return vector_context, graph_context, stats
@@ -1,21 +1,99 @@
+import multiprocessing
 import os
 import shutil
-from typing import Dict
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional
 
-from langchain_chroma.vectorstores import Chroma
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_ollama.embeddings import OllamaEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from answerCache import answer_cache
+from bm25Index import BM25_ENABLED, bm25_indexes
+from clientRegistry import client_registry
+from embeddingCache import EMBED_BATCH_SIZE, get_cached_embeddings
 from GlobalVars import *
-from graphProcess import get_graph, insert_docs_to_graph
+from graphProcess import get_graph, insert_docs_to_graph, make_chunk_ids
+from localGraph import get_local_graph
+from pdfPages import count_pages, parse_page_range
+from stageMetrics import span, timed_iter
+from textSegments import segment_metadata
 
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
 
-def load_document(file_path):
+
+class IngestCancelled(Exception):
+    pass
+
+
+def _no_progress(stage: str, **counters):
+    pass
+
+
+# One parser pool per worker count, shared by all uploads instead of started per file.
+_pdf_pools: Dict[int, ProcessPoolExecutor] = {}
+_pdf_pools_lock = threading.Lock()
+
+
+def _get_pdf_pool(workers: int) -> ProcessPoolExecutor:
+    # "spawn": ingest runs on a worker thread of a multithreaded API process, and a forked child
+    # can inherit a lock some other thread was holding and deadlock.
+    with _pdf_pools_lock:
+        pool = _pdf_pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pdf_pools[workers] = pool
+        return pool
+
+
+def _discard_pdf_pool(workers: int, pool: ProcessPoolExecutor):
+    with _pdf_pools_lock:
+        if _pdf_pools.get(workers) is pool:
+            del _pdf_pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_document_pages(file_path, workers: int = PDF_PARSE_WORKERS) -> Iterator[List[object]]:
+    total_pages = count_pages(file_path)
+    if workers <= 1 or total_pages < PDF_PARALLEL_MIN_PAGES:
+        yield PyPDFLoader(file_path).load()
+        return
+
+    ranges = [(s, min(total_pages, s + PDF_PAGES_PER_TASK)) for s in range(0, total_pages, PDF_PAGES_PER_TASK)]
+    pool = _get_pdf_pool(workers)
+    futures = []
+    try:
+        futures = [pool.submit(parse_page_range, file_path, start, end) for start, end in ranges]
+        # Yield in page order; later ranges keep parsing while callers consume earlier ones.
+        for future in futures:
+            yield future.result()
+    except BrokenProcessPool:
+        # A crashed worker breaks the pool for good; the next upload starts a fresh one.
+        _discard_pdf_pool(workers, pool)
+        raise
+    finally:
+        # A cancelled or failed ingest stops here; its queued ranges must not hold up other uploads.
+        for future in futures:
+            future.cancel()
+
+
+def load_document(file_path, workers: int = PDF_PARSE_WORKERS):
     if DEBUG:
         print(f"[DOC] Loading document from: {file_path}")
-    document_loader = PyPDFLoader(file_path)
-    return document_loader.load()
+    with span("pdf_load"):
+        return [page for batch in iter_document_pages(file_path, workers=workers) for page in batch]
+
+
+def _classify_profile(page_count: int, total_chars: int) -> str:
+    avg_chars = total_chars / max(1, page_count)
+    if total_chars <= 5000:
+        return "short"
+    if page_count >= 25 or avg_chars >= 3500:
+        return "dense"
+    return "standard"
 
 
 def infer_document_profile(document) -> Dict[str, object]:
@@ -23,13 +101,7 @@ def infer_document_profile(document) -> Dict[str, object]:
     lengths = [len(getattr(d, "page_content", "")) for d in document] if document else [0]
     total_chars = sum(lengths)
     avg_chars = total_chars / max(1, page_count)
-
-    if total_chars <= 5000:
-        profile = "short"
-    elif page_count >= 25 or avg_chars >= 3500:
-        profile = "dense"
-    else:
-        profile = "standard"
+    profile = _classify_profile(page_count, total_chars)
 
     return {
         "profile": profile,
@@ -47,39 +119,69 @@ def get_chunk_params(profile: str) -> Dict[str, int]:
     return {"chunk_size": 1024, "chunk_overlap": 220}
 
 
-def split_document(document, chunk_strategy: str = "adaptive", chunk_size: int = None, chunk_overlap: int = None):
-    if DEBUG:
-        print("[DOC] Splitting document into chunks...")
-
-    profile_info = infer_document_profile(document)
-    selected_profile = profile_info["profile"]
-
+def _resolve_chunk_params(profile: str, chunk_strategy: str, chunk_size, chunk_overlap):
     if chunk_strategy == "adaptive" and (chunk_size is None or chunk_overlap is None):
-        params = get_chunk_params(selected_profile)
-        chunk_size = params["chunk_size"]
-        chunk_overlap = params["chunk_overlap"]
-    else:
-        chunk_size = chunk_size or 1024
-        chunk_overlap = chunk_overlap or 220
+        params = get_chunk_params(profile)
+        return params["chunk_size"], params["chunk_overlap"]
+    return chunk_size or 1024, chunk_overlap or 220
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-    )
-    chunks = splitter.split_documents(document)
 
-    for idx, chunk in enumerate(chunks):
+def _annotate_chunks(chunks, first_index: int, chunk_size: int, chunk_overlap: int, profile: str):
+    for idx, chunk in enumerate(chunks, start=first_index):
         metadata = getattr(chunk, "metadata", {}) or {}
         metadata.update(
             {
                 "chunk_index": idx,
                 "chunk_size": chunk_size,
                 "chunk_overlap": chunk_overlap,
-                "chunk_profile": selected_profile,
+                "chunk_profile": profile,
             }
         )
         chunk.metadata = metadata
 
+
+def split_document_stream(
+    page_batches, total_pages: int, chunk_strategy: str = "adaptive", chunk_size: int = None, chunk_overlap: int = None
+):
+    # The splitter works page by page, so chunks match split_document exactly as long as the
+    # profile agrees. It is fixed from the first batch, extrapolated to total_pages.
+    splitter = None
+    next_index = 0
+    for batch in page_batches:
+        if splitter is None:
+            first_chars = sum(len(getattr(d, "page_content", "")) for d in batch)
+            estimated_chars = int(first_chars / max(1, len(batch)) * total_pages)
+            selected_profile = _classify_profile(total_pages, estimated_chars)
+            chunk_size, chunk_overlap = _resolve_chunk_params(
+                selected_profile, chunk_strategy, chunk_size, chunk_overlap
+            )
+            splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            if DEBUG:
+                print(f"[DOC] Streaming split | profile={selected_profile} | chunk_size={chunk_size}")
+
+        with span("split"):
+            chunks = splitter.split_documents(batch)
+        _annotate_chunks(chunks, next_index, chunk_size, chunk_overlap, selected_profile)
+        next_index += len(chunks)
+        yield batch, chunks
+
+
+def split_document(document, chunk_strategy: str = "adaptive", chunk_size: int = None, chunk_overlap: int = None):
+    if DEBUG:
+        print("[DOC] Splitting document into chunks...")
+
+    profile_info = infer_document_profile(document)
+    selected_profile = profile_info["profile"]
+    chunk_size, chunk_overlap = _resolve_chunk_params(selected_profile, chunk_strategy, chunk_size, chunk_overlap)
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+    with span("split"):
+        chunks = splitter.split_documents(document)
+    _annotate_chunks(chunks, 0, chunk_size, chunk_overlap, selected_profile)
+
     if DEBUG:
         print(
             f"[DOC] Profile={selected_profile} | chunk_size={chunk_size} | chunk_overlap={chunk_overlap} | chunks={len(chunks)}"
@@ -89,42 +191,136 @@ def split_document(document, chunk_strategy: str = "adaptive", chunk_size: int =
 
 
 def get_embeddings_function(model_name):
-    return OllamaEmbeddings(model=model_name)
+    return get_cached_embeddings(model_name)
 
 
-def add_docs(client, chunks):
+def add_docs(client, chunks, on_progress: Optional[Callable] = None, collection_name: Optional[str] = None):
+    report = on_progress or _no_progress
+    file_key = collection_name or client._collection.name
     if DEBUG:
         print(f"[DOC] Adding {len(chunks)} chunks to Chroma DB...")
 
     texts = [getattr(c, "page_content", str(c)) for c in chunks]
     metadatas = [getattr(c, "metadata", {}) or {} for c in chunks]
-    client.add_texts(texts=texts, metadatas=metadatas)
+    ids = make_chunk_ids(file_key, texts)
+    for chunk_id, text, metadata in zip(ids, texts, metadatas):
+        metadata["chunk_id"] = chunk_id
+        metadata["source_file"] = file_key
+        # Sentence offsets and token counts let the query-time packer slice instead of re-splitting.
+        metadata.update(segment_metadata(text))
+
+    # Chunk ids are content addressed, so diffing ids tells us exactly what changed.
+    stored = client.get(include=["metadatas"])
+    existing = dict(zip(stored["ids"], stored["metadatas"]))
+    stale = list(existing.keys() - set(ids))
+    new_positions = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+    # Unchanged content can still move (a chunk inserted up front shifts every chunk_index after
+    # it), so kept chunks whose positional metadata differs get a metadata-only update.
+    moved_positions = [
+        i
+        for i, chunk_id in enumerate(ids)
+        if chunk_id in existing
+        and any((existing[chunk_id] or {}).get(key) != value for key, value in metadatas[i].items())
+    ]
+    if stale:
+        client.delete(ids=stale)
+    if DEBUG:
+        print(
+            f"[DOC] {file_key}: new={len(new_positions)} | unchanged={len(ids) - len(new_positions)} "
+            f"| moved={len(moved_positions)} | removed={len(stale)}"
+        )
+
+    # Embed once (through the content-hash cache) and hand the same vectors to Chroma and Neo4j.
+    # Unchanged chunks are cache hits; only new content reaches the embedding model.
+    embeddings = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        with span("embed"):
+            embeddings.extend(client.embeddings.embed_documents(texts[start:start + EMBED_BATCH_SIZE]))
+        report("embedding", chunks_embedded=len(embeddings))
+
+    if new_positions:
+        report("vector_store")
+        with span("chroma_write"):
+            client._collection.upsert(
+                ids=[ids[i] for i in new_positions],
+                embeddings=[embeddings[i] for i in new_positions],
+                documents=[texts[i] for i in new_positions],
+                metadatas=[metadatas[i] for i in new_positions],
+            )
+    if moved_positions:
+        report("vector_store")
+        with span("chroma_write"):
+            client._collection.update(
+                ids=[ids[i] for i in moved_positions],
+                metadatas=[metadatas[i] for i in moved_positions],
+            )
+
+    if BM25_ENABLED and (new_positions or stale or bm25_indexes.get(file_key) is None):
+        # Rebuilt from the file's full chunk list so it always matches what Chroma holds.
+        report("lexical_index")
+        with span("lexical_index"):
+            bm25_indexes.rebuild(file_key, ids, texts, [m.get("sentence_spans") for m in metadatas])
 
     if DEBUG:
         print("[DOC] Syncing documents to Neo4j...")
     try:
         graph = get_graph()
-        insert_docs_to_graph(graph, chunks, embedding_model=MODEL)
+        with span("graph_sync"):
+            insert_docs_to_graph(
+                graph,
+                chunks,
+                embedding_model=MODEL,
+                embeddings=embeddings,
+                on_progress=report,
+                ids=ids,
+                file_key=file_key,
+            )
         if DEBUG:
             print("[DOC] Neo4j sync completed successfully.")
+    except IngestCancelled:
+        raise
     except Exception as e:
         print(f"[DOC][ERROR] Failed to sync with Neo4j: {e}")
+    finally:
+        if new_positions or stale:
+            # Answers cached against the old contents of this collection are no longer grounded.
+            answer_cache.invalidate(file_key)
 
 
 def getclient(collection_name, model_name, directory):
     if DEBUG:
         print(f"[DOC] Getting Chroma client for: {collection_name}")
-    return Chroma(
-        collection_name=collection_name,
-        embedding_function=get_embeddings_function(model_name),
-        persist_directory=directory,
-    )
+    return client_registry.get_vectorstore(collection_name, model_name, directory)
+
+
+def ingest_pdf(file_path, collection_name, on_progress: Optional[Callable] = None):
+    report = on_progress or _no_progress
+
+    report("parsing")
+    total_pages = count_pages(file_path)
+    pages_parsed = 0
+    chunks = []
+    # Splitting starts on the first page range while the pool is still parsing the rest.
+    page_batches = timed_iter(iter_document_pages(file_path), "pdf_load")
+    for pages, batch_chunks in split_document_stream(page_batches, total_pages):
+        pages_parsed += len(pages)
+        chunks.extend(batch_chunks)
+        report("parsing", pages_parsed=pages_parsed, chunks_total=len(chunks))
+
+    report("embedding", chunks_total=len(chunks))
+    client = getclient(collection_name, MODEL, DB_DIR)
+    add_docs(client=client, chunks=chunks, on_progress=report, collection_name=collection_name)
+    return {"pages": pages_parsed, "chunks": len(chunks)}
 
 
 def erase(FILE_DIR, DB_DIR):
     if DEBUG:
         print(f"[DOC] Clearing FILE_DIR: {FILE_DIR}")
         print(f"[DOC] Clearing DB_DIR: {DB_DIR}")
+    client_registry.invalidate()
+    answer_cache.invalidate()
+    bm25_indexes.clear()
+    get_local_graph().clear()
 
     if os.path.exists(FILE_DIR):
         for item in os.listdir(FILE_DIR):
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_ollama.embeddings import OllamaEmbeddings
+
+from GlobalVars import CACHE_DIR, DEBUG
+
+EMBED_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Query vectors stay in memory only: every distinct question would otherwise grow the SQLite file.
+EMBED_QUERY_CACHE_SIZE = int(os.getenv("EMBED_QUERY_CACHE_SIZE", "1024"))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBED_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vector BLOB)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit.
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        rows = []
+        for key, vector in items.items():
+            arr = np.asarray(vector, dtype=np.float32)
+            rows.append((key, int(arr.shape[0]), arr.tobytes()))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, underlying: Embeddings, namespace: str, cache: Optional[EmbeddingCache] = None):
+        self.underlying = underlying
+        self.namespace = namespace
+        self.cache = cache or get_embedding_cache()
+        self.model_calls = 0
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._queries_lock = threading.Lock()
+
+    def _key(self, text: str, kind: str) -> str:
+        return content_hash(f"{self.namespace}\x00{kind}\x00{text}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t, "doc") for t in texts]
+        cached = self.cache.get_many(keys)
+
+        # Identical chunks (overlaps, re-uploads) are embedded once per unique content.
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            pending = list(missing.items())
+            for start in range(0, len(pending), EMBED_BATCH_SIZE):
+                batch = pending[start:start + EMBED_BATCH_SIZE]
+                vectors = self.underlying.embed_documents([text for _, text in batch])
+                self.model_calls += 1
+                # Round through float32 so fresh and cached vectors are bit-identical.
+                fresh = {key: np.asarray(vec, dtype=np.float32).tolist() for (key, _), vec in zip(batch, vectors)}
+                self.cache.put_many(fresh)
+                cached.update(fresh)
+
+        if DEBUG:
+            print(f"[EMBED] {len(texts)} texts | cache hits={len(texts) - len(missing)} | embedded={len(missing)}")
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._queries_lock:
+            if text in self._queries:
+                self._queries.move_to_end(text)
+                return self._queries[text]
+        vector = np.asarray(self.underlying.embed_query(text), dtype=np.float32).tolist()
+        self.model_calls += 1
+        with self._queries_lock:
+            self._queries[text] = vector
+            while len(self._queries) > max(0, EMBED_QUERY_CACHE_SIZE):
+                self._queries.popitem(last=False)
+        return vector
+
+
+_cache_instance: Optional[EmbeddingCache] = None
+_embedders: Dict[str, CachedEmbeddings] = {}
+_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache_instance
+    with _lock:
+        if _cache_instance is None:
+            _cache_instance = EmbeddingCache()
+        return _cache_instance
+
+
+def get_cached_embeddings(model_name: str) -> CachedEmbeddings:
+    cache = get_embedding_cache()
+    with _lock:
+        if model_name not in _embedders:
+            _embedders[model_name] = CachedEmbeddings(OllamaEmbeddings(model=model_name), model_name, cache)
+        return _embedders[model_name]
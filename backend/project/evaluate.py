@@ -1,28 +1,48 @@
 import contextlib
-from typing import Dict, List, Optional
+import os
+from typing import Dict, List, Optional, Sequence
 
-import dagshub
-import mlflow
+import numpy as np
 import pandas as pd
-from bert_score import score as bert_score
-from nltk.translate.bleu_score import SmoothingFunction, sentence_bleu
-from rouge_score import rouge_scorer
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 
-semantic_model = SentenceTransformer("all-MiniLM-L6-v2")
+from lazyLoader import lazy_module, lazy_resource
+from lexicalMetrics import (
+    EVAL_CHUNK_ROWS,
+    EVAL_WORKERS,
+    _tokens,
+    iter_lexical_metrics,
+)
 
+EVAL_ENCODE_BATCH_SIZE = int(os.getenv("EVAL_ENCODE_BATCH_SIZE", "128"))
+EVAL_BERT_BATCH_SIZE = int(os.getenv("EVAL_BERT_BATCH_SIZE", "64"))
 
-def normalize(text: str) -> str:
-    return " ".join((text or "").lower().strip().split())
 
+def _load_semantic_model():
+    from sentence_transformers import SentenceTransformer
 
-def exact_match(pred: str, gt: str) -> float:
-    return 1.0 if normalize(pred) == normalize(gt) else 0.0
+    return SentenceTransformer("all-MiniLM-L6-v2")
 
 
-def _tokens(text: str) -> List[str]:
-    return normalize(text).split()
+def _load_bert_scorer():
+    from bert_score import BERTScorer
+
+    return BERTScorer(lang="en")
+
+
+# Models and tracking clients load on first evaluation, not when the API imports this module.
+_semantic_model = lazy_resource("sentence_transformer", _load_semantic_model)
+# bert_score.score() rebuilds the model on every call; one scorer serves the whole process.
+_bert_scorer = lazy_resource("bert_scorer", _load_bert_scorer)
+_mlflow = lazy_module("mlflow")
+_dagshub = lazy_module("dagshub")
+
+
+def get_semantic_model():
+    return _semantic_model.get()
+
+
+def get_bert_scorer():
+    return _bert_scorer.get()
 
 
 def lexical_overlap(pred: str, ctx: str) -> float:
@@ -33,34 +53,99 @@ def lexical_overlap(pred: str, ctx: str) -> float:
     return len(p & c) / max(1, len(p))
 
 
+def _has_context(context: Optional[str]) -> bool:
+    return context is not None and context.strip() != ""
+
+
+def encode_unique(texts: Sequence[str]) -> Dict[str, np.ndarray]:
+    # Each distinct text is encoded once, in large batches, as a unit vector.
+    unique = list(dict.fromkeys(texts))
+    if not unique:
+        return {}
+    vectors = get_semantic_model().encode(
+        unique,
+        batch_size=EVAL_ENCODE_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    return dict(zip(unique, np.asarray(vectors, dtype=np.float32)))
+
+
+def batch_cosine_similarity(
+    left: Sequence[str], right: Sequence[str], vectors: Optional[Dict[str, np.ndarray]] = None
+) -> np.ndarray:
+    if not left:
+        return np.zeros(0, dtype=np.float32)
+    vectors = vectors if vectors is not None else encode_unique(list(left) + list(right))
+    a = np.stack([vectors[t] for t in left])
+    b = np.stack([vectors[t] for t in right])
+    # Rows are unit vectors, so the row-wise dot product is the cosine similarity.
+    return np.einsum("ij,ij->i", a, b)
+
+
+def batch_bert_f1(candidates: Sequence[str], references: Sequence[str]) -> np.ndarray:
+    if not candidates:
+        return np.zeros(0, dtype=np.float32)
+    _, _, bert_f1 = get_bert_scorer().score(
+        list(candidates), list(references), batch_size=EVAL_BERT_BATCH_SIZE, verbose=False
+    )
+    return bert_f1.cpu().numpy()
+
+
+def batch_neural_metrics(
+    predictions: Sequence[str], ground_truths: Sequence[str], contexts: Sequence[Optional[str]]
+) -> Dict[str, np.ndarray]:
+    # Columns: semantic_similarity, bert_score, context_semantic_similarity, context_bert_score.
+    preds = [p or "" for p in predictions]
+    gts = [g or "" for g in ground_truths]
+    with_context = [i for i, c in enumerate(contexts) if _has_context(c)]
+    ctx_preds = [preds[i] for i in with_context]
+    ctx_texts = [contexts[i] for i in with_context]
+
+    vectors = encode_unique(preds + gts + ctx_texts)
+    semantic = batch_cosine_similarity(preds, gts, vectors)
+    context_semantic = np.zeros(len(preds), dtype=np.float32)
+    context_semantic[with_context] = batch_cosine_similarity(ctx_preds, ctx_texts, vectors)
+
+    # One scorer call covers both the ground-truth and the context pairs.
+    bert_f1 = batch_bert_f1(preds + ctx_preds, gts + ctx_texts)
+    context_bert = np.zeros(len(preds), dtype=np.float32)
+    context_bert[with_context] = bert_f1[len(preds):]
+
+    return {
+        "semantic_similarity": semantic,
+        "bert_score": bert_f1[:len(preds)],
+        "context_semantic_similarity": context_semantic,
+        "context_bert_score": context_bert,
+    }
+
+
 def context_semantic_similarity(pred: str, context: Optional[str]) -> float:
-    if context is None or context.strip() == "":
+    if not _has_context(context):
         return 0.0
-    a = semantic_model.encode([pred or ""])
-    b = semantic_model.encode([context])
-    return float(cosine_similarity(a, b)[0][0])
+    return float(batch_cosine_similarity([pred or ""], [context])[0])
 
 
 def context_bert_score(pred: str, context: Optional[str]) -> float:
-    if context is None or context.strip() == "":
+    if not _has_context(context):
         return 0.0
-    _, _, f1 = bert_score([pred or ""], [context], lang="en", verbose=False)
-    return float(f1[0])
+    return float(batch_bert_f1([pred or ""], [context])[0])
 
 
-def evidence_sufficiency(pred: str, context: Optional[str]) -> float:
+def evidence_sufficiency(pred: str, context: Optional[str], semantic: Optional[float] = None) -> float:
     if context is None or context.strip() == "":
         return 0.0
-    sem = context_semantic_similarity(pred, context)
+    sem = semantic if semantic is not None else context_semantic_similarity(pred, context)
     overlap = lexical_overlap(pred, context)
     score = 0.6 * sem + 0.4 * overlap
     return float(max(0.0, min(1.0, score)))
 
 
-def hallucination_probability(pred: str, context: Optional[str]) -> float:
+def hallucination_probability(pred: str, context: Optional[str], semantic: Optional[float] = None) -> float:
     if context is None or context.strip() == "":
         return 1.0
-    return float(max(0.0, min(1.0, 1.0 - evidence_sufficiency(pred, context))))
+    return float(max(0.0, min(1.0, 1.0 - evidence_sufficiency(pred, context, semantic))))
 
 
 def estimate_token_usage(pred: str, context: Optional[str]) -> int:
@@ -72,36 +157,108 @@ def estimate_api_cost(token_usage: float, usd_per_1k_tokens: float = 0.0002) ->
     return round((float(token_usage) / 1000.0) * usd_per_1k_tokens, 6)
 
 
-def f1(pred: str, gt: str) -> float:
-    p = _tokens(pred)
-    g = _tokens(gt)
-    common = set(p) & set(g)
-    if not common:
-        return 0.0
-    precision = len(common) / len(p)
-    recall = len(common) / len(g)
-    return 2 * (precision * recall) / (precision + recall)
-
-
-def bleu(pred: str, gt: str) -> float:
-    smooth = SmoothingFunction().method1
-    return sentence_bleu([_tokens(gt)], _tokens(pred), smoothing_function=smooth)
-
-
-def rougeL(pred: str, gt: str) -> float:
-    scorer = rouge_scorer.RougeScorer(["rougeL"], use_stemmer=True)
-    return scorer.score(gt or "", pred or "")["rougeL"].fmeasure
-
-
 def semantic_sim(pred: str, gt: str) -> float:
-    a = semantic_model.encode([pred or ""])
-    b = semantic_model.encode([gt or ""])
-    return float(cosine_similarity(a, b)[0][0])
+    return float(batch_cosine_similarity([pred or ""], [gt or ""])[0])
 
 
 def bert_sc(pred: str, gt: str) -> float:
-    _, _, f1 = bert_score([pred or ""], [gt or ""], lang="en", verbose=False)
-    return float(f1[0])
+    return float(batch_bert_f1([pred or ""], [gt or ""])[0])
+
+
+RESULT_COLUMNS = [
+    "query",
+    "prediction",
+    "ground_truth",
+    "exact_match",
+    "f1",
+    "bleu",
+    "rougeL",
+    "semantic_similarity",
+    "bert_score",
+    "context_semantic_similarity",
+    "context_bert_score",
+    "evidence_sufficiency",
+    "hallucination_probability",
+    "token_usage",
+    "latency_ms",
+    "api_cost_estimate_usd",
+    "reflection_iterations",
+    "retrieval_confidence",
+]
+NUMERIC_COLUMNS = RESULT_COLUMNS[3:]
+
+
+class RunningMeans:
+    # Column means over streamed rows; missing and non-finite values are skipped like pandas' mean().
+    def __init__(self, columns: Sequence[str]):
+        self.sums = {c: 0.0 for c in columns}
+        self.counts = {c: 0 for c in columns}
+
+    def add(self, row: Dict[str, object]):
+        for col in self.sums:
+            value = row.get(col)
+            if value is None:
+                continue
+            value = float(value)
+            if np.isfinite(value):
+                self.sums[col] += value
+                self.counts[col] += 1
+
+    def means(self) -> Dict[str, float]:
+        return {c: self.sums[c] / self.counts[c] if self.counts[c] else float("nan") for c in self.sums}
+
+
+def _score_row(
+    pred: str,
+    gt: str,
+    q: str,
+    context: Optional[str],
+    runtime: Dict[str, object],
+    lexical: Dict[str, float],
+    neural: Dict[str, float],
+) -> Dict[str, object]:
+    runtime_token_usage = runtime.get("token_usage_estimated")
+    runtime_latency = runtime.get("latency_ms")
+    runtime_reflections = runtime.get("reflection_iterations")
+    runtime_retrieval_conf = runtime.get("retrieval_confidence")
+    runtime_evidence = runtime.get("evidence_sufficiency")
+    runtime_hallucination = runtime.get("hallucination_probability")
+    context_semantic = neural["context_semantic_similarity"]
+
+    token_usage = (
+        float(runtime_token_usage)
+        if runtime_token_usage is not None
+        else float(estimate_token_usage(pred, context))
+    )
+    evidence = (
+        float(runtime_evidence)
+        if runtime_evidence is not None
+        else float(evidence_sufficiency(pred, context, context_semantic))
+    )
+    halluc_prob = (
+        float(runtime_hallucination)
+        if runtime_hallucination is not None
+        else float(hallucination_probability(pred, context, context_semantic))
+    )
+
+    api_cost = runtime.get("api_cost_estimate_usd")
+    if api_cost is None:
+        api_cost = estimate_api_cost(token_usage)
+
+    return {
+        "query": q,
+        "prediction": pred,
+        "ground_truth": gt,
+        **lexical,
+        **neural,
+        "evidence_sufficiency": evidence,
+        "hallucination_probability": halluc_prob,
+        "token_usage": token_usage,
+        "latency_ms": float(runtime_latency) if runtime_latency is not None else None,
+        "api_cost_estimate_usd": float(api_cost),
+        "reflection_iterations": int(runtime_reflections) if runtime_reflections is not None else 1,
+        "retrieval_confidence": float(runtime_retrieval_conf) if runtime_retrieval_conf is not None else None,
+    }
 
 
 def evaluate_llm_predictions(
@@ -112,11 +269,18 @@ def evaluate_llm_predictions(
     runtime_metrics: Optional[List[Dict[str, object]]] = None,
     output_path: str = "results.csv",
     mlflow_experiment: str = "LLM-Evaluation",
+    chunk_rows: int = EVAL_CHUNK_ROWS,
+    workers: int = EVAL_WORKERS,
+    return_rows: bool = True,
 ):
+    # Rows are scored and appended to output_path one chunk at a time; with return_rows=False
+    # only the average row is kept, so memory stays bounded by the chunk size.
     tracking_enabled = True
     run_context = contextlib.nullcontext()
 
     try:
+        dagshub = _dagshub.get()
+        mlflow = _mlflow.get()
         dagshub.init(repo_owner="arihantjain72000", repo_name="my-first-repo2", mlflow=True)
         mlflow.set_experiment(mlflow_experiment)
         run_context = mlflow.start_run()
@@ -125,90 +289,49 @@ def evaluate_llm_predictions(
         print(f"[EVAL][WARN] MLflow/DagsHub tracking disabled: {e}")
 
     results = []
-    with run_context:
-        for i, (pred, gt, q) in enumerate(zip(predictions, ground_truths, queries)):
-            context = contexts[i] if contexts and i < len(contexts) else None
-            runtime = runtime_metrics[i] if runtime_metrics and i < len(runtime_metrics) else {}
-
-            runtime_token_usage = runtime.get("token_usage_estimated")
-            runtime_latency = runtime.get("latency_ms")
-            runtime_reflections = runtime.get("reflection_iterations")
-            runtime_retrieval_conf = runtime.get("retrieval_confidence")
-            runtime_evidence = runtime.get("evidence_sufficiency")
-            runtime_hallucination = runtime.get("hallucination_probability")
-
-            token_usage = (
-                float(runtime_token_usage)
-                if runtime_token_usage is not None
-                else float(estimate_token_usage(pred, context))
-            )
-            evidence = (
-                float(runtime_evidence)
-                if runtime_evidence is not None
-                else float(evidence_sufficiency(pred, context))
-            )
-            halluc_prob = (
-                float(runtime_hallucination)
-                if runtime_hallucination is not None
-                else float(hallucination_probability(pred, context))
-            )
-
-            api_cost = runtime.get("api_cost_estimate_usd")
-            if api_cost is None:
-                api_cost = estimate_api_cost(token_usage)
-
-            row = {
-                "query": q,
-                "prediction": pred,
-                "ground_truth": gt,
-                "exact_match": exact_match(pred, gt),
-                "f1": f1(pred, gt),
-                "bleu": bleu(pred, gt),
-                "rougeL": rougeL(pred, gt),
-                "semantic_similarity": semantic_sim(pred, gt),
-                "bert_score": bert_sc(pred, gt),
-                "context_semantic_similarity": context_semantic_similarity(pred, context),
-                "context_bert_score": context_bert_score(pred, context),
-                "evidence_sufficiency": evidence,
-                "hallucination_probability": halluc_prob,
-                "token_usage": token_usage,
-                "latency_ms": float(runtime_latency) if runtime_latency is not None else None,
-                "api_cost_estimate_usd": float(api_cost),
-                "reflection_iterations": int(runtime_reflections) if runtime_reflections is not None else 1,
-                "retrieval_confidence": float(runtime_retrieval_conf) if runtime_retrieval_conf is not None else None,
-            }
-            results.append(row)
-
-        df = pd.DataFrame(results)
-
-        numeric_cols = [
-            "exact_match",
-            "f1",
-            "bleu",
-            "rougeL",
-            "semantic_similarity",
-            "bert_score",
-            "context_semantic_similarity",
-            "context_bert_score",
-            "evidence_sufficiency",
-            "hallucination_probability",
-            "token_usage",
-            "latency_ms",
-            "api_cost_estimate_usd",
-            "reflection_iterations",
-            "retrieval_confidence",
-        ]
-        averages = {col: pd.to_numeric(df[col], errors="coerce").mean() for col in numeric_cols}
+    running = RunningMeans(NUMERIC_COLUMNS)
+    count = min(len(predictions), len(ground_truths), len(queries))
+    chunk_rows = max(1, chunk_rows)
+    pairs = [(predictions[i], ground_truths[i]) for i in range(count)]
 
+    with run_context:
+        pd.DataFrame(columns=RESULT_COLUMNS).to_csv(output_path, index=False)
+
+        # Lexical chunks are scored in worker processes while this process runs the neural metrics.
+        lexical_chunks = iter_lexical_metrics(pairs, chunk_rows=chunk_rows, workers=workers)
+        for start, lexical_rows in zip(range(0, count, chunk_rows), lexical_chunks):
+            end = start + len(lexical_rows)
+            chunk_contexts = [contexts[i] if contexts and i < len(contexts) else None for i in range(start, end)]
+            neural = batch_neural_metrics(predictions[start:end], ground_truths[start:end], chunk_contexts)
+
+            chunk = []
+            for offset, i in enumerate(range(start, end)):
+                runtime = runtime_metrics[i] if runtime_metrics and i < len(runtime_metrics) else {}
+                row = _score_row(
+                    predictions[i],
+                    ground_truths[i],
+                    queries[i],
+                    chunk_contexts[offset],
+                    runtime,
+                    lexical_rows[offset],
+                    {name: float(values[offset]) for name, values in neural.items()},
+                )
+                running.add(row)
+                chunk.append(row)
+
+            pd.DataFrame(chunk, columns=RESULT_COLUMNS).to_csv(output_path, mode="a", header=False, index=False)
+            if return_rows:
+                results.extend(chunk)
+
+        averages = running.means()
         avg_row = {
             "query": "AVERAGE",
             "prediction": "AVERAGE",
             "ground_truth": "AVERAGE",
             **averages,
         }
-
-        df = pd.concat([df, pd.DataFrame([avg_row])], ignore_index=True)
-        df.to_csv(output_path, index=False)
+        pd.DataFrame([avg_row], columns=RESULT_COLUMNS).to_csv(output_path, mode="a", header=False, index=False)
+        results.append(avg_row)
 
         if tracking_enabled:
             mlflow.log_metrics(
@@ -232,4 +355,4 @@ def evaluate_llm_predictions(
             )
             mlflow.log_artifact(output_path)
 
-    return df.to_dict(orient="records")
+    return results
@@ -1,35 +1,177 @@
 import os
 import re
-from typing import List
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
 
-import spacy
 from dotenv import load_dotenv
 from langchain_neo4j import Neo4jGraph
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from sklearn.metrics.pairwise import cosine_similarity
 
+from embeddingCache import content_hash, get_cached_embeddings
 from GlobalVars import DEBUG, MODEL
+from lazyLoader import lazy_resource
+from localGraph import LocalGraph, get_local_graph
+from similarityIndex import iter_similar_pairs
+from stageMetrics import span
+from textSegments import Span, decode_spans, graph_separator, segment_metadata
+from topicLabeler import assign_topics, label_text
 
 load_dotenv()
 
-# Load spaCy once for entity extraction during ingest.
-nlp = spacy.load("en_core_web_sm")
+
+# Only doc.ents is used; NER in en_core_web_sm embeds tokens itself rather than listening to the
+# shared tok2vec, so that component and everything else can be skipped.
+SPACY_EXCLUDE = ["tok2vec", "parser", "tagger", "attribute_ruler", "lemmatizer", "senter"]
+SPACY_BATCH_SIZE = int(os.getenv("SPACY_BATCH_SIZE", "64"))
+SPACY_N_PROCESS = int(os.getenv("SPACY_N_PROCESS", "1"))
+
+
+def _load_spacy():
+    import spacy
+
+    return spacy.load("en_core_web_sm", exclude=SPACY_EXCLUDE)
+
+
+# Load spaCy once for entity extraction during ingest, on first use rather than at API import.
+_nlp = lazy_resource("spacy", _load_spacy)
+
+
+def get_nlp():
+    return _nlp.get()
+
+
+def extract_entities(
+    texts: List[str], batch_size: int = SPACY_BATCH_SIZE, n_process: int = SPACY_N_PROCESS
+) -> List[List[Tuple[str, str]]]:
+    # One (name, type) list per text, de-duplicated within the text in first-seen order.
+    if not texts:
+        return []
+    results = []
+    for doc in get_nlp().pipe(texts, batch_size=max(1, batch_size), n_process=max(1, n_process)):
+        results.append(list(dict.fromkeys((ent.text, ent.label_) for ent in doc.ents)))
+    return results
+
 
 NEO4J_URI = os.getenv("NEO4J_URI", "neo4j+s://5e452542.databases.neo4j.io")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE") or None
+NEO4J_POOL_SIZE = int(os.getenv("NEO4J_POOL_SIZE", "50"))
+# Deadline for graph retrieval; also the server-side timeout of its read transactions, so a slow
+# query is stopped in Neo4j rather than left running after the caller gave up on it.
+GRAPH_RETRIEVAL_TIMEOUT_S = float(os.getenv("GRAPH_RETRIEVAL_TIMEOUT_S", "5"))
+# Retrieve seeds and both expansions in one Cypher round-trip instead of one per stage.
+GRAPH_SINGLE_QUERY = os.getenv("GRAPH_SINGLE_QUERY", "1") != "0"
+
+# "neo4j" talks to the configured database; "local" uses the in-process CSR graph snapshot.
+GRAPH_BACKEND = os.getenv("GRAPH_BACKEND", "neo4j")
 
 SIMILARITY_THRESHOLD = 0.75
+GRAPH_BATCH_SIZE = int(os.getenv("GRAPH_BATCH_SIZE", "500"))
+FULLTEXT_INDEX = "document_text"
+FULLTEXT_MAX_TERMS = 16
+# Each Document stores its nearest NEXT/SIMILAR_TO neighbours (khop_ids, hop counts in khop_hops)
+# up to the deepest traversal a query can ask for, so expansion is a property read.
+KHOP_MAX_DEPTH = 3
+KHOP_LIMIT = int(os.getenv("KHOP_LIMIT", "64"))
 graph_instance = None
+driver_instance = None
+_driver_lock = threading.Lock()
+
+# Ingest writes are grouped per kind and flushed as a single UNWIND statement per batch.
+_UNWIND_QUERIES = {
+    "documents": """
+        UNWIND $rows AS row
+        MERGE (d:Document {id: row.id})
+        SET d.file = row.file,
+            d.text = row.text,
+            d.embedding = row.embedding,
+            d.sentence_spans = row.sentence_spans,
+            d.token_count = row.token_count
+        """,
+    "next": """
+        UNWIND $rows AS row
+        MATCH (a:Document {id: row.prev}), (b:Document {id: row.curr})
+        MERGE (a)-[:NEXT]->(b)
+        """,
+    "entities": """
+        UNWIND $rows AS row
+        MERGE (e:Entity {name: row.name, type: row.type})
+        WITH e, row
+        MATCH (d:Document {id: row.doc_id})
+        MERGE (d)-[:HAS_ENTITY]->(e)
+        """,
+    "topics": """
+        UNWIND $rows AS row
+        MATCH (d:Document {id: row.doc_id})
+        // A re-processed chunk may land in a different cluster; it keeps only its new topic.
+        OPTIONAL MATCH (d)-[old:BELONGS_TO_TOPIC]->()
+        DELETE old
+        WITH DISTINCT d, row
+        MERGE (t:Topic {name: row.topic})
+        MERGE (d)-[:BELONGS_TO_TOPIC]->(t)
+        """,
+    "similar": """
+        UNWIND $rows AS row
+        MATCH (a:Document {id: row.a}), (b:Document {id: row.b})
+        MERGE (a)-[:SIMILAR_TO {score: row.score}]->(b)
+        """,
+    # Written last, once everything else for the chunk is in: nodes without it are re-processed.
+    "ingested": """
+        UNWIND $rows AS row
+        MATCH (d:Document {id: row.id})
+        SET d.ingested = true
+        """,
+}
 
 
 def get_graph():
     global graph_instance
+    if GRAPH_BACKEND == "local":
+        return get_local_graph()
     if graph_instance is None:
         graph_instance = init_graph()
     return graph_instance
 
 
+def get_driver():
+    # Pooled Bolt driver for read paths that bypass Neo4jGraph.query; sessions borrow pooled connections.
+    global driver_instance
+    with _driver_lock:
+        if driver_instance is None:
+            from neo4j import GraphDatabase
+
+            driver_instance = GraphDatabase.driver(
+                NEO4J_URI,
+                auth=(NEO4J_USER, NEO4J_PASSWORD),
+                max_connection_pool_size=NEO4J_POOL_SIZE,
+                connection_acquisition_timeout=GRAPH_RETRIEVAL_TIMEOUT_S,
+            )
+        return driver_instance
+
+
+def _timed_read(driver, cypher: str, params: dict, fetch: Callable):
+    # One read transaction with a server-side timeout; fetch consumes the result inside it.
+    from neo4j import unit_of_work
+
+    @unit_of_work(timeout=GRAPH_RETRIEVAL_TIMEOUT_S)
+    def work(tx):
+        return fetch(tx.run(cypher, params))
+
+    with driver.session(database=NEO4J_DATABASE) as session:
+        return session.execute_read(work)
+
+
+class _TimedReader:
+    # Neo4jGraph.query-compatible reads on the pooled driver, for the stage-by-stage retrieval path.
+    def __init__(self, driver):
+        self._driver = driver
+
+    def query(self, cypher: str, params: Optional[dict] = None) -> List[dict]:
+        return _timed_read(self._driver, cypher, params or {}, lambda result: result.data())
+
+
 def init_graph():
     if DEBUG:
         print("[GRAPH] Connecting to Neo4j...")
@@ -40,212 +182,597 @@ def init_graph():
 
 
 def _normalize_texts(texts: List[str], top_k: int) -> List[str]:
+    return [row["text"] for row in _normalize_rows([{"text": t} for t in texts], top_k)]
+
+
+def _normalize_rows(rows: List[dict], top_k: int) -> List[dict]:
+    # Node spans are stored over the whitespace-normalized text, so they apply to the cleaned string.
     seen = set()
-    ordered: List[str] = []
-    for text in texts:
+    ordered: List[dict] = []
+    for row in rows:
+        text = row.get("text")
         if not text:
             continue
         cleaned = " ".join(str(text).split())
         if not cleaned or cleaned in seen:
             continue
         seen.add(cleaned)
-        ordered.append(cleaned)
+        ordered.append({"id": row.get("id"), "text": cleaned, "spans": decode_spans(row.get("spans"))})
         if len(ordered) >= top_k:
             break
     return ordered
 
 
-def _query_text_rows(graph, cypher: str, params: dict) -> List[str]:
-    rows = graph.query(cypher, params=params)
-    texts: List[str] = []
-    for row in rows:
-        if isinstance(row, dict):
-            texts.append(row.get("text") or next(iter(row.values()), None))
-        else:
-            try:
-                texts.append(row[0])
-            except Exception:
-                texts.append(str(row))
-    return texts
-
-
-def get_related_context(query: str, top_k: int = 5, traversal_depth: int = 1) -> str:
-    if not query:
+def _fulltext_query(query: str) -> str:
+    # Tokens are [A-Za-z0-9_]+ so nothing needs Lucene escaping; the exact phrase ranks first.
+    terms = list(dict.fromkeys(t for t in re.findall(r"[A-Za-z0-9_]+", query.lower()) if len(t) > 2))
+    terms = terms[:FULLTEXT_MAX_TERMS]
+    if not terms:
         return ""
+    clauses = [f'"{" ".join(terms)}"^3'] if len(terms) > 1 else []
+    clauses.extend(terms)
+    return " OR ".join(clauses)
+
+
+def _seed_documents_by_scan(graph, query: str, top_k: int, collection: Optional[str]) -> List[dict]:
+    rows = graph.query(
+        """
+        MATCH (d:Document)
+        WHERE ($file IS NULL OR d.file = $file) AND toLower(d.text) CONTAINS toLower($q)
+        RETURN d.id AS id, d.text AS text, d.sentence_spans AS spans
+        LIMIT $limit
+        """,
+        params={"q": query, "limit": top_k, "file": collection},
+    )
+    seeds = [row for row in rows if isinstance(row, dict)]
+
+    # Fallback for sparse matches.
+    if not seeds:
+        terms = [t for t in re.findall(r"[A-Za-z0-9_]+", query.lower()) if len(t) > 3][:8]
+        for term in terms:
+            rows = graph.query(
+                """
+                MATCH (d:Document)
+                WHERE ($file IS NULL OR d.file = $file) AND toLower(d.text) CONTAINS toLower($term)
+                RETURN d.id AS id, d.text AS text, d.sentence_spans AS spans
+                LIMIT $limit
+                """,
+                params={"term": term, "limit": top_k, "file": collection},
+            )
+            seeds.extend(row for row in rows if isinstance(row, dict))
+            if len(seeds) >= top_k:
+                break
+    return seeds
 
-    depth = max(1, min(int(traversal_depth), 3))
-    if DEBUG:
-        print(f"[GRAPH] Retrieving context | top_k={top_k} | depth={depth}")
 
+def _seed_documents(graph, query: str, top_k: int, collection: Optional[str]) -> List[dict]:
+    lucene = _fulltext_query(query)
+    if not lucene:
+        return []
     try:
-        graph = get_graph()
-
-        seed_rows = graph.query(
+        rows = graph.query(
             """
-            MATCH (d:Document)
-            WHERE toLower(d.text) CONTAINS toLower($q)
-            RETURN d.id AS id, d.text AS text
+            CALL db.index.fulltext.queryNodes($index, $lucene, {limit: $candidates})
+            YIELD node, score
+            WHERE $file IS NULL OR node.file = $file
+            RETURN node.id AS id, node.text AS text, node.sentence_spans AS spans, score
+            ORDER BY score DESC
             LIMIT $limit
             """,
-            params={"q": query, "limit": top_k},
+            params={
+                "index": FULLTEXT_INDEX,
+                "lucene": lucene,
+                "candidates": top_k * 20 if collection else top_k,
+                "file": collection,
+                "limit": top_k,
+            },
         )
+        return [row for row in rows if isinstance(row, dict)]
+    except Exception as e:
+        # Graphs ingested before the index existed still answer, just via label scans.
+        if DEBUG:
+            print("[GRAPH] Full-text seed lookup unavailable, scanning instead:", e)
+        return _seed_documents_by_scan(graph, query, top_k, collection)
+
+
+def _expansion_call(depth: int) -> str:
+    # Neighbours of seed node d within depth hops: the materialized list when ingest stored one,
+    # otherwise a variable-length expansion (documents ingested before the cache existed).
+    return f"""
+    CALL {{
+        WITH d
+        WITH d WHERE d.khop_ids IS NOT NULL
+        UNWIND range(0, size(d.khop_ids) - 1) AS i
+        WITH d.khop_ids[i] AS nbr_id, d.khop_hops[i] AS hops
+        WHERE hops <= {depth}
+        MATCH (nbr:Document {{id: nbr_id}})
+        RETURN nbr, hops
+        UNION ALL
+        WITH d
+        WITH d WHERE d.khop_ids IS NULL
+        MATCH p = (d)-[:NEXT|SIMILAR_TO*1..{depth}]-(nbr:Document)
+        RETURN nbr, length(p) AS hops
+    }}
+    """
 
-        seed_ids: List[str] = []
-        seed_texts: List[str] = []
-        for row in seed_rows:
-            if isinstance(row, dict):
-                doc_id = row.get("id")
-                text = row.get("text")
-            else:
-                doc_id = None
-                text = str(row)
-            if doc_id:
-                seed_ids.append(doc_id)
-            if text:
-                seed_texts.append(text)
-
-        # Fallback for sparse matches.
-        if not seed_texts:
-            terms = [t for t in re.findall(r"[A-Za-z0-9_]+", query.lower()) if len(t) > 3][:8]
-            for term in terms:
-                seed_texts.extend(
-                    _query_text_rows(
-                        graph,
-                        """
-                        MATCH (d:Document)
-                        WHERE toLower(d.text) CONTAINS toLower($term)
-                        RETURN d.text AS text
-                        LIMIT $limit
-                        """,
-                        {"term": term, "limit": top_k},
-                    )
-                )
-                if len(seed_texts) >= top_k:
-                    break
-
-        expanded = list(seed_texts)
-        if depth > 1 and seed_ids:
-            expansion_cypher = f"""
-            MATCH (d:Document)
-            WHERE d.id IN $ids
-            OPTIONAL MATCH (d)-[:NEXT|SIMILAR_TO*1..{depth}]-(nbr:Document)
-            RETURN DISTINCT nbr.text AS text
+
+def _fetch_candidates_stepwise(graph, query: str, top_k: int, depth: int, collection: Optional[str]) -> Dict[str, List[dict]]:
+    # One round-trip per stage through Neo4jGraph.query; also the fallback when the full-text index is missing.
+    candidates: Dict[str, List[dict]] = {"seeds": [], "expanded": [], "shared": []}
+    candidates["seeds"] = _seed_documents(graph, query, top_k, collection)
+    seed_ids = [row["id"] for row in candidates["seeds"] if row.get("id")]
+
+    if depth > 1 and seed_ids:
+        # hops and seed_rank let callers cut the expansion down to a shallower depth or fewer seeds.
+        candidates["expanded"] = graph.query(
+            f"""
+            UNWIND range(0, size($ids) - 1) AS rank
+            MATCH (d:Document {{id: $ids[rank]}})
+            {_expansion_call(depth)}
+            WITH nbr, hops, rank
+            WHERE NOT nbr.id IN $ids
+            WITH nbr, min(hops) AS hops, min(rank) AS seed_rank
+            RETURN nbr.id AS id, nbr.text AS text, nbr.sentence_spans AS spans, hops, seed_rank
+            ORDER BY hops, seed_rank
             LIMIT $limit
+            """,
+            params={"ids": seed_ids, "limit": top_k * depth},
+        )
+        candidates["shared"] = graph.query(
             """
-            expanded.extend(
-                _query_text_rows(
-                    graph, expansion_cypher, {"ids": seed_ids, "limit": top_k * depth}
-                )
-            )
+            UNWIND range(0, size($ids) - 1) AS rank
+            MATCH (d:Document {id: $ids[rank]})-[:HAS_ENTITY|BELONGS_TO_TOPIC]->(x)<-[:HAS_ENTITY|BELONGS_TO_TOPIC]-(nbr:Document)
+            WHERE ($file IS NULL OR nbr.file = $file) AND NOT nbr.id IN $ids
+            WITH nbr, count(x) AS shared, min(rank) AS seed_rank
+            RETURN nbr.id AS id, nbr.text AS text, nbr.sentence_spans AS spans, seed_rank
+            ORDER BY shared DESC, seed_rank
+            LIMIT $limit
+            """,
+            params={"ids": seed_ids, "limit": top_k * depth, "file": collection},
+        )
+    return candidates
+
+
+_SEED_SUBQUERY = """
+    CALL {
+        CALL db.index.fulltext.queryNodes($index, $lucene, {limit: $candidates})
+        YIELD node, score
+        WHERE $file IS NULL OR node.file = $file
+        RETURN node
+        ORDER BY score DESC
+        LIMIT $top_k
+    }
+    WITH collect(node) AS seeds
+"""
+
+
+def _single_query_cypher(depth: int) -> str:
+    seeds = "[s IN seeds | {id: s.id, text: s.text, spans: s.sentence_spans}] AS seeds"
+    if depth == 1:
+        return _SEED_SUBQUERY + f"    RETURN {seeds}, [] AS expanded, [] AS shared\n"
+    # Expansions aggregate to a single row even when there are no seeds, so the outer row always survives.
+    return _SEED_SUBQUERY + f"""
+    CALL {{
+        WITH seeds
+        UNWIND range(0, size(seeds) - 1) AS rank
+        WITH seeds, seeds[rank] AS d, rank
+        {_expansion_call(depth)}
+        WITH seeds, nbr, hops, rank
+        WHERE NOT nbr IN seeds
+        WITH nbr, min(hops) AS hops, min(rank) AS seed_rank
+        ORDER BY hops, seed_rank
+        LIMIT $limit
+        RETURN collect({{
+            id: nbr.id, text: nbr.text, spans: nbr.sentence_spans, hops: hops, seed_rank: seed_rank
+        }}) AS expanded
+    }}
+    CALL {{
+        WITH seeds
+        UNWIND range(0, size(seeds) - 1) AS rank
+        WITH seeds, seeds[rank] AS d, rank
+        MATCH (d)-[:HAS_ENTITY|BELONGS_TO_TOPIC]->(x)<-[:HAS_ENTITY|BELONGS_TO_TOPIC]-(nbr:Document)
+        WHERE ($file IS NULL OR nbr.file = $file) AND NOT nbr IN seeds
+        WITH nbr, count(x) AS shared, min(rank) AS seed_rank
+        ORDER BY shared DESC, seed_rank
+        LIMIT $limit
+        RETURN collect({{id: nbr.id, text: nbr.text, spans: nbr.sentence_spans, seed_rank: seed_rank}}) AS shared
+    }}
+    RETURN {seeds}, expanded, shared
+    """
 
-            expanded.extend(
-                _query_text_rows(
-                    graph,
-                    """
-                    MATCH (d:Document)
-                    WHERE d.id IN $ids
-                    OPTIONAL MATCH (d)-[:HAS_ENTITY|BELONGS_TO_TOPIC]->(x)<-[:HAS_ENTITY|BELONGS_TO_TOPIC]-(nbr:Document)
-                    RETURN DISTINCT nbr.text AS text
-                    LIMIT $limit
-                    """,
-                    {"ids": seed_ids, "limit": top_k * depth},
-                )
-            )
 
-        texts = _normalize_texts(expanded, top_k=top_k)
-        return "\n---\n".join(texts) if texts else ""
+def _fetch_candidates_single_query(
+    driver, query: str, top_k: int, depth: int, collection: Optional[str]
+) -> Dict[str, List[dict]]:
+    # Seeding, both expansions and their ranking in one parameterized statement: one round-trip.
+    lucene = _fulltext_query(query)
+    if not lucene:
+        return {"seeds": [], "expanded": [], "shared": []}
+    params = {
+        "index": FULLTEXT_INDEX,
+        "lucene": lucene,
+        "candidates": top_k * 20 if collection else top_k,
+        "top_k": top_k,
+        "file": collection,
+        "limit": top_k * depth,
+    }
+    record = _timed_read(driver, _single_query_cypher(depth), params, lambda result: result.single())
+    if record is None:
+        return {"seeds": [], "expanded": [], "shared": []}
+    return {"seeds": list(record["seeds"]), "expanded": list(record["expanded"]), "shared": list(record["shared"])}
+
+
+def fetch_graph_candidates(
+    query: str, top_k: int = 5, traversal_depth: int = 1, collection: Optional[str] = None
+) -> Dict[str, List[dict]]:
+    # Fetched once at the largest k/depth a query plan needs; select_graph_context slices it.
+    candidates: Dict[str, List[dict]] = {"seeds": [], "expanded": [], "shared": []}
+    if not query:
+        return candidates
+
+    depth = max(1, min(int(traversal_depth), 3))
+    if DEBUG:
+        print(f"[GRAPH] Retrieving context | top_k={top_k} | depth={depth}")
+
+    try:
+        graph = get_graph()
+        if isinstance(graph, LocalGraph):
+            return graph.related_candidates(query, top_k, depth, collection)
+
+        driver = get_driver()
+        if GRAPH_SINGLE_QUERY:
+            try:
+                return _fetch_candidates_single_query(driver, query, top_k, depth, collection)
+            except Exception as e:
+                # Graphs ingested before the full-text index existed still answer stage by stage.
+                if DEBUG:
+                    print("[GRAPH] Single-query retrieval unavailable, using staged queries:", e)
+        return _fetch_candidates_stepwise(_TimedReader(driver), query, top_k, depth, collection)
     except Exception as e:
         if DEBUG:
             print("[GRAPH] Error retrieving graph context:", e)
-        return ""
+    return candidates
 
 
-def get_topic_for_text(text: str) -> str:
-    llm = ChatOllama(model=MODEL, temperature=0)
-    prompt = f"""
-    Read the following text and provide ONE short topic name (2-4 words).
-    Text:
-    {text}
+def select_graph_evidence(candidates: Dict[str, List[dict]], top_k: int, traversal_depth: int) -> List[dict]:
+    # {"id", "text", "spans"} rows in context order, sliced to the given k/depth and de-duplicated.
+    depth = max(1, min(int(traversal_depth), 3))
+    seeds = candidates.get("seeds", [])[:top_k]
+    rows = list(seeds)
+
+    if depth > 1 and any(row.get("id") for row in seeds):
+        limit = top_k * depth
+        rows.extend(
+            [
+                row
+                for row in candidates.get("expanded", [])
+                if row.get("hops", 1) <= depth and row.get("seed_rank", 0) < top_k
+            ][:limit]
+        )
+        rows.extend([row for row in candidates.get("shared", []) if row.get("seed_rank", 0) < top_k][:limit])
 
-    Respond with ONLY the topic label.
-    """
-    try:
-        response = llm.invoke(prompt)
-        topic = getattr(response, "content", str(response)).strip()
-        return topic or "General"
-    except Exception as e:
-        if DEBUG:
-            print("[GRAPH] Topic extraction failed:", e)
-        return "General"
+    return _normalize_rows(rows, top_k=top_k)
+
+
+def select_graph_segments(
+    candidates: Dict[str, List[dict]], top_k: int, traversal_depth: int
+) -> List[Tuple[str, Optional[List[Span]]]]:
+    # (text, spans) items in context order, "---" separators included, ready for pack_segments.
+    items: List[Tuple[str, Optional[List[Span]]]] = []
+    for row in select_graph_evidence(candidates, top_k, traversal_depth):
+        if items:
+            items.append(graph_separator())
+        items.append((row["text"], row["spans"]))
+    return items
+
+
+def select_graph_context(candidates: Dict[str, List[dict]], top_k: int, traversal_depth: int) -> str:
+    return "\n".join(text for text, _ in select_graph_segments(candidates, top_k, traversal_depth))
 
 
-def insert_docs_to_graph(graph, docs, embedding_model=MODEL):
+def get_related_context(
+    query: str, top_k: int = 5, traversal_depth: int = 1, collection: Optional[str] = None
+) -> str:
+    candidates = fetch_graph_candidates(query, top_k, traversal_depth, collection)
+    return select_graph_context(candidates, top_k, traversal_depth)
+
+
+def get_topic_for_text(text: str) -> str:
+    return label_text(text)
+
+
+def ensure_graph_schema(graph):
+    if isinstance(graph, LocalGraph):
+        return
+    # MATCH/MERGE by id on every batch row needs an index to stay O(log n).
+    graph.query("CREATE INDEX document_id IF NOT EXISTS FOR (d:Document) ON (d.id)")
+    graph.query("CREATE INDEX document_file IF NOT EXISTS FOR (d:Document) ON (d.file)")
+    # Seeds are resolved through this index instead of lower-casing every text per query.
+    graph.query(
+        f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} IF NOT EXISTS FOR (d:Document) ON EACH [d.text]"
+    )
+
+
+class GraphBatchWriter:
+    def __init__(self, graph, batch_size: int = GRAPH_BATCH_SIZE, on_flush: Optional[Callable] = None):
+        self.graph = graph
+        self.on_flush = on_flush
+        self.batch_size = max(1, int(batch_size))
+        self._buffers: Dict[str, List[dict]] = {kind: [] for kind in _UNWIND_QUERIES}
+        self.rows_written = 0
+        self.batches = 0
+        self.elapsed_s = 0.0
+
+    def add(self, kind: str, row: dict):
+        buffer = self._buffers[kind]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self._flush_kind(kind)
+
+    def add_many(self, kind: str, rows):
+        for row in rows:
+            self.add(kind, row)
+
+    def _flush_kind(self, kind: str):
+        # Relationship rows MATCH their Document endpoints, so pending nodes go first.
+        if kind != "documents" and self._buffers["documents"]:
+            self._flush_kind("documents")
+
+        rows = self._buffers[kind]
+        if not rows:
+            return
+        self._buffers[kind] = []
+
+        start = time.perf_counter()
+        with span("graph_write"):
+            if isinstance(self.graph, LocalGraph):
+                self.graph.apply_rows(kind, rows)
+            else:
+                # One UNWIND statement per batch runs as a single auto-commit transaction.
+                self.graph.query(_UNWIND_QUERIES[kind], params={"rows": rows})
+        self.elapsed_s += time.perf_counter() - start
+        self.rows_written += len(rows)
+        self.batches += 1
+        if self.on_flush:
+            self.on_flush(self)
+
+    def flush(self):
+        for kind in _UNWIND_QUERIES:
+            self._flush_kind(kind)
+
+    def stats(self) -> Dict[str, float]:
+        rows_per_sec = self.rows_written / self.elapsed_s if self.elapsed_s > 0 else 0.0
+        return {
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "batch_size": self.batch_size,
+            "elapsed_s": round(self.elapsed_s, 4),
+            "rows_per_sec": round(rows_per_sec, 2),
+        }
+
+
+def make_chunk_ids(file_key: str, texts: List[str]) -> List[str]:
+    # Identity is (file, content); repeated identical chunks get an occurrence suffix.
+    file_part = content_hash(file_key)[:12]
+    seen: Dict[str, int] = {}
+    ids: List[str] = []
+    for text in texts:
+        digest = content_hash(text)[:24]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(f"{file_part}_{digest}" + (f"_{occurrence}" if occurrence else ""))
+    return ids
+
+
+def _existing_file_ids(graph, file_key: str) -> Dict[str, bool]:
+    # id -> whether its sync completed. A cancelled or failed sync leaves documents without their
+    # entities, topics or SIMILAR_TO edges; those are re-processed on the next upload.
+    if isinstance(graph, LocalGraph):
+        # Staged rows only reach the snapshot through commit(), so every snapshot node is complete.
+        return {doc_id: True for doc_id in graph.file_ids(file_key)}
+    rows = graph.query(
+        "MATCH (d:Document {file: $file}) RETURN d.id AS id, coalesce(d.ingested, false) AS ingested",
+        params={"file": file_key},
+    )
+    return {row["id"]: bool(row.get("ingested")) for row in rows if isinstance(row, dict) and row.get("id")}
+
+
+def _khop_neighbourhood(graph, ids: List[str]) -> List[str]:
+    # The given chunks plus everything within KHOP_MAX_DEPTH hops: the nodes whose cached lists
+    # can change when these chunks are added or removed.
+    if not ids:
+        return []
+    rows = graph.query(
+        f"""
+        UNWIND $ids AS id
+        MATCH (d:Document {{id: id}})
+        OPTIONAL MATCH (d)-[:NEXT|SIMILAR_TO*1..{KHOP_MAX_DEPTH}]-(nbr:Document)
+        WITH collect(DISTINCT d.id) + collect(DISTINCT nbr.id) AS ids
+        UNWIND ids AS id
+        RETURN DISTINCT id
+        """,
+        params={"ids": ids},
+    )
+    return [row["id"] for row in rows if isinstance(row, dict) and row.get("id")]
+
+
+def refresh_khop_cache(
+    graph, file_key: str, touched_ids: Optional[List[str]] = None, batch_size: int = GRAPH_BATCH_SIZE
+) -> int:
+    # Rebuilds the neighbour lists around chunks without one (just written, or ingested before the
+    # cache existed) plus touched_ids; the rest of the graph keeps its lists.
+    if isinstance(graph, LocalGraph):
+        return 0
+    rows = graph.query(
+        "MATCH (d:Document {file: $file}) WHERE d.khop_ids IS NULL RETURN d.id AS id", params={"file": file_key}
+    )
+    uncached = [row["id"] for row in rows if isinstance(row, dict) and row.get("id")]
+    affected = sorted(set(_khop_neighbourhood(graph, uncached)) | set(touched_ids or []))
+
+    for start in range(0, len(affected), batch_size):
+        graph.query(
+            f"""
+            UNWIND $ids AS id
+            MATCH (d:Document {{id: id}})
+            OPTIONAL MATCH p = (d)-[:NEXT|SIMILAR_TO*1..{KHOP_MAX_DEPTH}]-(nbr:Document)
+            WHERE nbr <> d
+            // A path is as strong as its weakest link: NEXT counts as 1.0, SIMILAR_TO as its score.
+            WITH d, nbr, length(p) AS hops,
+                 reduce(w = 1.0, r IN relationships(p) |
+                        CASE WHEN type(r) = 'SIMILAR_TO' AND r.score < w THEN r.score ELSE w END) AS weight
+            WITH d, nbr, hops, max(weight) AS weight
+            ORDER BY hops
+            WITH d, nbr, head(collect([hops, weight])) AS best
+            // Strongest neighbours first within a hop, so the $limit cut drops the weakest ones.
+            WITH d, nbr, best[0] AS hops, best[1] AS weight
+            ORDER BY hops, weight DESC, nbr.id
+            WITH d, collect(CASE WHEN nbr IS NULL THEN null ELSE [nbr.id, hops] END)[..$limit] AS ranked
+            SET d.khop_ids = [n IN ranked | n[0]], d.khop_hops = [n IN ranked | n[1]]
+            """,
+            params={"ids": affected[start:start + batch_size], "limit": KHOP_LIMIT},
+        )
+    if DEBUG:
+        print(f"[GRAPH] {file_key}: k-hop cache refreshed for {len(affected)} chunks")
+    return len(affected)
+
+
+def _prune_next_edges(graph, file_key: str, ids: List[str]) -> List[str]:
+    # NEXT mirrors the current chunk order: edges between chunks that are no longer adjacent are
+    # removed. Returns their endpoints so their cached neighbourhoods can be rebuilt.
+    pairs = list(zip(ids, ids[1:]))
+    if isinstance(graph, LocalGraph):
+        return sorted({doc_id for pair in graph.prune_next_edges(file_key, pairs) for doc_id in pair})
+    rows = graph.query(
+        """
+        MATCH (a:Document {file: $file})-[:NEXT]->(b:Document)
+        WHERE $next[a.id] IS NULL OR $next[a.id] <> b.id
+        RETURN a.id AS a, b.id AS b
+        """,
+        params={"file": file_key, "next": dict(pairs)},
+    )
+    removed = [[row["a"], row["b"]] for row in rows if isinstance(row, dict)]
+    if not removed:
+        return []
+    # Neighbourhoods are read while the edges still exist; they are what the removal changes.
+    endpoints = _khop_neighbourhood(graph, sorted({doc_id for pair in removed for doc_id in pair}))
+    graph.query(
+        "UNWIND $pairs AS p MATCH (:Document {id: p[0]})-[r:NEXT]->(:Document {id: p[1]}) DELETE r",
+        params={"pairs": removed},
+    )
+    return endpoints
+
+
+def insert_docs_to_graph(
+    graph,
+    docs,
+    embedding_model=MODEL,
+    embeddings=None,
+    batch_size: int = GRAPH_BATCH_SIZE,
+    on_progress: Optional[Callable] = None,
+    ids: Optional[List[str]] = None,
+    file_key: str = "default",
+):
     if DEBUG:
         print(f"[GRAPH] Inserting {len(docs)} documents into graph...")
 
-    embedder = OllamaEmbeddings(model=embedding_model)
     texts = [getattr(d, "page_content", str(d)) for d in docs]
-    embeddings = embedder.embed_documents(texts)
+    ids = ids or make_chunk_ids(file_key, texts)
+    report = on_progress or (lambda stage, **counters: None)
 
-    for i, text in enumerate(texts):
-        vector = embeddings[i]
+    ensure_graph_schema(graph)
+    existing = _existing_file_ids(graph, file_key)
+    stale = list(set(existing) - set(ids))
+    new_positions = [i for i, doc_id in enumerate(ids) if not existing.get(doc_id)]
+    new_ids = {ids[i] for i in new_positions}
 
-        graph.query(
-            """
-            MERGE (d:Document {id: $id})
-            SET d.text = $text,
-                d.embedding = $embedding
-            """,
-            params={"id": f"doc_{i}", "text": text, "embedding": vector},
+    if not new_positions and not stale:
+        refreshed = refresh_khop_cache(graph, file_key)
+        if DEBUG:
+            print(f"[GRAPH] {file_key}: unchanged")
+        return {"rows_written": 0, "new_chunks": 0, "removed_chunks": 0, "khop_refreshed": refreshed}
+
+    if embeddings is None and new_positions:
+        embeddings = get_cached_embeddings(embedding_model).embed_documents(texts)
+
+    report("topics")
+    with span("topics"):
+        topics = assign_topics([texts[i] for i in new_positions], [embeddings[i] for i in new_positions])
+    with span("ner"):
+        entities = extract_entities([texts[i] for i in new_positions])
+
+    # Last cancellation point: from here on progress is only recorded, so a cancel cannot stop
+    # the sync between batches.
+    report("graph")
+    # LocalGraph writers take turns and publish only a complete sync; a failed one is discarded.
+    transaction = graph.transaction() if isinstance(graph, LocalGraph) else nullcontext()
+    with transaction:
+        # batch_size=1 reproduces the old one-round-trip-per-row behaviour for comparison.
+        writer = GraphBatchWriter(
+            graph,
+            batch_size=batch_size,
+            on_flush=lambda w: report("graph", checkpoint=False, graph_rows_written=w.rows_written),
         )
 
-        if i > 0:
+        # Survivors near removed chunks lose cached neighbours; find them while the edges still exist.
+        touched: List[str] = []
+        if stale and isinstance(graph, LocalGraph):
+            graph.delete_documents(stale)
+        elif stale:
+            touched = sorted(set(_khop_neighbourhood(graph, stale)) - set(stale))
             graph.query(
-                """
-                MATCH (a:Document {id:$prev}), (b:Document {id:$curr})
-                MERGE (a)-[:NEXT]->(b)
-                """,
-                params={"prev": f"doc_{i - 1}", "curr": f"doc_{i}"},
+                "UNWIND $ids AS id MATCH (d:Document {id: id}) DETACH DELETE d", params={"ids": stale}
             )
 
-        doc_nlp = nlp(text)
-        for ent in doc_nlp.ents:
-            graph.query(
-                """
-                MERGE (e:Entity {name:$name, type:$type})
-                WITH e
-                MATCH (d:Document {id:$doc_id})
-                MERGE (d)-[:HAS_ENTITY]->(e)
-                """,
-                params={"name": ent.text, "type": ent.label_, "doc_id": f"doc_{i}"},
+        for position, i in enumerate(new_positions):
+            doc_id = ids[i]
+            writer.add(
+                "documents",
+                {
+                    "id": doc_id,
+                    "file": file_key,
+                    "text": texts[i],
+                    "embedding": embeddings[i],
+                    **segment_metadata(" ".join(texts[i].split())),
+                },
             )
 
-        topic = get_topic_for_text(text)
-        graph.query(
-            """
-            MERGE (t:Topic {name:$topic})
-            WITH t
-            MATCH (d:Document {id:$doc_id})
-            MERGE (d)-[:BELONGS_TO_TOPIC]->(t)
-            """,
-            params={"topic": topic, "doc_id": f"doc_{i}"},
-        )
-
-    sim_matrix = cosine_similarity(embeddings)
-    for i in range(len(texts)):
-        for j in range(i + 1, len(texts)):
-            if sim_matrix[i][j] > SIMILARITY_THRESHOLD:
-                graph.query(
-                    """
-                    MATCH (a:Document {id:$a}), (b:Document {id:$b})
-                    MERGE (a)-[:SIMILAR_TO {score:$score}]->(b)
-                    """,
-                    params={
-                        "a": f"doc_{i}",
-                        "b": f"doc_{j}",
-                        "score": float(sim_matrix[i][j]),
-                    },
-                )
+            for name, label in entities[position]:
+                writer.add("entities", {"name": name, "type": label, "doc_id": doc_id})
+
+            writer.add("topics", {"topic": topics[position], "doc_id": doc_id})
+
+        # NEXT is rewritten over the whole file (idempotent MERGE) so removals leave no gaps, and
+        # edges between chunks that are no longer adjacent are dropped.
+        touched = sorted(set(touched) | set(_prune_next_edges(graph, file_key, ids)))
+        for i in range(1, len(ids)):
+            writer.add("next", {"prev": ids[i - 1], "curr": ids[i]})
+
+        # Neighbours are searched over the whole file; only edges touching new chunks are written.
+        pairs = []
+        if new_ids:
+            with span("similar_pairs"):
+                pairs = [
+                    (i, j, score)
+                    for i, j, score in iter_similar_pairs(embeddings, threshold=SIMILARITY_THRESHOLD)
+                    if ids[i] in new_ids or ids[j] in new_ids
+                ]
+        for i, j, score in pairs:
+            writer.add("similar", {"a": ids[i], "b": ids[j], "score": score})
+
+        writer.flush()
+        report("neighbour_cache", checkpoint=False)
+        with span("neighbour_cache"):
+            refreshed = refresh_khop_cache(graph, file_key, touched, batch_size=batch_size)
+        if not isinstance(graph, LocalGraph):
+            writer.add_many("ingested", ({"id": ids[i]} for i in new_positions))
+            writer.flush()
+
+    stats = writer.stats()
+    stats.update({"new_chunks": len(new_positions), "removed_chunks": len(stale), "khop_refreshed": refreshed})
 
     if DEBUG:
-        print("[GRAPH] Document + semantic graph insertion complete.")
+        print(
+            f"[GRAPH] Document + semantic graph insertion complete | new={len(new_positions)} "
+            f"| removed={len(stale)} | rows={stats['rows_written']} | rows/sec={stats['rows_per_sec']}"
+        )
+    return stats
@@ -0,0 +1,194 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import Dict, List, Optional
+
+from GlobalVars import DEBUG
+from lazyLoader import lazy_module
+from stageMetrics import Trace, stage_metrics, start_trace
+
+# docProcess pulls in the LangChain loaders and PyPDF; the first job imports it, not API startup.
+_docprocess = lazy_module("docProcess")
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+
+TERMINAL_STATES = {"completed", "failed", "cancelled"}
+
+
+class IngestPaused(Exception):
+    pass
+
+
+class IngestJob:
+    def __init__(self, filename: str, file_path: str, upload_dir: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.file_path = file_path
+        # Removed once the job reaches a terminal state; the parsed PDF is not needed afterwards.
+        self.upload_dir = upload_dir
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress: Dict[str, int] = {
+            "pages_parsed": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "graph_rows_written": 0,
+        }
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.future: Optional[Future] = None
+        self.trace: Optional[Trace] = None
+        self._lock = threading.Lock()
+
+    def report(self, stage: str, checkpoint: bool = True, **counters):
+        # Called from the ingest pipeline between units of work; doubles as the cancellation point
+        # unless checkpoint=False (progress inside a write that must not stop half-way).
+        if checkpoint and self.cancel_event.is_set():
+            raise _docprocess.get().IngestCancelled(f"Job {self.id} cancelled")
+        with self._lock:
+            self.stage = stage
+            for key, value in counters.items():
+                self.progress[key] = int(value)
+
+    def to_dict(self) -> Dict[str, object]:
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                "job_id": self.id,
+                "filename": self.filename,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_s": round(end - self.started_at, 3) if self.started_at else None,
+                "stages": self.trace.breakdown() if self.trace else {},
+            }
+
+
+class IngestJobManager:
+    def __init__(self, max_workers: int = INGEST_WORKERS, max_history: int = INGEST_JOB_HISTORY):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._collection_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._pause_depth = 0
+        self.max_history = max_history
+
+    def submit(self, filename: str, file_path: str, upload_dir: Optional[str] = None) -> IngestJob:
+        job = IngestJob(filename, file_path, upload_dir)
+        with self._lock:
+            # A wipe in progress (or one that removed this upload before it got here) owns the
+            # upload and vector directories; a job started now would race it or find its file gone.
+            if self._pause_depth or not os.path.exists(file_path):
+                raise IngestPaused("Data is being deleted; upload the file again once it is done")
+            self._jobs[job.id] = job
+            self._evict_finished()
+        job.future = self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, object]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs]
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status not in TERMINAL_STATES:
+            job.cancel_event.set()
+        return job
+
+    @contextmanager
+    def paused(self):
+        # Held for a whole data wipe: submit() refuses new jobs until every holder has released it.
+        with self._lock:
+            self._pause_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pause_depth -= 1
+
+    def cancel_all(self, wait: bool = False, timeout: Optional[float] = None) -> bool:
+        # Cancellation is cooperative; with wait=True, returns whether every job stopped in time.
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.status not in TERMINAL_STATES:
+                job.cancel_event.set()
+        if not wait:
+            return True
+        _, pending = wait_futures([job.future for job in jobs if job.future is not None], timeout=timeout)
+        return not pending
+
+    def _evict_finished(self):
+        while len(self._jobs) > self.max_history:
+            finished = next((jid for jid, j in self._jobs.items() if j.status in TERMINAL_STATES), None)
+            if finished is None:
+                break
+            del self._jobs[finished]
+
+    def _collection_lock(self, collection_name: str) -> threading.Lock:
+        with self._lock:
+            return self._collection_locks.setdefault(collection_name, threading.Lock())
+
+    def _finish(self, job: IngestJob, status: str, error: Optional[str] = None):
+        with job._lock:
+            job.status = status
+            job.stage = status
+            job.error = error
+            job.finished_at = time.time()
+        if job.upload_dir:
+            shutil.rmtree(job.upload_dir, ignore_errors=True)
+
+    def _run(self, job: IngestJob):
+        if job.cancel_event.is_set():
+            self._finish(job, "cancelled")
+            return
+        try:
+            docprocess = _docprocess.get()
+        except Exception as e:
+            print(f"[JOBS][ERROR] Ingest job {job.id} failed: {e}")
+            self._finish(job, "failed", str(e))
+            return
+
+        # Uploads of the same file are serialized; different files ingest in parallel.
+        with self._collection_lock(job.filename):
+            with job._lock:
+                job.status = "running"
+                job.started_at = time.time()
+            try:
+                with start_trace("ingest") as trace:
+                    job.trace = trace
+                    docprocess.ingest_pdf(job.file_path, job.filename, on_progress=job.report)
+                self._finish(job, "completed")
+                stage_metrics.observe("ingest", "job", job.finished_at - job.started_at)
+            except docprocess.IngestCancelled:
+                self._finish(job, "cancelled")
+            except Exception as e:
+                print(f"[JOBS][ERROR] Ingest job {job.id} failed: {e}")
+                self._finish(job, "failed", str(e))
+
+        if DEBUG:
+            print(f"[JOBS] {job.id} ({job.filename}) -> {job.status}")
+
+
+ingest_jobs = IngestJobManager()
@@ -0,0 +1,112 @@
+import importlib
+import os
+import threading
+import time
+from typing import Callable, Dict, Generic, Iterable, Optional, TypeVar
+
+from GlobalVars import DEBUG
+
+T = TypeVar("T")
+
+# Comma-separated resource names to load in the background at startup, or "all".
+WARMUP_RESOURCES = os.getenv("WARMUP_RESOURCES", "")
+
+
+class LazyResource(Generic[T]):
+    # A heavy model or module built on first use; concurrent first callers share one load.
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.load_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> T:
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_ms = round((time.perf_counter() - start) * 1000.0, 2)
+                self.error = None
+                self._loaded = True
+                if DEBUG:
+                    print(f"[LAZY] Loaded {self.name} in {self.load_ms}ms")
+        return self._value
+
+    def status(self) -> Dict[str, object]:
+        return {"loaded": self._loaded, "load_ms": self.load_ms, "error": self.error}
+
+
+_resources: Dict[str, LazyResource] = {}
+_warmup_targets: Optional[list] = None
+_warmup_thread: Optional[threading.Thread] = None
+
+
+def lazy_resource(name: str, factory: Callable[[], T]) -> LazyResource[T]:
+    resource = _resources.get(name)
+    if resource is None:
+        resource = _resources[name] = LazyResource(name, factory)
+    return resource
+
+
+def lazy_module(module_name: str) -> LazyResource:
+    return lazy_resource(module_name, lambda: importlib.import_module(module_name))
+
+
+def _warm(names: Iterable[str], imports: Iterable[str]):
+    # Importing the owning modules registers their resources before they are resolved by name.
+    for module_name in imports:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"[LAZY][WARN] Warm-up import of {module_name} failed: {e}")
+    for name in names:
+        if name == "all":
+            _warm(list(_resources), ())
+        elif name not in _resources:
+            print(f"[LAZY][WARN] Unknown warm-up resource {name}")
+        else:
+            try:
+                _resources[name].get()
+            except Exception as e:
+                print(f"[LAZY][WARN] Warm-up of {name} failed: {e}")
+
+
+def start_warmup(names: Optional[Iterable[str]] = None, imports: Iterable[str] = ()) -> Optional[threading.Thread]:
+    # Loads the named resources on a daemon thread so the server can accept traffic meanwhile.
+    global _warmup_targets, _warmup_thread
+    if names is None:
+        names = [n.strip() for n in WARMUP_RESOURCES.split(",") if n.strip()]
+    _warmup_targets = list(names)
+    if not _warmup_targets:
+        return None
+    _warmup_thread = threading.Thread(
+        target=_warm, args=(_warmup_targets, tuple(imports)), name="warmup", daemon=True
+    )
+    _warmup_thread.start()
+    return _warmup_thread
+
+
+def readiness() -> Dict[str, object]:
+    targets = _warmup_targets or []
+    if "all" in targets:
+        targets = list(_resources)
+    warming = bool(_warmup_thread and _warmup_thread.is_alive())
+    return {
+        "ready": not warming and all(n in _resources and _resources[n].loaded for n in targets),
+        "warming": warming,
+        "warmup_targets": targets,
+        "resources": {name: r.status() for name, r in _resources.items()},
+    }
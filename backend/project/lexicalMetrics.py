@@ -0,0 +1,109 @@
+# Lexical answer metrics for process-pool workers. Kept free of heavy imports so
+# workers only pay for nltk/rouge_score, not SentenceTransformer/BERT model setup.
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Deque, Dict, Iterator, List, Sequence, Tuple
+
+from lazyLoader import lazy_module, lazy_resource
+
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", str(os.cpu_count() or 1)))
+EVAL_CHUNK_ROWS = int(os.getenv("EVAL_CHUNK_ROWS", "1000"))
+EVAL_PARALLEL_MIN_ROWS = int(os.getenv("EVAL_PARALLEL_MIN_ROWS", "2000"))
+
+
+def _load_rouge_scorer():
+    from rouge_score import rouge_scorer
+
+    return rouge_scorer.RougeScorer(["rougeL"], use_stemmer=True)
+
+
+# nltk and rouge_score are only imported once something is actually scored.
+_bleu_module = lazy_module("nltk.translate.bleu_score")
+# Built once per process; the Porter stemmer setup dominates a single score() call.
+_rouge = lazy_resource("rouge_scorer", _load_rouge_scorer)
+_smoothing = lazy_resource("bleu_smoothing", lambda: _bleu_module.get().SmoothingFunction().method1)
+
+
+def get_rouge_scorer():
+    return _rouge.get()
+
+
+def _sentence_bleu(references: List[List[str]], hypothesis: List[str]) -> float:
+    return _bleu_module.get().sentence_bleu(references, hypothesis, smoothing_function=_smoothing.get())
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").lower().strip().split())
+
+
+def _tokens(text: str) -> List[str]:
+    return normalize(text).split()
+
+
+def _f1_tokens(p: List[str], g: List[str]) -> float:
+    common = set(p) & set(g)
+    if not common:
+        return 0.0
+    precision = len(common) / len(p)
+    recall = len(common) / len(g)
+    return 2 * (precision * recall) / (precision + recall)
+
+
+def exact_match(pred: str, gt: str) -> float:
+    return 1.0 if normalize(pred) == normalize(gt) else 0.0
+
+
+def f1(pred: str, gt: str) -> float:
+    return _f1_tokens(_tokens(pred), _tokens(gt))
+
+
+def bleu(pred: str, gt: str) -> float:
+    return _sentence_bleu([_tokens(gt)], _tokens(pred))
+
+
+def rougeL(pred: str, gt: str) -> float:
+    return get_rouge_scorer().score(gt or "", pred or "")["rougeL"].fmeasure
+
+
+def lexical_metrics(pred: str, gt: str) -> Dict[str, float]:
+    # Each side is normalized and tokenized once and shared by every metric.
+    p = _tokens(pred)
+    g = _tokens(gt)
+    return {
+        "exact_match": 1.0 if p == g else 0.0,
+        "f1": _f1_tokens(p, g),
+        "bleu": _sentence_bleu([g], p),
+        "rougeL": get_rouge_scorer().score(gt or "", pred or "")["rougeL"].fmeasure,
+    }
+
+
+def score_lexical_rows(pairs: Sequence[Tuple[str, str]]) -> List[Dict[str, float]]:
+    return [lexical_metrics(pred, gt) for pred, gt in pairs]
+
+
+def iter_lexical_metrics(
+    pairs: Sequence[Tuple[str, str]],
+    chunk_rows: int = EVAL_CHUNK_ROWS,
+    workers: int = EVAL_WORKERS,
+) -> Iterator[List[Dict[str, float]]]:
+    # Yields one list of metric rows per chunk, in input order.
+    chunk_rows = max(1, chunk_rows)
+    ranges = [(start, min(start + chunk_rows, len(pairs))) for start in range(0, len(pairs), chunk_rows)]
+    if workers <= 1 or len(pairs) < EVAL_PARALLEL_MIN_ROWS:
+        for start, end in ranges:
+            yield score_lexical_rows(pairs[start:end])
+        return
+
+    # Only a few chunks are in flight at once, so finished results never pile up ahead of the writer.
+    # "spawn": this runs on a FastAPI threadpool thread, possibly after torch is loaded, and forking
+    # a multithreaded process can deadlock the child.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending: Deque = deque()
+        for start, end in ranges:
+            pending.append(pool.submit(score_lexical_rows, list(pairs[start:end])))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,478 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from GlobalVars import CACHE_DIR, DEBUG
+
+LOCAL_GRAPH_DIR = os.getenv("LOCAL_GRAPH_DIR", os.path.join(CACHE_DIR, "graph"))
+SNAPSHOT_VERSION = 1
+
+KIND_NEXT = 1
+KIND_SIMILAR = 2
+_KIND_BY_WRITER = {"next": KIND_NEXT, "similar": KIND_SIMILAR}
+
+_ARRAYS = (
+    "doc_file",
+    "adj_indptr",
+    "adj_indices",
+    "adj_kind",
+    "adj_weight",
+    "doc_feat_indptr",
+    "doc_feat_indices",
+    "feat_doc_indptr",
+    "feat_doc_indices",
+    "term_indptr",
+    "term_docs",
+    "term_tf",
+)
+_TABLES = ("doc_ids", "doc_texts", "feat_keys", "terms")
+# Added after the first snapshots were written; older snapshots load without them.
+_OPTIONAL_TABLES = ("doc_spans",)
+
+
+def _index_terms(text: str) -> List[str]:
+    return [t for t in re.findall(r"[A-Za-z0-9_]+", (text or "").lower()) if len(t) > 2]
+
+
+class StringTable:
+    # Strings packed into one UTF-8 blob plus offsets, so a snapshot can be memory-mapped as-is.
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, strings: List[str]) -> "StringTable":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8) if encoded else np.zeros(0, dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        return [self[i] for i in range(len(self))]
+
+    def bisect(self, value: str) -> int:
+        # Binary search over a sorted table without decoding it.
+        target = value.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.blob[self.offsets[mid]:self.offsets[mid + 1]].tobytes() < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self[lo] == value else -1
+
+    def save(self, directory: str, name: str):
+        np.save(os.path.join(directory, f"{name}.blob.npy"), self.blob)
+        np.save(os.path.join(directory, f"{name}.off.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, directory: str, name: str, mmap_mode: Optional[str] = "r") -> "StringTable":
+        return cls(
+            np.load(os.path.join(directory, f"{name}.blob.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, f"{name}.off.npy"), mmap_mode=mmap_mode),
+        )
+
+
+def _build_csr(n_rows: int, rows: np.ndarray, cols: np.ndarray, *values: np.ndarray):
+    rows = np.asarray(rows, dtype=np.int64)
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    if len(rows):
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return (indptr, np.asarray(cols, dtype=np.int32)[order], *[np.asarray(v)[order] for v in values])
+
+
+class _Snapshot:
+    def __init__(self, files: List[str], tables: Dict[str, StringTable], arrays: Dict[str, np.ndarray]):
+        self.files = files
+        self.file_codes = {f: i for i, f in enumerate(files)}
+        for name, table in tables.items():
+            setattr(self, name, table)
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def empty(cls) -> "_Snapshot":
+        tables = {name: StringTable.from_list([]) for name in _TABLES + _OPTIONAL_TABLES}
+        arrays = {name: np.zeros(1 if name.endswith("indptr") else 0, dtype=np.int64) for name in _ARRAYS}
+        return cls([], tables, arrays)
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_ids)
+
+
+class _Staging:
+    # Mutable form used while an ingest is in progress; compiled back to CSR on commit.
+    def __init__(self):
+        self.docs: Dict[str, Tuple[str, str, str]] = {}
+        self.edges: Dict[Tuple[str, str, int], float] = {}
+        self.features: Dict[str, set] = {}
+
+    @classmethod
+    def from_snapshot(cls, snap: _Snapshot) -> "_Staging":
+        staging = cls()
+        ids = snap.doc_ids.tolist()
+        for i, doc_id in enumerate(ids):
+            spans = snap.doc_spans[i] if len(snap.doc_spans) else ""
+            staging.docs[doc_id] = (snap.doc_texts[i], snap.files[int(snap.doc_file[i])], spans)
+            for p in range(int(snap.adj_indptr[i]), int(snap.adj_indptr[i + 1])):
+                j = int(snap.adj_indices[p])
+                if i < j:
+                    staging.edges[(doc_id, ids[j], int(snap.adj_kind[p]))] = float(snap.adj_weight[p])
+            feats = snap.doc_feat_indices[snap.doc_feat_indptr[i]:snap.doc_feat_indptr[i + 1]]
+            if len(feats):
+                staging.features[doc_id] = {snap.feat_keys[int(f)] for f in feats}
+        return staging
+
+    def compile(self) -> _Snapshot:
+        ids = list(self.docs)
+        index = {doc_id: i for i, doc_id in enumerate(ids)}
+        n = len(ids)
+        files = sorted({doc[1] for doc in self.docs.values()})
+        file_codes = {f: i for i, f in enumerate(files)}
+
+        rows, cols, kinds, weights = [], [], [], []
+        for (a, b, kind), weight in self.edges.items():
+            if a in index and b in index:
+                ia, ib = index[a], index[b]
+                rows += [ia, ib]
+                cols += [ib, ia]
+                kinds += [kind, kind]
+                weights += [weight, weight]
+        adj_indptr, adj_indices, adj_kind, adj_weight = _build_csr(
+            n, rows, cols, np.asarray(kinds, dtype=np.uint8), np.asarray(weights, dtype=np.float32)
+        )
+
+        feat_keys = sorted({key for doc_id, keys in self.features.items() if doc_id in index for key in keys})
+        feat_index = {key: i for i, key in enumerate(feat_keys)}
+        f_rows, f_cols = [], []
+        for doc_id, keys in self.features.items():
+            if doc_id in index:
+                for key in keys:
+                    f_rows.append(index[doc_id])
+                    f_cols.append(feat_index[key])
+        doc_feat_indptr, doc_feat_indices = _build_csr(n, f_rows, f_cols)
+        feat_doc_indptr, feat_doc_indices = _build_csr(len(feat_keys), f_cols, f_rows)
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for i, doc_id in enumerate(ids):
+            for term, tf in Counter(_index_terms(self.docs[doc_id][0])).items():
+                postings.setdefault(term, []).append((i, tf))
+        terms = sorted(postings)
+        t_rows, t_docs, t_tf = [], [], []
+        for t, term in enumerate(terms):
+            for doc, tf in postings[term]:
+                t_rows.append(t)
+                t_docs.append(doc)
+                t_tf.append(min(tf, 65535))
+        term_indptr, term_docs, term_tf = _build_csr(len(terms), t_rows, t_docs, np.asarray(t_tf, dtype=np.uint16))
+
+        tables = {
+            "doc_ids": StringTable.from_list(ids),
+            "doc_texts": StringTable.from_list([self.docs[d][0] for d in ids]),
+            "doc_spans": StringTable.from_list([self.docs[d][2] for d in ids]),
+            "feat_keys": StringTable.from_list(feat_keys),
+            "terms": StringTable.from_list(terms),
+        }
+        arrays = {
+            "doc_file": np.asarray([file_codes[self.docs[d][1]] for d in ids], dtype=np.int32),
+            "adj_indptr": adj_indptr,
+            "adj_indices": adj_indices,
+            "adj_kind": adj_kind,
+            "adj_weight": adj_weight,
+            "doc_feat_indptr": doc_feat_indptr,
+            "doc_feat_indices": doc_feat_indices,
+            "feat_doc_indptr": feat_doc_indptr,
+            "feat_doc_indices": feat_doc_indices,
+            "term_indptr": term_indptr,
+            "term_docs": term_docs,
+            "term_tf": term_tf,
+        }
+        return _Snapshot(files, tables, arrays)
+
+
+class LocalGraph:
+    def __init__(self, directory: str = LOCAL_GRAPH_DIR, snapshot: Optional[_Snapshot] = None):
+        self.directory = directory
+        self._snap = snapshot or _Snapshot.empty()
+        self._staging: Optional[_Staging] = None
+        self._lock = threading.RLock()
+        # Held for a whole ingest write; readers only take _lock and keep using the last snapshot.
+        self._write_lock = threading.Lock()
+
+    # ---- persistence -------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, directory: str = LOCAL_GRAPH_DIR, mmap_mode: Optional[str] = "r") -> "LocalGraph":
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return cls(directory)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != SNAPSHOT_VERSION:
+            if DEBUG:
+                print(f"[LOCALGRAPH] Ignoring snapshot version {meta.get('version')} in {directory}")
+            return cls(directory)
+        tables = {name: StringTable.load(directory, name, mmap_mode) for name in _TABLES}
+        for name in _OPTIONAL_TABLES:
+            present = os.path.exists(os.path.join(directory, f"{name}.off.npy"))
+            tables[name] = StringTable.load(directory, name, mmap_mode) if present else StringTable.from_list([])
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in _ARRAYS}
+        return cls(directory, _Snapshot(meta["files"], tables, arrays))
+
+    def save(self):
+        snap = self._snap
+        tmp_dir = self.directory.rstrip("/\\") + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in _TABLES + _OPTIONAL_TABLES:
+            getattr(snap, name).save(tmp_dir, name)
+        for name in _ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(getattr(snap, name)))
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "files": snap.files, "n_docs": snap.n_docs}, f)
+
+        # Swap directories so readers never see a half-written snapshot.
+        old_dir = self.directory.rstrip("/\\") + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(self.directory):
+            os.replace(self.directory, old_dir)
+        os.replace(tmp_dir, self.directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    # ---- ingest ------------------------------------------------------------------------
+
+    @contextmanager
+    def transaction(self, persist: bool = True):
+        # Staging is shared by the whole graph, so writers take turns: otherwise one job's commit()
+        # would publish another's half-written rows. A failed or cancelled write is discarded.
+        with self._write_lock:
+            try:
+                yield self
+            except BaseException:
+                with self._lock:
+                    self._staging = None
+                raise
+            self.commit(persist)
+
+    def _stage(self) -> _Staging:
+        if self._staging is None:
+            self._staging = _Staging.from_snapshot(self._snap)
+        return self._staging
+
+    def apply_rows(self, kind: str, rows: List[dict]):
+        with self._lock:
+            staging = self._stage()
+            for row in rows:
+                if kind == "documents":
+                    staging.docs[row["id"]] = (
+                        row.get("text") or "",
+                        row.get("file") or "default",
+                        row.get("sentence_spans") or "",
+                    )
+                elif kind in _KIND_BY_WRITER:
+                    a, b = (row["prev"], row["curr"]) if kind == "next" else (row["a"], row["b"])
+                    a, b = min(a, b), max(a, b)
+                    staging.edges[(a, b, _KIND_BY_WRITER[kind])] = float(row.get("score", 1.0))
+                elif kind == "entities":
+                    staging.features.setdefault(row["doc_id"], set()).add(f"entity\x1f{row['type']}\x1f{row['name']}")
+                elif kind == "topics":
+                    # One topic per document: a re-processed chunk replaces the one it had.
+                    features = staging.features.setdefault(row["doc_id"], set())
+                    features.difference_update([f for f in features if f.startswith("topic\x1f")])
+                    features.add(f"topic\x1f{row['topic']}")
+
+    def delete_documents(self, ids: List[str]):
+        with self._lock:
+            staging = self._stage()
+            removed = set(ids)
+            for doc_id in removed:
+                staging.docs.pop(doc_id, None)
+                staging.features.pop(doc_id, None)
+            # Drop their edges too, so a chunk re-added later does not inherit them.
+            for key in [k for k in staging.edges if k[0] in removed or k[1] in removed]:
+                del staging.edges[key]
+
+    def prune_next_edges(self, file_key: str, keep: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        # Removes NEXT edges of this file that are not in keep; returns the removed pairs.
+        with self._lock:
+            staging = self._stage()
+            wanted = {(min(a, b), max(a, b)) for a, b in keep}
+            file_docs = {d for d, doc in staging.docs.items() if doc[1] == file_key}
+            removed = [
+                key for key in staging.edges
+                if key[2] == KIND_NEXT and (key[0] in file_docs or key[1] in file_docs) and key[:2] not in wanted
+            ]
+            for key in removed:
+                del staging.edges[key]
+            return [key[:2] for key in removed]
+
+    def file_ids(self, file_key: str) -> List[str]:
+        # Committed chunks only; staged rows may belong to another job's unfinished write.
+        with self._lock:
+            snap = self._snap
+            code = snap.file_codes.get(file_key)
+            if code is None:
+                return []
+            return [snap.doc_ids[int(i)] for i in np.flatnonzero(np.asarray(snap.doc_file) == code)]
+
+    def commit(self, persist: bool = True):
+        with self._lock:
+            if self._staging is None:
+                return
+            self._snap = self._staging.compile()
+            self._staging = None
+            if persist:
+                self.save()
+        if DEBUG:
+            print(f"[LOCALGRAPH] Committed snapshot | docs={self._snap.n_docs} | edges={len(self._snap.adj_indices) // 2}")
+
+    def clear(self):
+        with self._write_lock, self._lock:
+            self._snap = _Snapshot.empty()
+            self._staging = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    # ---- retrieval ---------------------------------------------------------------------
+
+    def _file_mask(self, snap: _Snapshot, collection: Optional[str]) -> Optional[np.ndarray]:
+        if collection is None:
+            return None
+        code = snap.file_codes.get(collection, -1)
+        return np.asarray(snap.doc_file) == code
+
+    def seed(self, query: str, top_k: int, collection: Optional[str] = None, snap: Optional[_Snapshot] = None) -> np.ndarray:
+        snap = snap or self._snap
+        n = snap.n_docs
+        terms = list(dict.fromkeys(_index_terms(query)))
+        if not n or not terms:
+            return np.zeros(0, dtype=np.int64)
+
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            row = snap.terms.bisect(term)
+            if row < 0:
+                continue
+            start, end = int(snap.term_indptr[row]), int(snap.term_indptr[row + 1])
+            docs = snap.term_docs[start:end]
+            tf = snap.term_tf[start:end].astype(np.float32)
+            idf = math.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf / (tf + 1.2)
+
+        mask = self._file_mask(snap, collection)
+        if mask is not None:
+            scores[~mask] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def expand(
+        self, seeds: np.ndarray, depth: int, limit: int, snap: Optional[_Snapshot] = None
+    ) -> List[Tuple[int, int, int]]:
+        # Breadth-first over NEXT/SIMILAR_TO; returns (doc, hops, seed_rank) nearest first.
+        snap = snap or self._snap
+        n = snap.n_docs
+        rank = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        rank[seeds] = np.arange(len(seeds))
+        visited = np.zeros(n, dtype=bool)
+        visited[seeds] = True
+        frontier = np.asarray(seeds, dtype=np.int64)
+        found: List[Tuple[int, int, int]] = []
+        for hop in range(1, depth + 1):
+            if not len(frontier) or len(found) >= limit:
+                break
+            starts = snap.adj_indptr[frontier]
+            counts = snap.adj_indptr[frontier + 1] - starts
+            parents = np.repeat(frontier, counts)
+            nbrs = np.concatenate([snap.adj_indices[snap.adj_indptr[f]:snap.adj_indptr[f + 1]] for f in frontier])
+            fresh = ~visited[nbrs]
+            parents, nbrs = parents[fresh], nbrs[fresh].astype(np.int64)
+            # A neighbour reached from several seeds keeps the best (lowest) seed rank.
+            np.minimum.at(rank, nbrs, rank[parents])
+            nbrs = np.unique(nbrs)
+            visited[nbrs] = True
+            order = np.argsort(rank[nbrs], kind="stable")
+            found.extend((int(d), hop, int(rank[d])) for d in nbrs[order])
+            frontier = nbrs
+        return found[:limit]
+
+    def shared_neighbours(
+        self, seeds: np.ndarray, limit: int, collection: Optional[str] = None, snap: Optional[_Snapshot] = None
+    ) -> List[Tuple[int, int]]:
+        # Documents sharing an entity or topic with any seed, most shared features first.
+        snap = snap or self._snap
+        n = snap.n_docs
+        counts = np.zeros(n, dtype=np.int64)
+        rank = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        for r, s in enumerate(seeds):
+            feats = snap.doc_feat_indices[snap.doc_feat_indptr[s]:snap.doc_feat_indptr[s + 1]]
+            if not len(feats):
+                continue
+            docs = np.concatenate([snap.feat_doc_indices[snap.feat_doc_indptr[f]:snap.feat_doc_indptr[f + 1]] for f in feats])
+            np.add.at(counts, docs, 1)
+            rank[docs] = np.minimum(rank[docs], r)
+        counts[seeds] = 0
+        mask = self._file_mask(snap, collection)
+        if mask is not None:
+            counts[~mask] = 0
+        ranked = np.flatnonzero(counts)
+        ranked = ranked[np.lexsort((rank[ranked], -counts[ranked]))]
+        return [(int(d), int(rank[d])) for d in ranked[:limit]]
+
+    def related_candidates(
+        self, query: str, top_k: int, depth: int, collection: Optional[str] = None
+    ) -> Dict[str, List[dict]]:
+        snap = self._snap
+        seeds = self.seed(query, top_k, collection, snap=snap)
+        texts, ids = snap.doc_texts, snap.doc_ids
+        has_spans = len(snap.doc_spans) == snap.n_docs
+
+        def row(d: int, **extra) -> dict:
+            return {"id": ids[d], "text": texts[d], "spans": snap.doc_spans[d] if has_spans else None, **extra}
+
+        candidates: Dict[str, List[dict]] = {
+            "seeds": [row(int(s)) for s in seeds],
+            "expanded": [],
+            "shared": [],
+        }
+        if depth > 1 and len(seeds):
+            candidates["expanded"] = [
+                row(d, hops=hops, seed_rank=r) for d, hops, r in self.expand(seeds, depth, top_k * depth, snap=snap)
+            ]
+            candidates["shared"] = [
+                row(d, seed_rank=r) for d, r in self.shared_neighbours(seeds, top_k * depth, collection, snap=snap)
+            ]
+        return candidates
+
+
+_local_graph: Optional[LocalGraph] = None
+_local_graph_lock = threading.Lock()
+
+
+def get_local_graph() -> LocalGraph:
+    global _local_graph
+    with _local_graph_lock:
+        if _local_graph is None:
+            _local_graph = LocalGraph.load(LOCAL_GRAPH_DIR)
+            if DEBUG:
+                print(f"[LOCALGRAPH] Loaded snapshot from {LOCAL_GRAPH_DIR} | docs={_local_graph._snap.n_docs}")
+        return _local_graph
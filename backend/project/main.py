@@ -1,17 +1,27 @@
+import json
 import math
 import os
 import shutil
+import uuid
 from typing import Dict, List, Optional
 
 import numpy as np
 from fastapi import FastAPI, File, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-import docProcess as docprocess
-from evaluate import evaluate_llm_predictions
+from answerCache import answer_cache
+from bm25Index import bm25_indexes
+from clientRegistry import client_registry
 from GlobalVars import DB_DIR, FILE_DIR, MODEL
-from query import chatapplicationApi
+from ingestJobs import IngestPaused, ingest_jobs
+from lazyLoader import readiness, start_warmup
+from localGraph import get_local_graph
+from query import chatapplicationApi, iter_chatapplication_events
+from stageMetrics import stage_metrics
+
+DELETE_WAIT_TIMEOUT_S = float(os.getenv("DELETE_WAIT_TIMEOUT_S", "300"))
 
 app = FastAPI()
 contexts: List[str] = []
@@ -30,30 +40,76 @@ if not os.path.exists(FILE_DIR):
 if not os.path.exists(DB_DIR):
     os.mkdir(DB_DIR)
 
+
+@app.on_event("startup")
+def warm_up_models():
+    # Opt-in via WARMUP_RESOURCES (e.g. "spacy,sentence_transformer" or "all"); loads off the request path.
+    start_warmup(imports=("graphProcess", "evaluate"))
+
+
+@app.get("/ready")
+def ready():
+    return readiness()
+
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus scrape target: per-stage latency histograms for queries and ingest jobs.
+    return PlainTextResponse(stage_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/uploadpdf/")
 async def upload_pdf(file: UploadFile = File(...)):
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
     contents = await file.read()
-    save_path = os.path.join(FILE_DIR, file.filename)
+    # Each upload gets its own directory: a re-upload must not overwrite a file a queued or
+    # running job for the same name is still reading.
+    upload_dir = os.path.join(FILE_DIR, uuid.uuid4().hex)
+    os.makedirs(upload_dir, exist_ok=True)
+    save_path = os.path.join(upload_dir, os.path.basename(file.filename))
     with open(save_path, "wb") as f:
         f.write(contents)
 
-    document = docprocess.load_document(save_path)
-    chunks = docprocess.split_document(document)
-    client = docprocess.getclient(file.filename, MODEL, DB_DIR)
-    docprocess.add_docs(client=client, chunks=chunks)
-    del client
+    # Parsing, embedding and graph writes run on the ingest pool; poll /jobs/{job_id} for progress.
+    try:
+        job = ingest_jobs.submit(file.filename, save_path, upload_dir=upload_dir)
+    except IngestPaused as e:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise HTTPException(status_code=503, detail=str(e))
 
     return {
         "filename": file.filename,
         "content_type": file.content_type,
         "size": len(contents),
-        "message": f"PDF file '{file.filename}' uploaded successfully!",
+        "job_id": job.id,
+        "status": job.status,
+        "message": f"PDF file '{file.filename}' uploaded successfully! Ingestion queued.",
     }
 
 
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": ingest_jobs.list()}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job id '{job_id}'")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = ingest_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job id '{job_id}'")
+    return job.to_dict()
+
+
 class RuntimeMetric(BaseModel):
     latency_ms: Optional[float] = None
     token_usage_estimated: Optional[float] = None
@@ -99,6 +155,9 @@ def _sanitize_for_json(obj):
 def getmetrics(req: MetricsRequest):
     getmetrics_validate_shape(req)
     runtime_metrics = [m.model_dump() for m in req.runtime_metrics] if req.runtime_metrics else None
+    # Evaluation pulls in pandas, SentenceTransformer, BERTScore and MLflow; only load them when asked.
+    from evaluate import evaluate_llm_predictions
+
     results = evaluate_llm_predictions(
         predictions=req.llm_outputs,
         ground_truths=req.ground_truths,
@@ -110,20 +169,55 @@ def getmetrics(req: MetricsRequest):
     return {"status": "success", "metrics": _sanitize_for_json(results)}
 
 
-@app.get("/getresult/{filename}/{query}")
-def queryengine(filename: str, query: str):
-    response = chatapplicationApi(query, filename, MODEL, DB_DIR)
+def _remember_context(response: Dict[str, object]):
     evidence_context = response.get("fused_context") or (
         response.get("vector_context", "") + "\n" + response.get("graph_context", "")
     )
     contexts.append(evidence_context)
     if len(contexts) > 1000:
         del contexts[0]
+
+
+@app.get("/getresult/{filename}/{query}")
+def queryengine(filename: str, query: str):
+    response = chatapplicationApi(query, filename, MODEL, DB_DIR)
+    _remember_context(response)
     return _sanitize_for_json(response)
 
 
+@app.get("/streamresult/{filename}/{query}")
+def streamqueryengine(filename: str, query: str):
+    # Server-sent events: retrieval metadata, answer tokens, revisions, then the full /getresult payload.
+    def event_stream():
+        for event, data in iter_chatapplication_events(query, filename, MODEL, DB_DIR, stream=True):
+            if event == "final":
+                _remember_context(data)
+            payload = json.dumps(_sanitize_for_json(data), default=str)
+            yield f"event: {event}\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/delete")
 def deletedata():
+    # No upload can queue a job until the wipe is done.
+    with ingest_jobs.paused():
+        return _delete_all_data()
+
+
+def _delete_all_data():
+    # Jobs stop at their next checkpoint (a started graph write runs to the end); wiping while one
+    # is still writing would leave its files, vectors or BM25 index behind.
+    if not ingest_jobs.cancel_all(wait=True, timeout=DELETE_WAIT_TIMEOUT_S):
+        return {"error": f"ingest jobs still running after {DELETE_WAIT_TIMEOUT_S}s; nothing was deleted"}
+    client_registry.invalidate()
+    answer_cache.invalidate()
+    bm25_indexes.clear()
+    get_local_graph().clear()
     if os.path.exists(FILE_DIR):
         for item in os.listdir(FILE_DIR):
             item_path = os.path.join(FILE_DIR, item)
@@ -0,0 +1,51 @@
+# Page-range PDF parsing for process-pool workers. Kept free of heavy imports so
+# spawned workers only pay for pypdf, not spaCy/LangChain model setup.
+from datetime import datetime
+from typing import Dict, List
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+
+def count_pages(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+
+def _document_metadata(reader: PdfReader, file_path: str) -> Dict[str, object]:
+    # Mirrors PyPDFLoader: producer/creator defaults, lower-cased info keys, ISO dates.
+    raw = {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+    raw.update(reader.metadata or {})
+
+    metadata: Dict[str, object] = {}
+    for key, value in raw.items():
+        if type(value) not in (str, int):
+            value = str(value)
+        key = key[1:] if key.startswith("/") else key
+        key = key.lower()
+        if key in ("creationdate", "moddate"):
+            try:
+                value = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat("T")
+            except ValueError:
+                pass
+        metadata[key] = value
+
+    metadata["source"] = file_path
+    metadata["total_pages"] = len(reader.pages)
+    return metadata
+
+
+def parse_page_range(file_path: str, start: int, end: int) -> List[Document]:
+    reader = PdfReader(file_path)
+    base = _document_metadata(reader, file_path)
+    labels = reader.page_labels
+
+    documents: List[Document] = []
+    for page_number in range(start, min(end, len(reader.pages))):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain")
+        documents.append(
+            Document(
+                page_content=text,
+                metadata=dict(base, page=page_number, page_label=labels[page_number]),
+            )
+        )
+    return documents
@@ -1,18 +1,34 @@
+import os
 import re
 import time
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from langchain_chroma.vectorstores import Chroma
 from langchain_core.prompts import PromptTemplate
-from langchain_ollama import ChatOllama, OllamaEmbeddings
 
+from answerCache import ANSWER_CACHE_ENABLED, answer_cache
+from bm25Index import BM25_ENABLED, bm25_indexes
+from clientRegistry import client_registry
+from contextFusion import CONTEXT_FUSION, fetch_chunk_embeddings, fuse_evidence
 from GlobalVars import *
-from graphProcess import get_related_context
+from graphProcess import GRAPH_RETRIEVAL_TIMEOUT_S, fetch_graph_candidates, select_graph_evidence
+from stageMetrics import Trace, stage_metrics
+from textSegments import decode_spans, graph_separator, pack_segments
 
 DEFAULT_MAX_REFLECTION_ITERATIONS = 2
 DEFAULT_CONFIDENCE_TARGET = 0.72
 DEFAULT_HALLUCINATION_MAX = 0.42
 ESTIMATED_USD_PER_1K_TOKENS = 0.0002
+VECTOR_RETRIEVAL_TIMEOUT_S = float(os.getenv("VECTOR_RETRIEVAL_TIMEOUT_S", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Shared across requests; a timed-out branch finishes in the background without blocking the query.
+# One pool per branch, so a slow Neo4j backing up graph work cannot starve vector retrieval.
+_RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+_VECTOR_POOL = ThreadPoolExecutor(max_workers=_RETRIEVAL_WORKERS, thread_name_prefix="vector-retrieval")
+_GRAPH_POOL = ThreadPoolExecutor(max_workers=_RETRIEVAL_WORKERS, thread_name_prefix="graph-retrieval")
 
 
 def _tokenize(text: str) -> List[str]:
@@ -24,40 +40,41 @@ def _estimate_tokens(text: str) -> int:
 
 
 def _adaptive_context_granularity(context: str, token_budget: int, complexity_label: str) -> str:
-    if not context:
-        return ""
-
-    paragraphs = [p.strip() for p in context.split("\n") if p.strip()]
-    if not paragraphs:
-        return ""
-
-    selected: List[str] = []
-    used_tokens = 0
-    max_budget = max(80, token_budget)
-
-    if complexity_label == "complex":
-        for para in paragraphs:
-            sentences = re.split(r"(?<=[.!?])\s+", para)
-            for sent in sentences:
-                sent = sent.strip()
-                if not sent:
-                    continue
-                t = _estimate_tokens(sent)
-                if used_tokens + t > max_budget:
-                    break
-                selected.append(sent)
-                used_tokens += t
-            if used_tokens >= max_budget:
-                break
-    else:
-        for para in paragraphs:
-            t = _estimate_tokens(para)
-            if used_tokens + t > max_budget:
-                break
-            selected.append(para)
-            used_tokens += t
+    # Ad-hoc strings are segmented here; retrieved chunks carry ingest-time spans instead.
+    return pack_segments([(context or "", None)], token_budget, complexity_label)
+
+
+def _vector_evidence(results) -> List[Dict[str, object]]:
+    items = []
+    for doc, _ in results:
+        text = getattr(doc, "page_content", None)
+        if text:
+            metadata = getattr(doc, "metadata", None) or {}
+            items.append(
+                {"id": metadata.get("chunk_id"), "text": text, "spans": decode_spans(metadata.get("sentence_spans"))}
+            )
+    return items
+
+
+def _lexical_evidence(hits: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    return [{"id": hit["id"], "text": hit["text"], "spans": decode_spans(hit["spans"])} for hit in hits]
+
 
-    return "\n".join(selected)
+def _rrf_fuse(*ranked_lists: List[Dict[str, object]], limit: int) -> List[Dict[str, object]]:
+    # Reciprocal rank fusion: rank positions are comparable across channels where raw scores are not.
+    scores: Dict[str, float] = {}
+    items: Dict[str, Dict[str, object]] = {}
+    for ranked in ranked_lists:
+        for rank, item in enumerate(ranked):
+            key = item.get("id") or item["text"]
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            items.setdefault(key, item)
+    order = sorted(scores, key=lambda key: -scores[key])
+    return [items[key] for key in order[:limit]]
+
+
+def _graph_candidate_ids(candidates: Dict[str, List[dict]]) -> List[str]:
+    return [row.get("id") for rows in candidates.values() for row in rows if row.get("id")]
 
 
 def analyze_query_complexity(query: str) -> Dict[str, object]:
@@ -115,8 +132,16 @@ def get_dynamic_retrieval_plan(complexity: Dict[str, object], iteration: int) ->
     }
 
 
-def _vector_retrieval(db: Chroma, query: str, top_k: int) -> Tuple[List[Tuple[object, float]], str, float]:
-    results = db.similarity_search_with_score(query, k=max(1, top_k))
+def _vector_retrieval(
+    db: Chroma, query: str, top_k: int, query_embedding: Optional[List[float]] = None
+) -> Tuple[List[Tuple[object, float]], str, float]:
+    if query_embedding is None:
+        query_embedding = db.embeddings.embed_query(query)
+    results = db.similarity_search_by_vector_with_relevance_scores(query_embedding, k=max(1, top_k))
+    return _summarize_vector_results(results)
+
+
+def _summarize_vector_results(results) -> Tuple[List[Tuple[object, float]], str, float]:
     vector_context = "\n".join([doc.page_content for doc, _ in results if getattr(doc, "page_content", None)])
 
     if not results:
@@ -128,6 +153,88 @@ def _vector_retrieval(db: Chroma, query: str, top_k: int) -> Tuple[List[Tuple[ob
     return results, vector_context, float(vector_confidence)
 
 
+def _timed(fn, **kwargs):
+    start = time.perf_counter()
+    result = fn(**kwargs)
+    return result, round((time.perf_counter() - start) * 1000.0, 2)
+
+
+def _concurrent_retrieval(
+    db: Chroma,
+    query: str,
+    collection: str,
+    vector_k: int,
+    graph_k: int,
+    graph_depth: int,
+    query_embedding: Optional[List[float]] = None,
+    trace: Optional[Trace] = None,
+) -> Tuple[List[Tuple[object, float]], Dict[str, List[dict]], List[Dict[str, object]], Dict[str, object]]:
+    # Vector (Ollama + Chroma) and graph (Neo4j) retrieval are independent I/O; run them side by side.
+    # The local BM25 lookup runs in this thread meanwhile; it needs neither a model nor a network hop.
+    trace = trace or Trace("query")
+    start = time.perf_counter()
+    vector_future = _VECTOR_POOL.submit(
+        _timed, _vector_retrieval, db=db, query=query, top_k=vector_k, query_embedding=query_embedding
+    )
+    graph_future = _GRAPH_POOL.submit(
+        _timed,
+        fetch_graph_candidates,
+        query=query,
+        top_k=graph_k,
+        traversal_depth=graph_depth,
+        collection=collection,
+    )
+    timings: Dict[str, object] = {
+        "vector_timed_out": False,
+        "graph_timed_out": False,
+        "vector_failed": False,
+        "graph_failed": False,
+    }
+
+    lexical_candidates: List[Dict[str, object]] = []
+    if BM25_ENABLED:
+        lexical_start = time.perf_counter()
+        try:
+            lexical_candidates = bm25_indexes.search(collection, query, vector_k)
+        except Exception as e:
+            print(f"[QUERY][WARN] BM25 lookup failed; continuing without it: {e}")
+        timings["lexical_ms"] = round((time.perf_counter() - lexical_start) * 1000.0, 3)
+        trace.record("lexical_retrieval", timings["lexical_ms"])
+
+    try:
+        (vector_candidates, _, _), timings["vector_ms"] = vector_future.result(timeout=VECTOR_RETRIEVAL_TIMEOUT_S)
+    except FutureTimeoutError:
+        print(f"[QUERY][WARN] Vector retrieval exceeded {VECTOR_RETRIEVAL_TIMEOUT_S}s; continuing without it.")
+        vector_candidates, timings["vector_ms"], timings["vector_timed_out"] = [], None, True
+    except Exception as e:
+        # A failing branch (Ollama or Chroma down) degrades the answer like a timeout does.
+        print(f"[QUERY][WARN] Vector retrieval failed; continuing without it: {e}")
+        vector_candidates, timings["vector_ms"], timings["vector_failed"] = [], None, True
+    trace.record(
+        "vector_retrieval", timings["vector_ms"], error=timings["vector_timed_out"] or timings["vector_failed"]
+    )
+
+    # Deadlines are measured from dispatch, so waiting on the vector branch eats into the graph budget.
+    remaining = max(0.0, GRAPH_RETRIEVAL_TIMEOUT_S - (time.perf_counter() - start))
+    try:
+        graph_candidates, timings["graph_ms"] = graph_future.result(timeout=remaining)
+    except FutureTimeoutError:
+        if DEBUG:
+            print(f"[QUERY] Graph retrieval exceeded {GRAPH_RETRIEVAL_TIMEOUT_S}s; degrading to vector-only.")
+        graph_candidates = {"seeds": [], "expanded": [], "shared": []}
+        timings["graph_ms"], timings["graph_timed_out"] = None, True
+    except Exception as e:
+        print(f"[QUERY][WARN] Graph retrieval failed; degrading to vector-only: {e}")
+        graph_candidates = {"seeds": [], "expanded": [], "shared": []}
+        timings["graph_ms"], timings["graph_failed"] = None, True
+    trace.record(
+        "graph_retrieval", timings["graph_ms"], error=timings["graph_timed_out"] or timings["graph_failed"]
+    )
+
+    timings["wall_ms"] = round((time.perf_counter() - start) * 1000.0, 2)
+    return vector_candidates, graph_candidates, lexical_candidates, timings
+
+
 def _dynamic_fusion_weights(
     complexity: Dict[str, object], vector_confidence: float, graph_context: str
 ) -> Dict[str, float]:
@@ -181,13 +288,29 @@ def _should_reflect(
     return confidence < DEFAULT_CONFIDENCE_TARGET or hallucination_probability > DEFAULT_HALLUCINATION_MAX
 
 
-def chatapplicationApi(
+def _answer_cache_runtime(hit: bool, similarity: Optional[float] = None, saved_ms: float = 0.0) -> Dict[str, object]:
+    stats = answer_cache.stats()
+    return {
+        "hit": hit,
+        "similarity": round(similarity, 4) if similarity is not None else None,
+        "latency_saved_ms": round(saved_ms, 2),
+        "hits": stats["hits"],
+        "misses": stats["misses"],
+        "total_latency_saved_ms": stats["latency_saved_ms"],
+    }
+
+
+def iter_chatapplication_events(
     query: str,
     collectionName: str,
     modelName: str,
     dbpath: str,
     max_reflection_iterations: int = DEFAULT_MAX_REFLECTION_ITERATIONS,
-):
+    stream: bool = False,
+) -> Iterator[Tuple[str, Dict[str, object]]]:
+    # Yields (event, data): "retrieval" once, then per iteration "revision" (from the second
+    # iteration on), "token" chunks when stream=True and "iteration"; finally "final" with the
+    # same payload chatapplicationApi returns.
     prompt_template = PromptTemplate.from_template(
         """
         You are a helpful AI assistant.
@@ -205,29 +328,111 @@ def chatapplicationApi(
     )
 
     start_total = time.perf_counter()
+    # Per-stage spans; the breakdown is returned as runtime["stages"] and feeds /metrics.
+    trace = Trace("query")
     complexity = analyze_query_complexity(query)
 
-    chat_model = ChatOllama(model=modelName, temperature=0)
-    db = Chroma(
-        collection_name=collectionName,
-        embedding_function=OllamaEmbeddings(model=modelName),
-        persist_directory=dbpath,
-    )
+    # Warm clients from the registry; Chroma is not reopened per request.
+    chat_model = client_registry.get_chat_model(modelName)
+    db = client_registry.get_vectorstore(collectionName, modelName, dbpath)
+
+    # Embedded once: shared by the answer cache, vector retrieval and MMR fusion.
+    query_embedding = None
+    try:
+        with trace.span("query_embedding"):
+            query_embedding = db.embeddings.embed_query(query)
+    except Exception as e:
+        print(f"[QUERY][WARN] Query embedding failed; skipping answer cache: {e}")
+
+    # Near-duplicate questions against the same collection reuse an earlier answer.
+    cache_key = (collectionName, modelName)
+    cache_generation = answer_cache.generation(cache_key)
+    if ANSWER_CACHE_ENABLED and query_embedding is not None:
+        with trace.span("answer_cache"):
+            cached = answer_cache.lookup(cache_key, query_embedding)
+        if cached is not None:
+            payload, similarity, original_ms = cached
+            latency_ms = round((time.perf_counter() - start_total) * 1000.0, 2)
+            saved_ms = max(0.0, original_ms - latency_ms)
+            answer_cache.record_saving(saved_ms)
+            payload["runtime"].update(
+                {
+                    "latency_ms": latency_ms,
+                    "token_usage_estimated": 0,
+                    "api_cost_estimate_usd": 0.0,
+                    "answer_cache": _answer_cache_runtime(True, similarity, saved_ms),
+                    "stages": trace.breakdown(),
+                }
+            )
+            stage_metrics.observe("query", "request", latency_ms / 1000.0)
+            payload["runtime"].pop("time_to_first_token_ms", None)
+            if stream:
+                payload["runtime"]["time_to_first_token_ms"] = latency_ms
+                yield "token", {"iteration": 0, "text": payload["content"]}
+            yield "final", payload
+            return
 
     best = None
     iteration_logs: List[Dict[str, object]] = []
     total_tokens = 0
 
-    for iteration in range(max(0, max_reflection_iterations) + 1):
-        step_start = time.perf_counter()
-        plan = get_dynamic_retrieval_plan(complexity, iteration)
+    # Plans only widen across reflections, so retrieve once at the widest plan and slice per iteration.
+    iterations = max(0, max_reflection_iterations) + 1
+    plans = [get_dynamic_retrieval_plan(complexity, i) for i in range(iterations)]
+    retrieval_start = time.perf_counter()
+    vector_candidates, graph_candidates, lexical_candidates, retrieval_timings = _concurrent_retrieval(
+        db=db,
+        query=query,
+        collection=collectionName,
+        vector_k=max(p["vector_k"] for p in plans),
+        graph_k=max(p["graph_k"] for p in plans),
+        graph_depth=max(p["graph_depth"] for p in plans),
+        query_embedding=query_embedding,
+        trace=trace,
+    )
+
+    fusion_enabled = CONTEXT_FUSION == "mmr"
+    chunk_embeddings = {}
+    if fusion_enabled:
+        # Stored chunk vectors drive near-duplicate detection and MMR; fetched once for all iterations.
+        fetch_start = time.perf_counter()
+        with trace.span("chunk_embeddings"):
+            chunk_embeddings = fetch_chunk_embeddings(
+                db,
+                [(getattr(doc, "metadata", None) or {}).get("chunk_id") for doc, _ in vector_candidates]
+                + [hit["id"] for hit in lexical_candidates]
+                + _graph_candidate_ids(graph_candidates),
+            )
+        retrieval_timings["chunk_embeddings_ms"] = round((time.perf_counter() - fetch_start) * 1000.0, 2)
+
+    first_token_ms: Optional[float] = None
+    yield "retrieval", {
+        "query_complexity": complexity,
+        "retrieval": retrieval_timings,
+        "vector_candidates": len(vector_candidates),
+        "graph_seeds": len(graph_candidates.get("seeds", [])),
+        "lexical_candidates": len(lexical_candidates),
+    }
+    lexical_evidence = _lexical_evidence(lexical_candidates)
+
+    for iteration in range(iterations):
+        # The shared retrieval round is charged to the first iteration.
+        step_start = retrieval_start if iteration == 0 else time.perf_counter()
+        plan = plans[iteration]
 
-        vector_results, raw_vector_context, vector_confidence = _vector_retrieval(
-            db=db, query=query, top_k=plan["vector_k"]
+        vector_results, raw_vector_context, vector_confidence = _summarize_vector_results(
+            vector_candidates[: plan["vector_k"]]
         )
-        raw_graph_context = get_related_context(
-            query=query, top_k=plan["graph_k"], traversal_depth=plan["graph_depth"]
+        # Dense and BM25 hits share the vector section, merged by reciprocal rank.
+        vector_evidence = _vector_evidence(vector_results)
+        if lexical_evidence:
+            vector_evidence = _rrf_fuse(
+                vector_evidence, lexical_evidence[: plan["vector_k"]], limit=plan["vector_k"]
+            )
+        graph_evidence = select_graph_evidence(
+            graph_candidates, top_k=plan["graph_k"], traversal_depth=plan["graph_depth"]
         )
+        raw_graph_context = "\n---\n".join(row["text"] for row in graph_evidence)
 
         weights = _dynamic_fusion_weights(
             complexity=complexity,
@@ -240,12 +445,33 @@ def chatapplicationApi(
         vector_budget = int(budget * weights["vector"])
         graph_budget = max(80, budget - vector_budget)
 
-        vector_context = _adaptive_context_granularity(
-            raw_vector_context, token_budget=vector_budget, complexity_label=str(complexity["label"])
-        )
-        graph_context = _adaptive_context_granularity(
-            raw_graph_context, token_budget=graph_budget, complexity_label=str(complexity["label"])
-        )
+        # Packing slices precomputed sentence spans; no splitting or re-tokenizing per iteration.
+        fusion_stats = None
+        with trace.span("context_packing"):
+            if fusion_enabled:
+                vector_context, graph_context, fusion_stats = fuse_evidence(
+                    vector_evidence,
+                    graph_evidence,
+                    query_embedding=query_embedding,
+                    chunk_embeddings=chunk_embeddings,
+                    weights=weights,
+                    token_budget=vector_budget + graph_budget,
+                    complexity_label=str(complexity["label"]),
+                )
+            else:
+                graph_segments = []
+                for row in graph_evidence:
+                    if graph_segments:
+                        graph_segments.append(graph_separator())
+                    graph_segments.append((row["text"], row["spans"]))
+                vector_context = pack_segments(
+                    [(item["text"], item["spans"]) for item in vector_evidence],
+                    token_budget=vector_budget,
+                    complexity_label=str(complexity["label"]),
+                )
+                graph_context = pack_segments(
+                    graph_segments, token_budget=graph_budget, complexity_label=str(complexity["label"])
+                )
 
         prompt = prompt_template.invoke(
             {
@@ -255,8 +481,24 @@ def chatapplicationApi(
             }
         )
 
-        response = chat_model.invoke(prompt)
-        answer = getattr(response, "content", str(response))
+        if iteration > 0:
+            # Clients should replace the previous answer with this reflection's tokens.
+            yield "revision", {"iteration": iteration + 1, "plan": plan}
+
+        # When streaming, the span also covers the time the client takes to consume each token.
+        with trace.span("llm_generation"):
+            if stream:
+                response = None
+                for chunk in chat_model.stream(prompt):
+                    response = chunk if response is None else response + chunk
+                    text = getattr(chunk, "content", "")
+                    if text:
+                        if first_token_ms is None:
+                            first_token_ms = round((time.perf_counter() - start_total) * 1000.0, 2)
+                        yield "token", {"iteration": iteration + 1, "text": text}
+            else:
+                response = chat_model.invoke(prompt)
+        answer = getattr(response, "content", str(response)) if response is not None else ""
         fused_context = (vector_context + "\n" + graph_context).strip()
 
         evidence = _evidence_sufficiency(answer, fused_context)
@@ -280,8 +522,11 @@ def chatapplicationApi(
             "response_confidence": round(confidence, 4),
             "latency_ms": step_latency_ms,
             "token_usage_estimated": step_tokens,
+            "retrieval": retrieval_timings if iteration == 0 else {"reused": True},
+            "context_fusion": fusion_stats,
         }
         iteration_logs.append(iteration_log)
+        yield "iteration", iteration_log
 
         current = {
             "response": response,
@@ -295,6 +540,8 @@ def chatapplicationApi(
             "confidence": confidence,
             "evidence": evidence,
             "hallucination": hallucination,
+            "fusion": fusion_stats,
+            "lexical_chunks": len(lexical_evidence[: plan["vector_k"]]),
         }
 
         if best is None or current["confidence"] > best["confidence"]:
@@ -304,12 +551,27 @@ def chatapplicationApi(
             best = current
             break
 
-    del db
-
     total_latency_ms = round((time.perf_counter() - start_total) * 1000.0, 2)
     estimated_cost = round((total_tokens / 1000.0) * ESTIMATED_USD_PER_1K_TOKENS, 6)
 
-    return {
+    runtime = {
+        "latency_ms": total_latency_ms,
+        "token_usage_estimated": total_tokens,
+        "api_cost_estimate_usd": estimated_cost,
+        "reflection_iterations": len(iteration_logs),
+        "retrieval_confidence": round(best["vector_confidence"], 4),
+        "evidence_sufficiency": round(best["evidence"], 4),
+        "hallucination_probability": round(best["hallucination"], 4),
+    }
+    if best["fusion"] is not None:
+        runtime["context_fusion"] = best["fusion"]
+        runtime["tokens_saved"] = best["fusion"]["tokens_saved"]
+    if stream:
+        runtime["time_to_first_token_ms"] = first_token_ms
+    runtime["stages"] = trace.breakdown()
+    stage_metrics.observe("query", "request", total_latency_ms / 1000.0)
+
+    payload = {
         "content": best["answer"],
         "metadata": getattr(best["response"], "response_metadata", {}),
         "vector_context": best["vector_context"],
@@ -317,6 +579,7 @@ def chatapplicationApi(
         "fused_context": (best["vector_context"] + "\n" + best["graph_context"]).strip(),
         "retrieved_from": {
             "vector_chunks": len(best["vector_results"]),
+            "lexical_chunks": best["lexical_chunks"],
             "graph_context_len": len(best["graph_context"]),
             "graph_traversal_depth": best["plan"]["graph_depth"],
         },
@@ -329,15 +592,31 @@ def chatapplicationApi(
             "evidence_sufficiency": round(best["evidence"], 4),
             "hallucination_probability": round(best["hallucination"], 4),
         },
-        "runtime": {
-            "latency_ms": total_latency_ms,
-            "token_usage_estimated": total_tokens,
-            "api_cost_estimate_usd": estimated_cost,
-            "reflection_iterations": len(iteration_logs),
-            "retrieval_confidence": round(best["vector_confidence"], 4),
-            "evidence_sufficiency": round(best["evidence"], 4),
-            "hallucination_probability": round(best["hallucination"], 4),
-        },
+        "runtime": runtime,
     }
 
+    # Answers built on a timed-out or failed retrieval branch are degraded; don't serve them again.
+    degraded = (
+        retrieval_timings["vector_timed_out"]
+        or retrieval_timings["graph_timed_out"]
+        or retrieval_timings["vector_failed"]
+        or retrieval_timings["graph_failed"]
+    )
+    if ANSWER_CACHE_ENABLED and query_embedding is not None and not degraded:
+        answer_cache.store(cache_key, query_embedding, payload, total_latency_ms, generation=cache_generation)
+    runtime["answer_cache"] = _answer_cache_runtime(False)
+    yield "final", payload
+
 
+def chatapplicationApi(
+    query: str,
+    collectionName: str,
+    modelName: str,
+    dbpath: str,
+    max_reflection_iterations: int = DEFAULT_MAX_REFLECTION_ITERATIONS,
+):
+    for event, data in iter_chatapplication_events(
+        query, collectionName, modelName, dbpath, max_reflection_iterations=max_reflection_iterations
+    ):
+        if event == "final":
+            return data
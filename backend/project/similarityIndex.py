@@ -0,0 +1,118 @@
+import os
+from typing import Iterator, Tuple
+
+import numpy as np
+
+from GlobalVars import DEBUG
+
+try:
+    # chromadb already ships hnswlib (as chroma-hnswlib), so the ANN path is usually available.
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "10"))
+SIMILARITY_BLOCK_SIZE = int(os.getenv("SIMILARITY_BLOCK_SIZE", "2048"))
+SIMILARITY_ANN_MIN_CHUNKS = int(os.getenv("SIMILARITY_ANN_MIN_CHUNKS", "50000"))
+
+
+def _normalized_matrix(embeddings) -> np.ndarray:
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(matrix), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _blocked_top_k(matrix: np.ndarray, k: int, block_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    n = matrix.shape[0]
+    top_idx = np.full((n, k), -1, dtype=np.int64)
+    top_score = np.full((n, k), -np.inf, dtype=np.float32)
+
+    # Row and column tiles keep the live similarity block at block_size x block_size floats.
+    for rs in range(0, n, block_size):
+        row_end = min(n, rs + block_size)
+        best_s = top_score[rs:row_end]
+        best_i = top_idx[rs:row_end]
+        rows = np.arange(rs, row_end)
+
+        for cs in range(0, n, block_size):
+            col_end = min(n, cs + block_size)
+            sims = matrix[rs:row_end] @ matrix[cs:col_end].T
+            if cs < row_end and rs < col_end:
+                overlap = rows[(rows >= cs) & (rows < col_end)]
+                sims[overlap - rs, overlap - cs] = -np.inf
+
+            cols = np.broadcast_to(np.arange(cs, col_end, dtype=np.int64), sims.shape)
+            cand_s = np.concatenate([best_s, sims], axis=1)
+            cand_i = np.concatenate([best_i, cols], axis=1)
+            keep = np.argpartition(-cand_s, k - 1, axis=1)[:, :k]
+            best_s = np.take_along_axis(cand_s, keep, axis=1)
+            best_i = np.take_along_axis(cand_i, keep, axis=1)
+
+        top_score[rs:row_end] = best_s
+        top_idx[rs:row_end] = best_i
+
+    return top_idx, top_score
+
+
+def _ann_top_k(matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    n, dim = matrix.shape
+    index = hnswlib.Index(space="ip", dim=dim)
+    index.init_index(max_elements=n, ef_construction=200, M=16)
+    index.add_items(matrix, np.arange(n))
+    index.set_ef(max(64, 2 * (k + 1)))
+
+    labels, distances = index.knn_query(matrix, k=k + 1)
+    scores = (1.0 - distances).astype(np.float32)
+    # Drop each row's self match; rows where it was not returned lose their weakest neighbour instead.
+    self_hit = labels == np.arange(n)[:, None]
+    scores[self_hit] = -np.inf
+    order = np.argsort(-scores, axis=1)[:, :k]
+    return np.take_along_axis(labels.astype(np.int64), order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def top_k_similar_pairs(
+    embeddings,
+    k: int = SIMILARITY_TOP_K,
+    threshold: float = 0.75,
+    block_size: int = SIMILARITY_BLOCK_SIZE,
+    method: str = "auto",
+) -> Tuple[np.ndarray, np.ndarray]:
+    matrix = _normalized_matrix(embeddings)
+    n = matrix.shape[0]
+    k = min(int(k), n - 1)
+    if n < 2 or k < 1:
+        return np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    if method == "auto":
+        method = "ann" if hnswlib is not None and n >= SIMILARITY_ANN_MIN_CHUNKS else "exact"
+    if method == "ann" and hnswlib is None:
+        if DEBUG:
+            print("[SIM] hnswlib not installed; falling back to exact blocked search.")
+        method = "exact"
+
+    if method == "ann":
+        idx, scores = _ann_top_k(matrix, k)
+    else:
+        idx, scores = _blocked_top_k(matrix, k, max(1, int(block_size)))
+
+    keep = (scores > threshold) & (idx >= 0)
+    src = np.broadcast_to(np.arange(n, dtype=np.int64)[:, None], idx.shape)[keep]
+    dst = idx[keep]
+    pair_scores = scores[keep]
+
+    # Edges are undirected: canonicalize to (low, high) and drop mirrored duplicates.
+    pairs = np.stack([np.minimum(src, dst), np.maximum(src, dst)], axis=1)
+    pairs, first = np.unique(pairs, axis=0, return_index=True)
+
+    if DEBUG:
+        print(f"[SIM] method={method} | chunks={n} | k={k} | edges={len(pairs)}")
+    return pairs, pair_scores[first]
+
+
+def iter_similar_pairs(embeddings, **kwargs) -> Iterator[Tuple[int, int, float]]:
+    pairs, scores = top_k_similar_pairs(embeddings, **kwargs)
+    for (i, j), score in zip(pairs.tolist(), scores.tolist()):
+        yield i, j, score
@@ -0,0 +1,164 @@
+# Per-stage spans for the query and ingest pipelines. Every span feeds a process-wide latency
+# histogram (served on /metrics in the Prometheus text format, written by hand since
+# prometheus_client is not a dependency) and, when a trace is active, the per-request breakdown
+# returned in runtime["stages"] or the ingest job status.
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# Seconds; stages range from sub-millisecond lookups to multi-minute graph syncs.
+STAGE_BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_LabelKey = Tuple[str, str]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class StageMetrics:
+    # Histogram of stage durations and a counter of failed stages, both keyed by (pipeline, stage).
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS_S):
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[_LabelKey, list] = {}
+        self._sums: Dict[_LabelKey, float] = {}
+        self._errors: Dict[_LabelKey, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, pipeline: str, stage: str, seconds: Optional[float], error: bool = False):
+        if not METRICS_ENABLED:
+            return
+        key = (pipeline, stage)
+        with self._lock:
+            if error:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            if seconds is None:
+                return
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + seconds
+
+    def render(self) -> str:
+        with self._lock:
+            counts = {key: list(values) for key, values in self._counts.items()}
+            sums = dict(self._sums)
+            errors = dict(self._errors)
+
+        lines = [
+            "# HELP rag_stage_duration_seconds Time spent in each query and ingest pipeline stage.",
+            "# TYPE rag_stage_duration_seconds histogram",
+        ]
+        for (pipeline, stage), values in sorted(counts.items()):
+            labels = f'pipeline="{_escape(pipeline)}",stage="{_escape(stage)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'rag_stage_duration_seconds_bucket{{{labels},le="{_format(bound)}"}} {cumulative}')
+            cumulative += values[-1]
+            lines.append(f'rag_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"rag_stage_duration_seconds_sum{{{labels}}} {sums[(pipeline, stage)]:.6f}")
+            lines.append(f"rag_stage_duration_seconds_count{{{labels}}} {cumulative}")
+
+        lines += [
+            "# HELP rag_stage_errors_total Stage runs that raised or hit their deadline.",
+            "# TYPE rag_stage_errors_total counter",
+        ]
+        for (pipeline, stage), count in sorted(errors.items()):
+            lines.append(f'rag_stage_errors_total{{pipeline="{_escape(pipeline)}",stage="{_escape(stage)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._sums.clear()
+            self._errors.clear()
+
+
+stage_metrics = StageMetrics()
+
+
+class Trace:
+    # Per-request (or per-ingest-job) totals: stage -> accumulated ms and number of spans.
+    def __init__(self, pipeline: str, metrics: StageMetrics = stage_metrics):
+        self.pipeline = pipeline
+        self.metrics = metrics
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, ms: Optional[float], error: bool = False):
+        # ms=None records only the failure, e.g. a retrieval branch abandoned at its deadline.
+        self.metrics.observe(self.pipeline, stage, ms / 1000.0 if ms is not None else None, error)
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"ms": 0.0, "calls": 0})
+            if ms is not None:
+                entry["ms"] += ms
+                entry["calls"] += 1
+            if error:
+                entry["errors"] = entry.get("errors", 0) + 1
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000.0, error)
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {**entry, "ms": round(entry["ms"], 2)}
+                for stage, entry in self._stages.items()
+            }
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("stage_trace", default=None)
+
+
+@contextmanager
+def start_trace(pipeline: str) -> Iterator[Trace]:
+    # Makes spans opened further down the call stack (same thread) land in this trace.
+    trace = Trace(pipeline)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage: str, pipeline: str = "ingest"):
+    # For code that does not hold a Trace; without an active trace only the histogram is fed.
+    trace = _current_trace.get() or Trace(pipeline)
+    with trace.span(stage):
+        yield
+
+
+def timed_iter(iterable: Iterable, stage: str, pipeline: str = "ingest") -> Iterator:
+    # Times each step of a producer (e.g. PDF page batches) without counting the consumer's work.
+    trace = _current_trace.get() or Trace(pipeline)
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        except BaseException:
+            trace.record(stage, (time.perf_counter() - start) * 1000.0, error=True)
+            raise
+        trace.record(stage, (time.perf_counter() - start) * 1000.0)
+        yield item
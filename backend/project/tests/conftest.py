@@ -0,0 +1,5 @@
+# The modules under test live at the top level of backend/project, next to this directory.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,52 @@
+import pytest
+
+# add_docs writes through a real (temporary) Chroma collection.
+pytest.importorskip("langchain_community")
+pytest.importorskip("langchain_chroma")
+
+from langchain_chroma import Chroma  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+from langchain_core.embeddings import Embeddings  # noqa: E402
+
+import docProcess  # noqa: E402
+
+
+class _LengthEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0, 0.0]
+
+
+def _chunks(texts):
+    return [Document(page_content=t, metadata={"chunk_index": i, "page": i // 2}) for i, t in enumerate(texts)]
+
+
+def _stored(db):
+    got = db.get(include=["documents", "metadatas"])
+    return {text: (meta["chunk_index"], meta["page"]) for text, meta in zip(got["documents"], got["metadatas"])}
+
+
+def test_reingest_refreshes_positions_of_moved_chunks(tmp_path, monkeypatch):
+    # The graph side is covered elsewhere; keep this about the vector store.
+    monkeypatch.setattr(docProcess, "get_graph", lambda: None)
+    monkeypatch.setattr(docProcess, "insert_docs_to_graph", lambda *args, **kwargs: None)
+    db = Chroma(
+        collection_name="reingest.pdf",
+        embedding_function=_LengthEmbeddings(),
+        persist_directory=str(tmp_path),
+    )
+    texts = ["alpha chunk", "beta chunk", "gamma chunk"]
+    docProcess.add_docs(db, _chunks(texts), collection_name="reingest.pdf")
+    assert _stored(db) == {t: (i, i // 2) for i, t in enumerate(texts)}
+
+    # A new chunk up front shifts every kept chunk by one position.
+    texts = ["preface chunk"] + texts
+    docProcess.add_docs(db, _chunks(texts), collection_name="reingest.pdf")
+    assert _stored(db) == {t: (i, i // 2) for i, t in enumerate(texts)}
+
+    # Dropping it again moves them back.
+    texts = texts[1:]
+    docProcess.add_docs(db, _chunks(texts), collection_name="reingest.pdf")
+    assert _stored(db) == {t: (i, i // 2) for i, t in enumerate(texts)}
@@ -0,0 +1,131 @@
+import json
+
+import numpy as np
+
+import answerCache
+from answerCache import SemanticAnswerCache
+
+COLLECTION = ("a.pdf", "model")
+OTHER = ("b.pdf", "model")
+
+
+def _vector(*components):
+    vector = np.zeros(4, dtype=np.float32)
+    vector[: len(components)] = components
+    return vector
+
+
+def _entry_bytes(payload):
+    return len(json.dumps(payload, default=str).encode("utf-8")) + _vector(1.0).nbytes
+
+
+def test_lookup_hits_only_above_the_similarity_threshold():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store(COLLECTION, _vector(1.0), {"answer": "x"}, 120.0)
+
+    # cos = 0.99 and 0.8 after normalization; scale does not matter.
+    hit = cache.lookup(COLLECTION, _vector(2.0 * 0.99, 2.0 * np.sqrt(1 - 0.99 ** 2)))
+    assert hit is not None
+    payload, similarity, latency_ms = hit
+    assert payload == {"answer": "x"}
+    assert np.isclose(similarity, 0.99, atol=1e-5)
+    assert latency_ms == 120.0
+    assert cache.lookup(COLLECTION, _vector(0.8, 0.6)) is None
+    # Other collections never see this answer.
+    assert cache.lookup(OTHER, _vector(1.0)) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_lookup_returns_a_copy_of_the_payload():
+    cache = SemanticAnswerCache()
+    cache.store(COLLECTION, _vector(1.0), {"answer": ["x"]}, 1.0)
+    cache.lookup(COLLECTION, _vector(1.0))[0]["answer"].append("mutated")
+    assert cache.lookup(COLLECTION, _vector(1.0))[0] == {"answer": ["x"]}
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answerCache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(ttl_s=60.0)
+    cache.store(COLLECTION, _vector(1.0), {"answer": "x"}, 1.0)
+
+    now[0] += 60.0
+    assert cache.lookup(COLLECTION, _vector(1.0)) is not None
+    now[0] += 0.5
+    assert cache.lookup(COLLECTION, _vector(1.0)) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.bytes_used == 0
+
+
+def test_max_entries_evicts_the_least_recently_used_entry_of_the_collection():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store(COLLECTION, _vector(1.0), {"answer": "first"}, 1.0)
+    cache.store(COLLECTION, _vector(0.0, 1.0), {"answer": "second"}, 1.0)
+    cache.store(OTHER, _vector(0.0, 0.0, 1.0), {"answer": "other"}, 1.0)
+    # Touching "first" makes "second" the coldest entry of COLLECTION.
+    assert cache.lookup(COLLECTION, _vector(1.0)) is not None
+    cache.store(COLLECTION, _vector(0.0, 0.0, 0.0, 1.0), {"answer": "third"}, 1.0)
+
+    assert cache.lookup(COLLECTION, _vector(0.0, 1.0)) is None
+    assert cache.lookup(COLLECTION, _vector(1.0))[0] == {"answer": "first"}
+    assert cache.lookup(COLLECTION, _vector(0.0, 0.0, 0.0, 1.0))[0] == {"answer": "third"}
+    # The cap is per collection.
+    assert cache.lookup(OTHER, _vector(0.0, 0.0, 1.0))[0] == {"answer": "other"}
+
+
+def test_byte_cap_evicts_the_coldest_entry_across_collections():
+    payloads = [{"answer": name} for name in ("aaaa", "bbbb", "cccc")]
+    cache = SemanticAnswerCache(max_bytes=2 * _entry_bytes(payloads[0]))
+    cache.store(COLLECTION, _vector(1.0), payloads[0], 1.0)
+    cache.store(OTHER, _vector(0.0, 1.0), payloads[1], 1.0)
+    assert cache.lookup(COLLECTION, _vector(1.0)) is not None
+    cache.store(OTHER, _vector(0.0, 0.0, 1.0), payloads[2], 1.0)
+
+    assert cache.bytes_used == 2 * _entry_bytes(payloads[0])
+    assert cache.lookup(OTHER, _vector(0.0, 1.0)) is None
+    assert cache.lookup(COLLECTION, _vector(1.0))[0] == payloads[0]
+    assert cache.lookup(OTHER, _vector(0.0, 0.0, 1.0))[0] == payloads[2]
+
+
+def test_payload_larger_than_the_byte_cap_is_not_stored():
+    payload = {"answer": "x" * 64}
+    cache = SemanticAnswerCache(max_bytes=_entry_bytes(payload) - 1)
+    cache.store(COLLECTION, _vector(1.0), payload, 1.0)
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_drops_every_model_of_one_collection_only():
+    cache = SemanticAnswerCache()
+    cache.store(COLLECTION, _vector(1.0), {"answer": "x"}, 1.0)
+    cache.store(("a.pdf", "other-model"), _vector(1.0), {"answer": "y"}, 1.0)
+    cache.store(OTHER, _vector(1.0), {"answer": "z"}, 1.0)
+
+    cache.invalidate("a.pdf")
+    assert cache.lookup(COLLECTION, _vector(1.0)) is None
+    assert cache.lookup(("a.pdf", "other-model"), _vector(1.0)) is None
+    assert cache.lookup(OTHER, _vector(1.0))[0] == {"answer": "z"}
+
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+    assert cache.bytes_used == 0
+
+
+def test_store_refuses_an_answer_from_a_stale_generation():
+    cache = SemanticAnswerCache()
+    before = cache.generation(COLLECTION)
+    unrelated = cache.generation(OTHER)
+    cache.invalidate("a.pdf")
+
+    cache.store(COLLECTION, _vector(1.0), {"answer": "stale"}, 1.0, generation=before)
+    assert cache.lookup(COLLECTION, _vector(1.0)) is None
+    # Re-ingesting another collection does not affect answers for this one...
+    cache.store(OTHER, _vector(1.0), {"answer": "fresh"}, 1.0, generation=unrelated)
+    assert cache.lookup(OTHER, _vector(1.0)) is not None
+    # ...but a full wipe does.
+    current = cache.generation(OTHER)
+    cache.invalidate()
+    cache.store(OTHER, _vector(1.0), {"answer": "stale"}, 1.0, generation=current)
+    assert cache.lookup(OTHER, _vector(1.0)) is None
+
+    cache.store(COLLECTION, _vector(1.0), {"answer": "fresh"}, 1.0, generation=cache.generation(COLLECTION))
+    assert cache.lookup(COLLECTION, _vector(1.0))[0] == {"answer": "fresh"}
@@ -0,0 +1,63 @@
+import math
+import re
+from collections import Counter
+
+import pytest
+
+# bm25Index reuses embeddingCache.content_hash, which imports LangChain.
+pytest.importorskip("langchain_core")
+
+from bm25Index import BM25_B, BM25_K1, BM25Index  # noqa: E402
+
+
+def _naive_scores(texts, query):
+    docs = [Counter(re.findall(r"[A-Za-z0-9_]+", t.lower())) for t in texts]
+    avgdl = sum(sum(d.values()) for d in docs) / len(docs)
+    scores = {}
+    for term in dict.fromkeys(re.findall(r"[A-Za-z0-9_]+", query.lower())):
+        df = sum(1 for d in docs if term in d)
+        if not df:
+            continue
+        idf = math.log(1.0 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, d in enumerate(docs):
+            tf = d[term]
+            if tf:
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * sum(d.values()) / avgdl)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+    return scores
+
+
+def _corpus():
+    texts = [f"chunk {i} about graph retrieval and vector {i % 7} search" for i in range(400)]
+    # Wide postings: a doc-id gap above 255 and a term frequency above 255.
+    texts[3] += " rareterm"
+    texts[350] += " rareterm"
+    texts[10] += " heavy" * 300
+    return texts
+
+
+@pytest.mark.parametrize("query", ["rareterm", "heavy graph", "vector 3 search", "missing words", "Chunk 12"])
+def test_search_matches_naive_bm25_after_round_trip(tmp_path, query):
+    texts = _corpus()
+    ids = [f"id{i}" for i in range(len(texts))]
+    BM25Index.build(ids, texts, [f"spans{i}" for i in range(len(texts))]).save(str(tmp_path / "index"))
+    index = BM25Index.load(str(tmp_path / "index"))
+
+    expected = _naive_scores(texts, query)
+    results = index.search(query, top_k=10)
+    assert len(results) == min(10, len(expected))
+    for doc, score in results:
+        assert score == pytest.approx(expected[doc], rel=1e-4)
+    # Best first; nothing left out scores higher than the last result kept.
+    result_scores = [score for _, score in results]
+    assert result_scores == sorted(result_scores, reverse=True)
+    if results:
+        omitted = [s for d, s in expected.items() if d not in {d for d, _ in results}]
+        assert all(s <= result_scores[-1] + 1e-6 for s in omitted)
+
+
+def test_hits_carry_ids_texts_and_spans():
+    index = BM25Index.build(["a", "b"], ["alpha beta", "gamma"], ["[[0,10,2,0]]", ""])
+    hits = index.hits("beta", top_k=5)
+    assert [(h["id"], h["text"], h["spans"]) for h in hits] == [("a", "alpha beta", "[[0,10,2,0]]")]
+    assert index.hits("gamma", top_k=5)[0]["spans"] is None
@@ -0,0 +1,91 @@
+import pytest
+
+# contextFusion hashes chunk text with embeddingCache.content_hash, which imports LangChain.
+pytest.importorskip("langchain_core")
+
+from contextFusion import FUSION_NEAR_DUP_THRESHOLD, _unit, fuse_evidence  # noqa: E402
+
+WEIGHTS = {"vector": 0.5, "graph": 0.5}
+
+
+def _item(chunk_id, text):
+    return {"id": chunk_id, "text": text, "spans": None}
+
+
+def test_exact_and_near_duplicates_are_dropped_before_packing():
+    vector_items = [
+        _item("c1", "Alpha facts are here. Beta facts follow."),
+        _item("c2", "Gamma results are stored on disk."),
+    ]
+    graph_items = [
+        # Same id as a vector hit.
+        _item("c1", "Alpha facts are here. Beta facts follow."),
+        # Same text up to case and whitespace.
+        _item("c3", "  gamma RESULTS are stored on   disk. "),
+        # Different text, practically the same embedding as c2.
+        _item("c4", "Delta notes mirror gamma."),
+        # New chunk that repeats one sentence of c1.
+        _item("c5", "Beta facts follow. Epsilon adds context."),
+    ]
+    near_c2 = _unit([0.02, 1.0, 0.0, 0.0])
+    assert float(near_c2 @ _unit([0.0, 1.0, 0.0, 0.0])) >= FUSION_NEAR_DUP_THRESHOLD
+    chunk_embeddings = {
+        "c1": _unit([1.0, 0.0, 0.0, 0.0]),
+        "c2": _unit([0.0, 1.0, 0.0, 0.0]),
+        "c3": _unit([0.0, 0.0, 0.0, 1.0]),
+        "c4": near_c2,
+        "c5": _unit([0.0, 0.0, 1.0, 0.0]),
+    }
+
+    vector_context, graph_context, stats = fuse_evidence(
+        vector_items, graph_items, [1.0, 1.0, 1.0, 0.0], chunk_embeddings, WEIGHTS, 500, "simple"
+    )
+
+    assert sorted(vector_context.split("\n")) == [
+        "Alpha facts are here. Beta facts follow.",
+        "Gamma results are stored on disk.",
+    ]
+    assert graph_context == "Epsilon adds context."
+    assert stats["candidate_chunks"] == 6
+    assert stats["exact_duplicates"] == 2
+    assert stats["near_duplicates"] == 1
+    assert stats["duplicate_sentences"] == 1
+    assert stats["selected_chunks"] == 3
+    # 7 + 6 + 7 + 6 + 4 + 6 tokens offered, 7 + 6 + 3 of them unique.
+    assert stats["candidate_tokens"] == 36
+    assert stats["unique_tokens"] == 16
+    assert stats["selected_tokens"] == 16
+    assert stats["tokens_saved"] == 20
+
+
+def test_packing_stops_at_the_token_budget():
+    # Five chunks of two 15-token lines; without embeddings they are taken in rank order.
+    filler = " ".join(["word"] * 11)
+    vector_items = [
+        _item(f"c{i}", "\n".join(f"chunk {i} line {j} {filler}" for j in range(2))) for i in range(5)
+    ]
+
+    vector_context, graph_context, stats = fuse_evidence(vector_items, [], None, {}, WEIGHTS, 80, "simple")
+
+    lines = vector_context.split("\n")
+    assert [line.split()[:4] for line in lines] == [
+        ["chunk", "0", "line", "0"],
+        ["chunk", "0", "line", "1"],
+        ["chunk", "1", "line", "0"],
+        ["chunk", "1", "line", "1"],
+        ["chunk", "2", "line", "0"],
+    ]
+    assert graph_context == ""
+    assert stats["selected_chunks"] == 3
+    assert stats["selected_tokens"] == 75
+    assert stats["unique_tokens"] == 150
+    assert stats["tokens_saved"] == 0
+
+
+def test_budget_below_the_floor_is_raised_to_it():
+    filler = " ".join(["word"] * 16)
+    vector_items = [_item(f"c{i}", f"chunk {i} {filler}") for i in range(6)]
+    _, _, stats = fuse_evidence(vector_items, [], None, {}, WEIGHTS, 10, "simple")
+    # 18-token chunks against the 80-token floor: four fit, the fifth would not.
+    assert stats["selected_chunks"] == 4
+    assert stats["selected_tokens"] == 72
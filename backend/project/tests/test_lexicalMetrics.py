@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+pytest.importorskip("nltk")
+pytest.importorskip("rouge_score")
+
+from lexicalMetrics import (  # noqa: E402
+    EVAL_PARALLEL_MIN_ROWS,
+    bleu,
+    exact_match,
+    f1,
+    iter_lexical_metrics,
+    lexical_metrics,
+    rougeL,
+)
+
+_WORDS = ["graph", "vector", "chunk", "Neo4j", "retrieval", "answer", "the", "of", "is", "fast", "slow"]
+
+
+def _pairs(n, seed=7):
+    rng = random.Random(seed)
+    pairs = [
+        ("The answer is 42.", "the answer is 42."),
+        ("  Graph   retrieval ", "graph retrieval"),
+        ("", "reference only"),
+        ("prediction only", ""),
+        ("", ""),
+    ]
+    while len(pairs) < n:
+        gt = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 12)))
+        pred = gt if rng.random() < 0.2 else " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 12)))
+        pairs.append((pred, gt))
+    return pairs[:n]
+
+
+def test_shared_tokenization_matches_the_per_metric_functions():
+    for pred, gt in _pairs(200):
+        row = lexical_metrics(pred, gt)
+        assert row["exact_match"] == exact_match(pred, gt)
+        assert row["f1"] == pytest.approx(f1(pred, gt))
+        assert row["rougeL"] == pytest.approx(rougeL(pred, gt))
+        assert row["bleu"] == pytest.approx(bleu(pred, gt))
+
+
+def test_pooled_scoring_matches_serial_scoring_in_order():
+    pairs = _pairs(EVAL_PARALLEL_MIN_ROWS + 37)
+    serial = [row for chunk in iter_lexical_metrics(pairs, chunk_rows=250, workers=1) for row in chunk]
+    pooled_chunks = list(iter_lexical_metrics(pairs, chunk_rows=250, workers=2))
+
+    assert [len(chunk) for chunk in pooled_chunks] == [min(250, len(pairs) - s) for s in range(0, len(pairs), 250)]
+    pooled = [row for chunk in pooled_chunks for row in chunk]
+    assert len(pooled) == len(serial) == len(pairs)
+    for pooled_row, serial_row in zip(pooled, serial):
+        assert pooled_row == pytest.approx(serial_row)
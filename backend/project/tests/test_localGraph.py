@@ -0,0 +1,84 @@
+import numpy as np
+
+from localGraph import KIND_NEXT, KIND_SIMILAR, LocalGraph
+
+
+def _edges(graph: LocalGraph):
+    snap = graph._snap
+    ids = snap.doc_ids.tolist()
+    edges = set()
+    for i in range(snap.n_docs):
+        for p in range(int(snap.adj_indptr[i]), int(snap.adj_indptr[i + 1])):
+            j = int(snap.adj_indices[p])
+            edges.add((ids[i], ids[j], int(snap.adj_kind[p]), round(float(snap.adj_weight[p]), 4)))
+    return edges
+
+
+def _features(graph: LocalGraph):
+    snap = graph._snap
+    ids = snap.doc_ids.tolist()
+    return {
+        ids[i]: {snap.feat_keys[int(f)] for f in snap.doc_feat_indices[snap.doc_feat_indptr[i]:snap.doc_feat_indptr[i + 1]]}
+        for i in range(snap.n_docs)
+    }
+
+
+def _populate(graph: LocalGraph):
+    with graph.transaction():
+        graph.apply_rows("documents", [
+            {"id": f"d{i}", "file": "a.pdf" if i < 4 else "b.pdf", "text": f"graph chunk {i} retrieval", "sentence_spans": f"s{i}"}
+            for i in range(6)
+        ])
+        graph.apply_rows("next", [{"prev": f"d{i}", "curr": f"d{i + 1}"} for i in range(3)])
+        graph.apply_rows("similar", [{"a": "d0", "b": "d5", "score": 0.9}, {"a": "d2", "b": "d4", "score": 0.8}])
+        graph.apply_rows("entities", [{"name": "Neo4j", "type": "ORG", "doc_id": "d1"}, {"name": "Neo4j", "type": "ORG", "doc_id": "d4"}])
+        graph.apply_rows("topics", [{"topic": "Graphs", "doc_id": "d0"}])
+
+
+def test_csr_snapshot_round_trips_through_disk(tmp_path):
+    graph = LocalGraph(str(tmp_path / "graph"))
+    _populate(graph)
+    loaded = LocalGraph.load(str(tmp_path / "graph"))
+
+    assert loaded._snap.doc_ids.tolist() == graph._snap.doc_ids.tolist()
+    assert loaded._snap.doc_texts.tolist() == graph._snap.doc_texts.tolist()
+    assert loaded._snap.doc_spans.tolist() == [f"s{i}" for i in range(6)]
+    assert loaded._snap.files == ["a.pdf", "b.pdf"]
+    assert sorted(loaded.file_ids("a.pdf")) == ["d0", "d1", "d2", "d3"]
+    assert _edges(loaded) == _edges(graph)
+    assert ("d1", "d2", KIND_NEXT, 1.0) in _edges(loaded)
+    assert ("d5", "d0", KIND_SIMILAR, 0.9) in _edges(loaded)
+    assert _features(loaded) == _features(graph)
+    assert loaded.related_candidates("chunk 2 retrieval", 2, 3) == graph.related_candidates("chunk 2 retrieval", 2, 3)
+
+
+def test_staging_rebuilt_from_snapshot_compiles_to_the_same_arrays(tmp_path):
+    graph = LocalGraph(str(tmp_path / "graph"))
+    _populate(graph)
+    with graph.transaction(persist=False):
+        graph.apply_rows("documents", [])
+    for name in ("adj_indptr", "adj_indices", "adj_kind", "doc_feat_indptr", "term_indptr", "term_docs", "term_tf"):
+        before = np.asarray(getattr(LocalGraph.load(str(tmp_path / "graph"))._snap, name))
+        assert np.array_equal(np.asarray(getattr(graph._snap, name)), before), name
+
+
+def test_failed_transaction_is_discarded(tmp_path):
+    graph = LocalGraph(str(tmp_path / "graph"))
+    _populate(graph)
+    try:
+        with graph.transaction():
+            graph.delete_documents(["d0"])
+            raise RuntimeError("cancelled")
+    except RuntimeError:
+        pass
+    assert "d0" in graph.file_ids("a.pdf")
+    assert "d0" in LocalGraph.load(str(tmp_path / "graph")).file_ids("a.pdf")
+
+
+def test_reprocessed_document_keeps_a_single_topic(tmp_path):
+    graph = LocalGraph(str(tmp_path / "graph"))
+    _populate(graph)
+    with graph.transaction():
+        graph.apply_rows("topics", [{"topic": "Retrieval", "doc_id": "d0"}])
+    assert _features(graph)["d0"] == {"topic\x1fRetrieval"}
+    assert _features(graph)["d1"] == {"entity\x1fORG\x1fNeo4j"}
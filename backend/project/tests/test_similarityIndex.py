@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from similarityIndex import top_k_similar_pairs
+
+
+def _brute_force(embeddings: np.ndarray, k: int, threshold: float):
+    matrix = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    sims = matrix @ matrix.T
+    np.fill_diagonal(sims, -np.inf)
+    expected = {}
+    for i, row in enumerate(sims):
+        for j in np.argsort(-row)[:k]:
+            if row[j] > threshold:
+                expected[(min(i, j), max(i, j))] = float(row[j])
+    return expected
+
+
+@pytest.mark.parametrize("n, k, block_size", [(2, 1, 1), (17, 3, 4), (60, 5, 7), (60, 10, 2048)])
+def test_blocked_top_k_matches_brute_force(n, k, block_size):
+    rng = np.random.default_rng(n * 100 + k)
+    # Clustered vectors so plenty of pairs clear the threshold.
+    centers = rng.normal(size=(4, 16))
+    embeddings = centers[rng.integers(0, 4, n)] + 0.4 * rng.normal(size=(n, 16))
+    threshold = 0.5
+
+    pairs, scores = top_k_similar_pairs(embeddings, k=k, threshold=threshold, block_size=block_size, method="exact")
+    found = {(int(i), int(j)): float(s) for (i, j), s in zip(pairs, scores)}
+
+    expected = _brute_force(embeddings, k, threshold)
+    assert found.keys() == expected.keys()
+    for pair, score in expected.items():
+        assert found[pair] == pytest.approx(score, abs=1e-5)
+
+
+def test_fewer_than_two_chunks_has_no_pairs():
+    pairs, scores = top_k_similar_pairs(np.ones((1, 8)), k=5, method="exact")
+    assert pairs.shape == (0, 2) and scores.shape == (0,)
@@ -0,0 +1,86 @@
+import random
+import re
+from typing import List
+
+import pytest
+
+from textSegments import decode_spans, encode_spans, pack_segments, segment_text
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(re.findall(r"[A-Za-z0-9_]+", (text or "").lower()))
+
+
+def _adaptive_context_granularity(context: str, token_budget: int, complexity_label: str) -> str:
+    # query._adaptive_context_granularity as it was before spans were stored at ingest.
+    if not context:
+        return ""
+
+    paragraphs = [p.strip() for p in context.split("\n") if p.strip()]
+    if not paragraphs:
+        return ""
+
+    selected: List[str] = []
+    used_tokens = 0
+    max_budget = max(80, token_budget)
+
+    if complexity_label == "complex":
+        for para in paragraphs:
+            sentences = re.split(r"(?<=[.!?])\s+", para)
+            for sent in sentences:
+                sent = sent.strip()
+                if not sent:
+                    continue
+                t = _estimate_tokens(sent)
+                if used_tokens + t > max_budget:
+                    break
+                selected.append(sent)
+                used_tokens += t
+            if used_tokens >= max_budget:
+                break
+    else:
+        for para in paragraphs:
+            t = _estimate_tokens(para)
+            if used_tokens + t > max_budget:
+                break
+            selected.append(para)
+            used_tokens += t
+
+    return "\n".join(selected)
+
+
+_WORDS = ["graph", "vector", "Neo4j", "chunk", "v2.1", "e.g.", "x_y", "42", "--", "(note)", "API"]
+
+
+def _random_text(rng: random.Random) -> str:
+    lines = []
+    for _ in range(rng.randint(0, 6)):
+        sentences = []
+        for _ in range(rng.randint(0, 5)):
+            words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 30)))
+            sentences.append(words + rng.choice([".", "!", "?", "", "..."]))
+        pad = lambda: rng.choice(["", " ", "  ", "\t"])
+        lines.append(pad() + rng.choice([" ", "  ", "\t", " \t "]).join(sentences) + pad())
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("label", ["simple", "medium", "complex"])
+def test_pack_segments_matches_previous_packer(label):
+    rng = random.Random(label)
+    for _ in range(300):
+        texts = [_random_text(rng) for _ in range(rng.randint(1, 4))]
+        budget = rng.choice([0, 40, 80, 120, 300, 1000])
+        expected = _adaptive_context_granularity("\n".join(texts), budget, label)
+
+        stored = [(text, decode_spans(encode_spans(segment_text(text)))) for text in texts]
+        assert pack_segments(stored, budget, label) == expected
+        # Chunks ingested before spans were stored are segmented on the fly.
+        assert pack_segments([(text, None) for text in texts], budget, label) == expected
+
+
+def test_segment_text_offsets_cover_stripped_sentences():
+    text = "  First one. Second one!\n\n\tThird line?  "
+    spans = segment_text(text)
+    assert [text[s:e] for s, e, _, _ in spans] == ["First one.", "Second one!", "Third line?"]
+    assert [tokens for _, _, tokens, _ in spans] == [2, 2, 2]
+    assert [line for _, _, _, line in spans] == [0, 0, 1]
@@ -0,0 +1,109 @@
+# Sentence spans computed once at ingest so query-time context packing is slicing, not regex work.
+# A span is (start, end, tokens, line): character offsets of a stripped sentence, its token count
+# (same tokenizer as query._tokenize) and the index of the non-empty line it belongs to.
+import json
+import re
+from typing import List, Optional, Sequence, Tuple
+
+Span = Tuple[int, int, int, int]
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_TOKEN = re.compile(r"[A-Za-z0-9_]+")
+
+GRAPH_SEPARATOR = "---"
+_SEPARATOR_SPANS: List[Span] = [(0, len(GRAPH_SEPARATOR), 0, 0)]
+
+
+def _strip_bounds(text: str, start: int, end: int) -> Tuple[int, int]:
+    piece = text[start:end]
+    stripped = piece.strip()
+    if not stripped:
+        return start, start
+    lead = len(piece) - len(piece.lstrip())
+    return start + lead, start + lead + len(stripped)
+
+
+def segment_text(text: str) -> List[Span]:
+    spans: List[Span] = []
+    line_index = 0
+    offset = 0
+    for line in (text or "").split("\n"):
+        line_start, line_end = _strip_bounds(text, offset, offset + len(line))
+        offset += len(line) + 1
+        if line_start == line_end:
+            continue
+        piece_start = line_start
+        breaks = [(m.start(), m.end()) for m in _SENTENCE_BREAK.finditer(text, line_start, line_end)]
+        for piece_end, next_start in breaks + [(line_end, line_end)]:
+            start, end = _strip_bounds(text, piece_start, piece_end)
+            if start < end:
+                spans.append((start, end, len(_TOKEN.findall(text[start:end].lower())), line_index))
+            piece_start = next_start
+        line_index += 1
+    return spans
+
+
+def token_count(spans: Sequence[Span]) -> int:
+    return sum(span[2] for span in spans)
+
+
+def encode_spans(spans: Sequence[Span]) -> str:
+    # Chroma metadata values must be scalars, so spans travel as a compact JSON string.
+    return json.dumps([list(span) for span in spans], separators=(",", ":"))
+
+
+def decode_spans(value: Optional[str]) -> Optional[List[Span]]:
+    if not value:
+        return None
+    try:
+        return [tuple(span) for span in json.loads(value)]
+    except (TypeError, ValueError):
+        return None
+
+
+def segment_metadata(text: str) -> dict:
+    spans = segment_text(text)
+    return {"sentence_spans": encode_spans(spans), "token_count": token_count(spans)}
+
+
+def graph_separator() -> Tuple[str, List[Span]]:
+    return GRAPH_SEPARATOR, _SEPARATOR_SPANS
+
+
+def pack_segments(
+    items: Sequence[Tuple[str, Optional[Sequence[Span]]]], token_budget: int, complexity_label: str
+) -> str:
+    # Each item is (text, spans); texts are treated as if joined with "\n". Items without
+    # precomputed spans (ingested before spans were stored) are segmented here as a fallback.
+    selected: List[str] = []
+    used_tokens = 0
+    max_budget = max(80, token_budget)
+    sentence_level = complexity_label == "complex"
+
+    for text, spans in items:
+        if spans is None:
+            spans = segment_text(text)
+        i, n = 0, len(spans)
+        while i < n:
+            line = spans[i][3]
+            j = i
+            while j < n and spans[j][3] == line:
+                j += 1
+
+            if sentence_level:
+                for start, end, tokens, _ in spans[i:j]:
+                    if used_tokens + tokens > max_budget:
+                        break
+                    selected.append(text[start:end])
+                    used_tokens += tokens
+                if used_tokens >= max_budget:
+                    return "\n".join(selected)
+            else:
+                tokens = sum(span[2] for span in spans[i:j])
+                if used_tokens + tokens > max_budget:
+                    return "\n".join(selected)
+                selected.append(text[spans[i][0]:spans[j - 1][1]])
+                used_tokens += tokens
+            i = j
+
+    return "\n".join(selected)
@@ -0,0 +1,148 @@
+import math
+import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from clientRegistry import client_registry
+from GlobalVars import DEBUG, MODEL
+
+# "cluster": label one representative per embedding cluster (default)
+# "batch":   pack every chunk into multi-item labelling prompts
+# "none":    no LLM calls, clusters are named from their most frequent keywords
+TOPIC_MODE = os.getenv("TOPIC_MODE", "cluster")
+TOPIC_MAX_CLUSTERS = int(os.getenv("TOPIC_MAX_CLUSTERS", "32"))
+TOPIC_PROMPT_BATCH = int(os.getenv("TOPIC_PROMPT_BATCH", "8"))
+TOPIC_WORKERS = int(os.getenv("TOPIC_WORKERS", "4"))
+TOPIC_SNIPPET_CHARS = 600
+
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "were", "have",
+    "has", "had", "not", "but", "its", "into", "their", "they", "which", "will", "would",
+    "can", "also", "been", "these", "those", "such", "than", "then", "there", "other",
+}
+
+
+def get_topic_llm():
+    return client_registry.get_chat_model(MODEL)
+
+
+def label_text(text: str) -> str:
+    prompt = f"""
+    Read the following text and provide ONE short topic name (2-4 words).
+    Text:
+    {text}
+
+    Respond with ONLY the topic label.
+    """
+    try:
+        response = get_topic_llm().invoke(prompt)
+        topic = getattr(response, "content", str(response)).strip()
+        return topic or "General"
+    except Exception as e:
+        if DEBUG:
+            print("[TOPIC] Topic extraction failed:", e)
+        return "General"
+
+
+def _label_batch(texts: List[str]) -> List[str]:
+    if len(texts) == 1:
+        return [label_text(texts[0])]
+
+    items = "\n\n".join(
+        f"[{i + 1}]\n{' '.join(t.split())[:TOPIC_SNIPPET_CHARS]}" for i, t in enumerate(texts)
+    )
+    prompt = f"""
+    For each numbered text below, provide ONE short topic name (2-4 words).
+    {items}
+
+    Respond with exactly {len(texts)} lines in the form "<number>. <topic label>" and nothing else.
+    """
+    labels = ["General"] * len(texts)
+    try:
+        response = get_topic_llm().invoke(prompt)
+        content = getattr(response, "content", str(response))
+        for line in content.splitlines():
+            match = re.match(r"\s*\[?(\d+)[\].):-]*\s*(.+)", line)
+            if not match:
+                continue
+            idx = int(match.group(1)) - 1
+            label = match.group(2).strip().strip('"').strip()
+            if 0 <= idx < len(texts) and label:
+                labels[idx] = label
+    except Exception as e:
+        if DEBUG:
+            print("[TOPIC] Batched topic extraction failed:", e)
+    return labels
+
+
+def _label_concurrently(texts: List[str]) -> List[str]:
+    batches = [texts[i:i + TOPIC_PROMPT_BATCH] for i in range(0, len(texts), TOPIC_PROMPT_BATCH)]
+    with ThreadPoolExecutor(max_workers=max(1, min(TOPIC_WORKERS, len(batches)))) as pool:
+        results = list(pool.map(_label_batch, batches))
+    return [label for batch in results for label in batch]
+
+
+def _cluster(embeddings, n_clusters: int) -> Dict[str, np.ndarray]:
+    from sklearn.cluster import MiniBatchKMeans
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+
+    km = MiniBatchKMeans(n_clusters=n_clusters, random_state=0, n_init=3, batch_size=1024)
+    assignments = km.fit_predict(matrix)
+
+    # The representative is the member closest to its centroid.
+    distances = np.linalg.norm(matrix - km.cluster_centers_[assignments], axis=1)
+    representatives = np.full(n_clusters, -1, dtype=np.int64)
+    for cluster in range(n_clusters):
+        members = np.flatnonzero(assignments == cluster)
+        if len(members):
+            representatives[cluster] = members[np.argmin(distances[members])]
+    return {"assignments": assignments, "representatives": representatives}
+
+
+def _keyword_label(texts: List[str]) -> str:
+    counts = Counter(
+        t for text in texts for t in re.findall(r"[a-z][a-z0-9_]+", text.lower())
+        if len(t) > 3 and t not in _STOPWORDS
+    )
+    words = [w for w, _ in counts.most_common(3)]
+    return " ".join(words).title() if words else "General"
+
+
+def assign_topics(texts: List[str], embeddings=None, mode: Optional[str] = None) -> List[str]:
+    mode = mode or TOPIC_MODE
+    if not texts:
+        return []
+
+    if mode == "batch" or (mode == "cluster" and embeddings is None):
+        return _label_concurrently(texts)
+
+    n_clusters = max(1, min(TOPIC_MAX_CLUSTERS, len(texts), math.ceil(math.sqrt(len(texts) / 2))))
+    if n_clusters == 1 or embeddings is None:
+        assignments = np.zeros(len(texts), dtype=np.int64)
+        representatives = np.array([0])
+    else:
+        clusters = _cluster(embeddings, n_clusters)
+        assignments = clusters["assignments"]
+        representatives = clusters["representatives"]
+
+    if mode == "none":
+        labels = []
+        for cluster in range(len(representatives)):
+            members = np.flatnonzero(assignments == cluster)
+            labels.append(_keyword_label([texts[i] for i in members]))
+    else:
+        present = [int(r) for r in representatives if r >= 0]
+        rep_labels = dict(zip(present, _label_concurrently([texts[r] for r in present])))
+        labels = [rep_labels.get(int(r), "General") for r in representatives]
+
+    if DEBUG:
+        print(f"[TOPIC] mode={mode} | chunks={len(texts)} | clusters={len(representatives)}")
+    return [labels[int(c)] for c in assignments]
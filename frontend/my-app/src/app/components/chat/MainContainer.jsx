@@ -79,6 +79,17 @@ const handleSendtext = async () => {
       );
 
       console.log('Upload successful:', response.data);
+
+      // Ingestion runs in the background; wait for the job before enabling queries.
+      let job = response.data;
+      while (job.job_id && !['completed', 'failed', 'cancelled'].includes(job.status)) {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = (await axios.get(`${CONFIG.LOCALHOST}/jobs/${response.data.job_id}`)).data;
+      }
+      if (job.status === 'failed' || job.status === 'cancelled') {
+        throw new Error(`Ingestion ${job.status}: ${job.error || ''}`);
+      }
+
       setFilename(response.data.filename); // Update the filename state
       toast.success('File uploaded successfully!');
       setSuccessupload('File uploaded successfully!');